@@ -0,0 +1,164 @@
+# Данный файл содержит нагрузочный тест HTTP API: --concurrency клиентов в течение --duration секунд
+# отправляют запросы к эндпоинтам (выбор эндпоинта - случайный, с весами), по каждому эндпоинту
+# выводятся пропускная способность и перцентили p50/p95/p99 времени ответа.
+# Приложение запускается отдельно (docker compose up или uvicorn src.main:app) на данных benchmarks.seed.
+# Запуск из корня репозитория: python -m benchmarks.load --url http://localhost:8000 --duration 30 --save load.json
+import argparse
+import asyncio
+import base64
+import json
+import random
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Any, Callable, Optional
+
+import httpx
+
+from benchmarks.stats import add_report_arguments, report, summarize
+
+@dataclass
+class Endpoint:
+    # название в отчете - шаблон маршрута, а не конкретный URL
+    name: str
+    weight: int
+    method: str
+    url: Callable[[argparse.Namespace], str]
+    body: Optional[Callable[[argparse.Namespace, int], Any]] = None
+    write: bool = False
+
+def rand(limit: int) -> int:
+    return random.randint(1, limit)
+
+# курсор страницы в формате src.DB.pagination.encode_cursor; нагрузочному тесту нужен только HTTP,
+# поэтому модули приложения (и настройки подключения к БД) не импортируются
+def cursor(*values: Any) -> str:
+    raw = json.dumps(list(values), separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+# значения полей товара совпадают со сгенерированными benchmarks.seed - изменение не портит данные
+def seeded_product(product_id: int) -> dict[str, Any]:
+    return {"product_id": product_id, "product_name": f"Товар {product_id}", "product_description": f"Описание товара {product_id}"}
+
+ENDPOINTS = [
+    Endpoint("GET /product", 10, "GET", lambda a: "/product"),
+    Endpoint("GET /product?after=", 10, "GET", lambda a: f"/product?after={cursor(rand(a.products))}"),
+    Endpoint("GET /product/{id}", 20, "GET", lambda a: f"/product/{rand(a.products)}"),
+    Endpoint("GET /supplier", 5, "GET", lambda a: "/supplier"),
+    Endpoint("GET /supplier/{id}", 10, "GET", lambda a: f"/supplier/{rand(a.suppliers)}"),
+    Endpoint("GET /storage", 5, "GET", lambda a: "/storage"),
+    Endpoint("GET /storage/{id}", 5, "GET", lambda a: f"/storage/{rand(a.storages)}"),
+    Endpoint("GET /storage/leftovers", 5, "GET", lambda a: "/storage/leftovers"),
+    Endpoint("GET /storage/leftovers?num=", 5, "GET", lambda a: "/storage/leftovers?num=10"),
+    Endpoint("GET /storage/summary", 3, "GET", lambda a: "/storage/summary"),
+    Endpoint("GET /storage/summary/products", 3, "GET", lambda a: "/storage/summary/products"),
+    Endpoint("GET /storage/replenishment", 1, "GET", lambda a: "/storage/replenishment"),
+    Endpoint("GET /supplier/with_products", 3, "GET", lambda a: "/supplier/with_products"),
+    Endpoint("GET /bootstrap", 1, "GET", lambda a: "/bootstrap"),
+    Endpoint(
+        "GET /product/filter", 3, "GET",
+        lambda a: f"/product/filter?supplier_id={rand(a.suppliers)}&supplier_id={rand(a.suppliers)}&storage_id={rand(a.storages)}&in_stock=true",
+    ),
+    # запись: приход и расход одной единицы чередуются, поэтому остатки в среднем не меняются
+    Endpoint(
+        "POST /purchase/movement", 10, "POST", lambda a: "/purchase/movement",
+        lambda a, n: {"product_id": rand(a.products), "storage_id": rand(a.storages), "delta": 1 if n % 2 == 0 else -1},
+        write=True,
+    ),
+    Endpoint(
+        "PUT /product", 3, "PUT", lambda a: "/product",
+        lambda a, n: seeded_product(rand(a.products)),
+        write=True,
+    ),
+]
+
+# ответ считается успешным при кодах 2xx и 304; для движения остатков ожидаемы также 400 (расход при нулевом остатке)
+# и 404 (при генерации с --fill < 1 товара может не быть на выбранном складе)
+def is_ok(endpoint: Endpoint, status_code: int) -> bool:
+    if endpoint.name == "POST /purchase/movement" and status_code in (400, 404):
+        return True
+    return status_code < 300 or status_code == 304
+
+async def run(args) -> int:
+    endpoints = [
+        endpoint for endpoint in ENDPOINTS
+        if (args.writes or not endpoint.write) and (not args.only or any(part in endpoint.name for part in args.only))
+    ]
+    if not endpoints:
+        raise SystemExit("Нет эндпоинтов для нагрузки: проверьте --only и --writes.")
+    weights = [endpoint.weight for endpoint in endpoints]
+    latencies: dict[str, list[float]] = defaultdict(list)
+    errors: dict[str, int] = defaultdict(int)
+    first_errors: dict[str, str] = {}
+    # последний ETag каждого URL - для режима --revalidate
+    etags: dict[str, str] = {}
+    random.seed(args.seed)
+
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=args.timeout) as client:
+        async def worker(deadline: float, record: bool) -> None:
+            sent = 0
+            while time.perf_counter() < deadline:
+                endpoint = random.choices(endpoints, weights)[0]
+                url = endpoint.url(args)
+                headers = {"If-None-Match": etags[url]} if args.revalidate and url in etags else None
+                body = endpoint.body(args, sent) if endpoint.body else None
+                sent += 1
+                started = time.perf_counter()
+                try:
+                    response = await client.request(endpoint.method, url, json=body, headers=headers)
+                    await response.aread()
+                except httpx.HTTPError as e:
+                    ok, detail = False, repr(e)
+                else:
+                    ok, detail = is_ok(endpoint, response.status_code), f"HTTP {response.status_code}: {response.text[:200]}"
+                    if "etag" in response.headers:
+                        etags[url] = response.headers["etag"]
+                elapsed = time.perf_counter() - started
+                if not record:
+                    continue
+                if ok:
+                    latencies[endpoint.name].append(elapsed)
+                else:
+                    errors[endpoint.name] += 1
+                    first_errors.setdefault(endpoint.name, detail)
+
+        if args.warmup > 0:
+            deadline = time.perf_counter() + args.warmup
+            await asyncio.gather(*(worker(deadline, False) for _ in range(args.concurrency)))
+
+        print(f"Нагрузка на {args.url}: {args.concurrency} клиентов, {args.duration} с, эндпоинтов: {len(endpoints)}\n")
+        started = time.perf_counter()
+        deadline = started + args.duration
+        await asyncio.gather(*(worker(deadline, True) for _ in range(args.concurrency)))
+        elapsed = time.perf_counter() - started
+
+    for name, detail in first_errors.items():
+        print(f"  {name}: {errors[name]} ошибок, первая: {detail}")
+    results = [summarize(endpoint.name, latencies[endpoint.name], elapsed, errors[endpoint.name]) for endpoint in endpoints]
+    all_latencies = [latency for values in latencies.values() for latency in values]
+    results.append(summarize("ВСЕГО", all_latencies, elapsed, sum(errors.values())))
+    params = {key: value for key, value in vars(args).items() if key not in ("save", "baseline", "tolerance")}
+    return report(args, "load", params, results)
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Нагрузочный тест HTTP API")
+    parser.add_argument("--url", default="http://localhost:8000", help="адрес запущенного приложения")
+    parser.add_argument("--concurrency", type=int, default=32, help="количество одновременных клиентов")
+    parser.add_argument("--duration", type=float, default=30, help="длительность замера, с")
+    parser.add_argument("--warmup", type=float, default=3, help="длительность прогрева, с (не учитывается)")
+    parser.add_argument("--timeout", type=float, default=30, help="таймаут одного запроса, с")
+    parser.add_argument("--only", nargs="*", help="нагружать только эндпоинты, в названии которых есть одна из подстрок")
+    parser.add_argument("--writes", action="store_true", help="добавить запросы на изменение данных")
+    parser.add_argument("--revalidate", action="store_true", help="отправлять If-None-Match с последним ETag URL")
+    # диапазоны ID должны совпадать с параметрами benchmarks.seed
+    parser.add_argument("--products", type=int, default=100000, help="количество товаров в БД")
+    parser.add_argument("--suppliers", type=int, default=1000, help="количество поставщиков в БД")
+    parser.add_argument("--storages", type=int, default=50, help="количество складов в БД")
+    parser.add_argument("--seed", type=int, default=42, help="seed генератора случайных запросов")
+    add_report_arguments(parser)
+    args = parser.parse_args()
+    raise SystemExit(asyncio.run(run(args)))
+
+if __name__ == "__main__":
+    main()
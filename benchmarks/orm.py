@@ -0,0 +1,366 @@
+# Данный файл содержит микро-замеры методов AsyncORM на данных, созданных benchmarks.seed.
+# Каждый метод вызывается заданное количество раз (параллельно в --concurrency задачах), случайные ID
+# берутся из диапазонов сгенерированных данных. Методы записи возвращают данные в исходное состояние:
+# вставленные записи удаляются, движения остатков чередуются по знаку.
+# Запуск из корня репозитория: python -m benchmarks.orm --iterations 200 --save orm.json
+import argparse
+import asyncio
+import itertools
+import random
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable
+
+from sqlalchemy import and_, delete, func, select
+from sqlalchemy.orm import aliased
+
+from benchmarks.stats import add_report_arguments, report, summarize
+from src.DB.cache import reference_cache
+from src.DB.crud import AsyncORM
+from src.DB.database import async_engine
+from src.DB.models import ProductOrm, ProductsAndStoragesORM, StorageOrm, SupplierOrm
+from src.DB.pagination import encode_cursor
+from src.schemas import (
+    MovementDTO, ProductAddDTO, ProductDTO, PurchaseDTO, StorageAddDTO, StorageDTO,
+    SupplierAddDTO, SupplierDTO, SupplyDTO, TransferDTO,
+)
+
+# записи, созданные замерами, помечаются префиксом и удаляются по нему в конце
+MARK = "bench "
+
+# телефон в формате SupplierAddDTO, однозначно получаемый из числа (как в benchmarks.seed)
+def phone_for(number: int) -> str:
+    digits = f"{number:010d}"
+    return f"+7({digits[:3]}){digits[3:6]}-{digits[6:8]}-{digits[8:]}"
+
+@dataclass
+class Context:
+    products: int
+    suppliers: int
+    storages: int
+    # позиции (товар, склад) с запасом остатка - для движений
+    pairs: list[tuple[int, int]]
+    # (товар, склад, склад) с запасом остатка на обоих складах - для перемещений в обе стороны
+    transfers: list[tuple[int, int, int]]
+    # ID записей, созданных замерами вставки, - их используют замеры связей и удаления
+    created: dict[str, list[int]] = field(default_factory=lambda: {"products": [], "suppliers": [], "storages": []})
+    # ID товаров, вставленных одним вызовом bulk_insert_products, - для замера массового удаления
+    product_batches: list[list[int]] = field(default_factory=list)
+    counter: itertools.count = field(default_factory=itertools.count)
+
+    def product(self) -> int:
+        return random.randint(1, self.products)
+
+    def supplier(self) -> int:
+        return random.randint(1, self.suppliers)
+
+    def storage(self) -> int:
+        return random.randint(1, self.storages)
+
+    def take(self, kind: str) -> int:
+        self._check_created(kind)
+        return self.created[kind].pop()
+
+    def created_at(self, kind: str, i: int) -> int:
+        self._check_created(kind)
+        return self.created[kind][i % len(self.created[kind])]
+
+    def _check_created(self, kind: str) -> None:
+        if not self.created[kind]:
+            raise LookupError(f"нет записей {kind}, созданных замером вставки - запустите его вместе с этим замером")
+
+Case = Callable[[Context, int], Awaitable[Any]]
+CASES: list[tuple[str, Case]] = []
+
+# регистрация замера; порядок регистрации - порядок запуска (вставки идут раньше удалений)
+def case(name: str) -> Callable[[Case], Case]:
+    def register(func: Case) -> Case:
+        CASES.append((name, func))
+        return func
+    return register
+
+# ---------- чтение ----------
+@case("get_all_products")
+async def _(ctx: Context, i: int):
+    await AsyncORM.get_all_products()
+
+@case("get_all_products (случайная страница)")
+async def _(ctx: Context, i: int):
+    await AsyncORM.get_all_products(after=encode_cursor([ctx.product()]))
+
+@case("get_all_suppliers")
+async def _(ctx: Context, i: int):
+    await AsyncORM.get_all_suppliers()
+
+@case("get_all_storages")
+async def _(ctx: Context, i: int):
+    await AsyncORM.get_all_storages()
+
+@case("get_product")
+async def _(ctx: Context, i: int):
+    await AsyncORM.get_product(ctx.product())
+
+@case("get_supplier")
+async def _(ctx: Context, i: int):
+    await AsyncORM.get_supplier(ctx.supplier())
+
+@case("get_storage")
+async def _(ctx: Context, i: int):
+    await AsyncORM.get_storage(ctx.storage())
+
+@case("get_leftovers")
+async def _(ctx: Context, i: int):
+    await AsyncORM.get_leftovers()
+
+@case("get_leftovers (num=10)")
+async def _(ctx: Context, i: int):
+    await AsyncORM.get_leftovers(10)
+
+@case("get_product_stock_summary")
+async def _(ctx: Context, i: int):
+    await AsyncORM.get_product_stock_summary()
+
+@case("get_storage_stock_summary")
+async def _(ctx: Context, i: int):
+    await AsyncORM.get_storage_stock_summary()
+
+@case("filter_products")
+async def _(ctx: Context, i: int):
+    await AsyncORM.filter_products([ctx.supplier(), ctx.supplier()], [ctx.storage()], in_stock=True)
+
+@case("get_products_with_suppliers")
+async def _(ctx: Context, i: int):
+    await AsyncORM.get_products_with_suppliers()
+
+# подсказки при вводе на данных benchmarks.seed: уточненный запрос и запрос, которому соответствуют все товары
+@case("search_products")
+async def _(ctx: Context, i: int):
+    await AsyncORM.search_products(f"тов {ctx.product()}")
+
+@case("search_products (общий префикс)")
+async def _(ctx: Context, i: int):
+    await AsyncORM.search_products("тов")
+
+@case("search_suppliers")
+async def _(ctx: Context, i: int):
+    await AsyncORM.search_suppliers(f"пост {ctx.supplier()}")
+
+@case("search_suppliers (телефон)")
+async def _(ctx: Context, i: int):
+    await AsyncORM.search_suppliers(phone_for(ctx.supplier())[:10])
+
+# у потоковой выгрузки замеряется время до первой порции строк
+@case("stream_leftovers (первая порция)")
+async def _(ctx: Context, i: int):
+    chunks = AsyncORM.stream_leftovers()
+    await chunks.__anext__()
+    await chunks.aclose()
+
+@case("stream_products_with_suppliers (первая порция)")
+async def _(ctx: Context, i: int):
+    chunks = AsyncORM.stream_products_with_suppliers()
+    await chunks.__anext__()
+    await chunks.aclose()
+
+# ---------- вставка ----------
+@case("insert_product")
+async def _(ctx: Context, i: int):
+    ctx.created["products"].append(await AsyncORM.insert_product(ProductAddDTO(product_name=f"{MARK}{i}")))
+
+@case("insert_supplier")
+async def _(ctx: Context, i: int):
+    # телефоны замеров не пересекаются со сгенерированными: 9 000 000 000 + номер вызова
+    number = 9_000_000_000 + next(ctx.counter)
+    supplier = SupplierAddDTO(supplier_name=f"{MARK}{i}", phone=phone_for(number))
+    ctx.created["suppliers"].append(await AsyncORM.insert_supplier(supplier))
+
+@case("insert_storage")
+async def _(ctx: Context, i: int):
+    ctx.created["storages"].append(await AsyncORM.insert_storage(StorageAddDTO(storage_name=f"{MARK}{i}")))
+
+@case("bulk_insert_products (100 строк)")
+async def _(ctx: Context, i: int):
+    rows = {row: ProductAddDTO(product_name=f"{MARK}bulk {i}-{row}") for row in range(1, 101)}
+    ids, _ = await AsyncORM.bulk_insert_products(rows)
+    ctx.product_batches.append(list(ids.values()))
+
+# связи создаются для товаров, вставленных замером insert_product, и удаляются следующими замерами
+@case("add_supplier_product_rel")
+async def _(ctx: Context, i: int):
+    await AsyncORM.add_supplier_product_rel(SupplyDTO(product_id=ctx.created_at("products", i), supplier_id=1))
+
+@case("delete_supply")
+async def _(ctx: Context, i: int):
+    await AsyncORM.delete_supply(ctx.created_at("products", i), 1)
+
+@case("add_storage_product_rel")
+async def _(ctx: Context, i: int):
+    await AsyncORM.add_storage_product_rel(PurchaseDTO(product_id=ctx.created_at("products", i), storage_id=1, leftover=10))
+
+@case("update_purchase")
+async def _(ctx: Context, i: int):
+    await AsyncORM.update_purchase(PurchaseDTO(product_id=ctx.created_at("products", i), storage_id=1, leftover=20))
+
+@case("delete_purchase")
+async def _(ctx: Context, i: int):
+    await AsyncORM.delete_purchase(ctx.created_at("products", i), 1)
+
+# ---------- изменение (значения совпадают со сгенерированными) ----------
+@case("update_product")
+async def _(ctx: Context, i: int):
+    product_id = ctx.product()
+    await AsyncORM.update_product(ProductDTO(
+        product_id=product_id, product_name=f"Товар {product_id}", product_description=f"Описание товара {product_id}",
+    ))
+
+@case("update_supplier")
+async def _(ctx: Context, i: int):
+    supplier_id = ctx.supplier()
+    await AsyncORM.update_supplier(SupplierDTO(
+        supplier_id=supplier_id, supplier_name=f"Поставщик {supplier_id}",
+        email=f"supplier{supplier_id}@example.com", phone=phone_for(supplier_id),
+    ))
+
+@case("update_storage")
+async def _(ctx: Context, i: int):
+    storage_id = ctx.storage()
+    await AsyncORM.update_storage(StorageDTO(
+        storage_id=storage_id, storage_name=f"Склад {storage_id}", address=f"ул. Складская, {storage_id}",
+    ))
+
+# ---------- движения остатков: четные вызовы - приход, нечетные - расход ----------
+@case("move_stock")
+async def _(ctx: Context, i: int):
+    product_id, storage_id = ctx.pairs[i // 2 % len(ctx.pairs)]
+    await AsyncORM.move_stock(MovementDTO(product_id=product_id, storage_id=storage_id, delta=1 if i % 2 == 0 else -1))
+
+@case("move_stock_batch (10 позиций)")
+async def _(ctx: Context, i: int):
+    start = i // 2 * 10
+    items = [
+        MovementDTO(product_id=product_id, storage_id=storage_id, delta=1 if i % 2 == 0 else -1)
+        for product_id, storage_id in (ctx.pairs[(start + k) % len(ctx.pairs)] for k in range(10))
+    ]
+    await AsyncORM.move_stock_batch(items)
+
+@case("transfer_stock")
+async def _(ctx: Context, i: int):
+    product_id, storage_id, other = ctx.transfers[i // 2 % len(ctx.transfers)]
+    source, target = (storage_id, other) if i % 2 == 0 else (other, storage_id)
+    await AsyncORM.transfer_stock([TransferDTO(product_id=product_id, from_storage_id=source, to_storage_id=target, quantity=1)])
+
+# ---------- удаление записей, созданных замерами вставки ----------
+@case("delete_product")
+async def _(ctx: Context, i: int):
+    await AsyncORM.delete_product(ctx.take("products"))
+
+@case("delete_products (100 ID)")
+async def _(ctx: Context, i: int):
+    if not ctx.product_batches:
+        raise LookupError("нет товаров, созданных замером bulk_insert_products, - запустите его вместе с этим замером")
+    await AsyncORM.delete_products(ctx.product_batches.pop())
+
+@case("delete_supplier")
+async def _(ctx: Context, i: int):
+    await AsyncORM.delete_supplier(ctx.take("suppliers"))
+
+@case("delete_storage")
+async def _(ctx: Context, i: int):
+    await AsyncORM.delete_storage(ctx.take("storages"))
+
+async def load_context(sample: int) -> Context:
+    async with async_engine.connect() as conn:
+        counts = [
+            (await conn.execute(select(func.max(id_column)))).scalar() or 0
+            for id_column in (ProductOrm.product_id, SupplierOrm.supplier_id, StorageOrm.storage_id)
+        ]
+        if not all(counts):
+            raise SystemExit("В БД нет данных: сначала запустите python -m benchmarks.seed.")
+        # позиции случайных товаров, остатка которых хватает на параллельные приходы и расходы
+        product_ids = random.sample(range(1, counts[0] + 1), min(sample, counts[0]))
+        stock = ProductsAndStoragesORM
+        res = await conn.execute(
+            select(stock.product_id, stock.storage_id)
+            .where(stock.product_id.in_(product_ids), stock.leftover >= 10)
+            .limit(sample)
+        )
+        pairs = [tuple(row) for row in res]
+        other = aliased(ProductsAndStoragesORM)
+        res = await conn.execute(
+            select(stock.product_id, stock.storage_id, other.storage_id)
+            .join(other, and_(other.product_id == stock.product_id, other.storage_id > stock.storage_id))
+            .where(stock.product_id.in_(product_ids), stock.leftover >= 10, other.leftover >= 10)
+            .limit(sample)
+        )
+        transfers = [tuple(row) for row in res]
+    if not pairs or not transfers:
+        raise SystemExit("В БД нет остатков: сначала запустите python -m benchmarks.seed.")
+    return Context(products=counts[0], suppliers=counts[1], storages=counts[2], pairs=pairs, transfers=transfers)
+
+async def cleanup() -> None:
+    async with async_engine.begin() as conn:
+        await conn.execute(delete(ProductOrm).where(ProductOrm.product_name.startswith(MARK)))
+        await conn.execute(delete(SupplierOrm).where(SupplierOrm.supplier_name.startswith(MARK)))
+        await conn.execute(delete(StorageOrm).where(StorageOrm.storage_name.startswith(MARK)))
+
+async def measure(name: str, func: Case, ctx: Context, iterations: int, concurrency: int, offset: int) -> dict[str, Any]:
+    latencies: list[float] = []
+    errors: list[BaseException] = []
+    calls = iter(range(offset, offset + iterations))
+
+    async def worker():
+        for i in calls:
+            started = time.perf_counter()
+            try:
+                await func(ctx, i)
+            except Exception as e:
+                errors.append(e)
+                continue
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    if errors:
+        print(f"  {name}: {len(errors)} ошибок, первая: {errors[0]!r}")
+    return summarize(name, latencies, elapsed, len(errors))
+
+async def run(args) -> int:
+    if not args.cache:
+        # по умолчанию замеряется обращение к БД, а не попадание в кэш справочников
+        reference_cache.max_size = 0
+    random.seed(args.seed)
+    ctx = await load_context(args.sample)
+    cases = [(name, func) for name, func in CASES if not args.only or any(part in name for part in args.only)]
+    print(
+        f"Данные: {ctx.products} товаров, {ctx.suppliers} поставщиков, {ctx.storages} складов; "
+        f"{args.iterations} вызовов x {len(cases)} методов, параллельно {args.concurrency}\n"
+    )
+    results = []
+    try:
+        for name, func in cases:
+            # прогрев выполняется теми же вызовами, поэтому вставки прогрева тоже попадают в created
+            if args.warmup:
+                await measure(name, func, ctx, args.warmup, 1, 0)
+            results.append(await measure(name, func, ctx, args.iterations, args.concurrency, args.warmup))
+    finally:
+        await cleanup()
+        await async_engine.dispose()
+    params = {key: value for key, value in vars(args).items() if key not in ("save", "baseline", "tolerance")}
+    return report(args, "orm", params, results)
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Микро-замеры методов AsyncORM")
+    parser.add_argument("--iterations", type=int, default=200, help="вызовов каждого метода")
+    parser.add_argument("--warmup", type=int, default=10, help="вызовов прогрева (не учитываются)")
+    parser.add_argument("--concurrency", type=int, default=1, help="параллельных вызовов")
+    parser.add_argument("--only", nargs="*", help="замерять только методы, в названии которых есть одна из подстрок")
+    parser.add_argument("--sample", type=int, default=1000, help="позиций (товар, склад) для движений остатков")
+    parser.add_argument("--seed", type=int, default=42, help="seed генератора случайных ID")
+    parser.add_argument("--cache", action="store_true", help="не отключать кэш справочников")
+    add_report_arguments(parser)
+    args = parser.parse_args()
+    raise SystemExit(asyncio.run(run(args)))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+# Данный файл содержит замер пропускной способности AsyncORM при разных размерах пула соединений:
+# для каждого размера создается отдельный движок, --concurrency задач в течение --duration секунд вызывают
+# методы чтения со случайными ID, выводятся пропускная способность, перцентили и среднее ожидание соединения.
+# Запуск из корня репозитория: python -m benchmarks.pool --sizes 5 10 20 40 --concurrency 64 --save pool.json
+import argparse
+import asyncio
+import random
+import time
+from typing import Any
+
+from sqlalchemy import func, select
+
+from benchmarks.stats import add_report_arguments, report, summarize
+from src.DB.cache import reference_cache
+from src.DB.crud import AsyncORM
+from src.DB.database import async_engine, async_session_factory, make_engine
+from src.DB.models import ProductOrm
+from src.DB.pagination import encode_cursor
+from src.metrics import db_pool_wait_seconds
+
+# смесь запросов чтения: карточка товара, страница списка товаров, страница остатков
+async def call(products: list[int]) -> None:
+    kind = random.random()
+    if kind < 0.6:
+        await AsyncORM.get_product(random.choice(products))
+    elif kind < 0.9:
+        await AsyncORM.get_all_products(after=encode_cursor([random.choice(products)]))
+    else:
+        await AsyncORM.get_leftovers(10)
+
+async def measure(size: int, products: list[int], args) -> dict[str, Any]:
+    engine = make_engine(pool_size=size, max_overflow=args.max_overflow)
+    # методы AsyncORM открывают сессии через общую фабрику - на время замера она привязана к новому движку
+    async_session_factory.configure(bind=engine)
+    latencies: list[float] = []
+    errors: list[BaseException] = []
+
+    async def worker(deadline: float, record: bool) -> None:
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                await call(products)
+            except Exception as e:
+                if record:
+                    errors.append(e)
+                continue
+            if record:
+                latencies.append(time.perf_counter() - started)
+
+    try:
+        if args.warmup > 0:
+            deadline = time.perf_counter() + args.warmup
+            await asyncio.gather(*(worker(deadline, False) for _ in range(args.concurrency)))
+        waits_before, wait_before = db_pool_wait_seconds.totals()
+        started = time.perf_counter()
+        deadline = started + args.duration
+        await asyncio.gather(*(worker(deadline, True) for _ in range(args.concurrency)))
+        elapsed = time.perf_counter() - started
+        waits_after, wait_after = db_pool_wait_seconds.totals()
+    finally:
+        await engine.dispose()
+        async_session_factory.configure(bind=async_engine)
+
+    name = f"pool_size={size}" + (f"+{args.max_overflow}" if args.max_overflow else "")
+    if errors:
+        print(f"  {name}: {len(errors)} ошибок, первая: {errors[0]!r}")
+    waits = waits_after - waits_before
+    mean_wait = (wait_after - wait_before) / waits * 1000 if waits else 0.0
+    print(f"  {name}: среднее ожидание соединения {mean_wait:.3f} мс")
+    return summarize(name, latencies, elapsed, len(errors))
+
+async def run(args) -> int:
+    # замеряется обращение к БД, а не попадание в кэш справочников
+    reference_cache.max_size = 0
+    random.seed(args.seed)
+    # ID существующих товаров (после замеров удаления в диапазоне 1..max(ID) бывают пропуски)
+    async with async_engine.connect() as conn:
+        await conn.execute(select(func.setseed(args.seed / 2 ** 31)))
+        res = await conn.execute(select(ProductOrm.product_id).order_by(func.random()).limit(args.sample))
+        products = list(res.scalars())
+    if not products:
+        raise SystemExit("В БД нет данных: сначала запустите python -m benchmarks.seed.")
+    print(f"Данные: {len(products)} случайных товаров; {args.concurrency} задач, {args.duration} с на каждый размер пула\n")
+    try:
+        results = [await measure(size, products, args) for size in args.sizes]
+    finally:
+        await async_engine.dispose()
+    print()
+    params = {key: value for key, value in vars(args).items() if key not in ("save", "baseline", "tolerance")}
+    return report(args, "pool", params, results)
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Пропускная способность при разных размерах пула соединений")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[5, 10, 20, 40], help="размеры пула (DB_POOL_SIZE)")
+    parser.add_argument("--max-overflow", type=int, default=0, help="соединений сверх размера пула (DB_MAX_OVERFLOW)")
+    parser.add_argument("--concurrency", type=int, default=64, help="одновременных задач")
+    parser.add_argument("--duration", type=float, default=10, help="длительность замера каждого размера, с")
+    parser.add_argument("--warmup", type=float, default=2, help="длительность прогрева, с (не учитывается)")
+    parser.add_argument("--sample", type=int, default=10000, help="количество случайных товаров, к которым идут запросы")
+    parser.add_argument("--seed", type=int, default=42, help="seed генератора случайных ID")
+    add_report_arguments(parser)
+    args = parser.parse_args()
+    raise SystemExit(asyncio.run(run(args)))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+# Данный файл содержит генератор синтетических данных для замеров: заполняет товары, поставщиков, склады,
+# поставки и остатки заданными объемами. Строки генерируются на стороне PostgreSQL (generate_series),
+# поэтому даже 1 млн товаров x 50 складов не передается через сеть построчно.
+# Запуск из корня репозитория: python -m benchmarks.seed --products 1000000 --storages 50 --truncate
+import argparse
+import asyncio
+import time
+
+from sqlalchemy import func, select, text
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from src.DB.schema import upgrade_schema
+from src.DB.database import async_engine
+from src.DB.models import ProductOrm
+
+TABLES = [
+    "products_and_storages",
+    "products_and_suppliers",
+    "product_stock_totals",
+    "storage_stock_totals",
+    "products",
+    "suppliers",
+    "storages",
+]
+
+# номер телефона поставщика однозначно получается из его номера: 1 -> +7(000)000-00-01
+PHONE_SQL = (
+    "'+7(' || substr(lpad(g::text, 10, '0'), 1, 3) || ')' || substr(lpad(g::text, 10, '0'), 4, 3)"
+    " || '-' || substr(lpad(g::text, 10, '0'), 7, 2) || '-' || substr(lpad(g::text, 10, '0'), 9, 2)"
+)
+
+async def execute(conn: AsyncConnection, sql: str, **params) -> int:
+    res = await conn.execute(text(sql), params)
+    await conn.commit()
+    return res.rowcount
+
+# генерация выполняется порциями по chunk строк: каждая порция - отдельная транзакция,
+# чтобы не держать одну транзакцию на десятки миллионов строк
+async def seed_range(conn: AsyncConnection, label: str, total: int, chunk: int, sql: str, **params) -> None:
+    started = time.perf_counter()
+    rows = 0
+    for low in range(1, total + 1, chunk):
+        high = min(low + chunk - 1, total)
+        rows += await execute(conn, sql, low=low, high=high, **params)
+        print(f"\r  {label}: {high}/{total}", end="", flush=True)
+    elapsed = time.perf_counter() - started
+    print(f"\r  {label}: {rows} строк за {elapsed:.1f} с ({rows / max(elapsed, 1e-9):.0f} строк/с)")
+
+async def seed(args) -> None:
+    if args.suppliers_per_product > args.suppliers:
+        raise SystemExit("--suppliers-per-product не может быть больше --suppliers.")
+    await upgrade_schema()
+    # все порции выполняются в одном соединении: setseed действует в пределах сеанса
+    async with async_engine.connect() as conn:
+        await fill(conn, args)
+    await async_engine.dispose()
+
+async def fill(conn: AsyncConnection, args) -> None:
+    if args.truncate:
+        await execute(conn, f"TRUNCATE {', '.join(TABLES)} RESTART IDENTITY CASCADE")
+    elif (await conn.execute(select(func.count()).select_from(ProductOrm))).scalar():
+        raise SystemExit("В БД уже есть товары: запустите с --truncate, чтобы очистить таблицы перед генерацией.")
+
+    print(f"Генерация: {args.products} товаров, {args.suppliers} поставщиков, {args.storages} складов")
+    # одинаковый seed дает одинаковые остатки - замеры разных релизов сопоставимы
+    await execute(conn, "SELECT setseed(CAST(:seed AS float))", seed=args.seed)
+
+    await seed_range(
+        conn, "товары", args.products, args.chunk,
+        "INSERT INTO products (product_name, product_description) "
+        "SELECT 'Товар ' || g, 'Описание товара ' || g FROM generate_series(CAST(:low AS int), CAST(:high AS int)) AS g",
+    )
+    await seed_range(
+        conn, "поставщики", args.suppliers, args.chunk,
+        "INSERT INTO suppliers (supplier_name, email, phone) "
+        f"SELECT 'Поставщик ' || g, 'supplier' || g || '@example.com', {PHONE_SQL} FROM generate_series(CAST(:low AS int), CAST(:high AS int)) AS g",
+    )
+    await seed_range(
+        conn, "склады", args.storages, args.chunk,
+        "INSERT INTO storages (storage_name, address) "
+        "SELECT 'Склад ' || g, 'ул. Складская, ' || g FROM generate_series(CAST(:low AS int), CAST(:high AS int)) AS g",
+    )
+    # товар p поставляют поставщики p, p + 1, ..., p + k - 1 (по модулю количества поставщиков)
+    await seed_range(
+        conn, "поставки", args.products, args.chunk,
+        "INSERT INTO products_and_suppliers (product_id, supplier_id) "
+        "SELECT p, ((p - 1 + j) % CAST(:suppliers AS int)) + 1 "
+        "FROM generate_series(CAST(:low AS int), CAST(:high AS int)) AS p, generate_series(0, CAST(:per_product AS int) - 1) AS j",
+        suppliers=args.suppliers, per_product=args.suppliers_per_product,
+    )
+    # товар есть на складе с вероятностью fill, остаток равномерно распределен в [0, max_leftover]
+    await seed_range(
+        conn, "остатки", args.products, max(1, args.chunk // max(args.storages, 1)),
+        "INSERT INTO products_and_storages (product_id, storage_id, leftover) "
+        "SELECT p, s, floor(random() * (CAST(:max_leftover AS int) + 1))::int "
+        "FROM generate_series(CAST(:low AS int), CAST(:high AS int)) AS p, generate_series(1, CAST(:storages AS int)) AS s "
+        "WHERE CAST(:fill AS float) >= 1 OR random() < CAST(:fill AS float)",
+        storages=args.storages, fill=args.fill, max_leftover=args.max_leftover,
+    )
+
+    # свежая статистика планировщика - иначе первые замеры после генерации идут по неверным планам
+    await execute(conn, f"ANALYZE {', '.join(TABLES)}")
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Генерация синтетических данных для замеров производительности")
+    parser.add_argument("--products", type=int, default=100000, help="количество товаров")
+    parser.add_argument("--suppliers", type=int, default=1000, help="количество поставщиков")
+    parser.add_argument("--storages", type=int, default=50, help="количество складов")
+    parser.add_argument("--suppliers-per-product", type=int, default=2, help="поставщиков у каждого товара")
+    parser.add_argument("--fill", type=float, default=1.0, help="доля складов, на которых есть каждый товар (0..1)")
+    parser.add_argument("--max-leftover", type=int, default=1000, help="максимальный остаток товара на складе")
+    parser.add_argument("--chunk", type=int, default=100000, help="строк в одной транзакции")
+    parser.add_argument("--seed", type=float, default=0.42, help="seed генератора случайных чисел PostgreSQL (-1..1)")
+    parser.add_argument("--truncate", action="store_true", help="очистить таблицы перед генерацией")
+    args = parser.parse_args()
+    asyncio.run(seed(args))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+# Данный файл содержит замер стоимости сериализации одной строки списка: прежний путь
+# (model_validate для каждой строки + проверка и кодирование ответа в FastAPI) против быстрого пути
+# (DTO без повторной валидации + JSON-байты из pydantic-core).
+# Запуск из корня репозитория: python -m benchmarks.serialization --rows 1000
+import argparse
+import asyncio
+import json
+import time
+from typing import Any, Callable
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_model_field
+
+from src.schemas import LeftoversDTO, Page, ProductDTO, ProductsAndSuppliers, StorageDTO, SupplierDTO
+from src.serialization import json_response, rows_to_page
+
+# строки в том виде, в котором их возвращает res.mappings().all()
+def make_rows(dto: type, count: int) -> list[dict[str, Any]]:
+    samples = {
+        ProductDTO: lambda i: {"product_id": i, "product_name": f"Товар {i}", "product_description": f"Описание товара {i}", "version": 1},
+        SupplierDTO: lambda i: {"supplier_id": i, "supplier_name": f"Поставщик {i}", "email": f"supplier{i}@example.com", "phone": "+7(900)123-45-67", "version": 1},
+        StorageDTO: lambda i: {"storage_id": i, "storage_name": f"Склад {i}", "address": f"ул. Складская, {i}", "version": 1},
+        LeftoversDTO: lambda i: {"product_id": i, "product_name": f"Товар {i}", "storage_id": i % 10, "storage_name": f"Склад {i % 10}", "leftover": i % 500},
+        ProductsAndSuppliers: lambda i: {"product_id": i, "product_name": f"Товар {i}", "supplier_id": i % 50, "supplier_name": f"Поставщик {i % 50}", "email": f"supplier{i % 50}@example.com", "phone": "+7(900)123-45-67", "version": 1},
+    }
+    return [samples[dto](i) for i in range(1, count + 1)]
+
+# прежний путь: DTO для каждой строки, затем FastAPI проверяет ответ по response_model и кодирует его в JSON
+def legacy_path(dto: type, rows: list[dict[str, Any]]) -> bytes:
+    field = create_model_field(name="Response", type_=Page[dto], mode="serialization")
+    page = Page[dto](items=[dto.model_validate(row) for row in rows], next_cursor=None)
+    content = asyncio.run(serialize_response(field=field, response_content=page, is_coroutine=True))
+    return JSONResponse(content).body
+
+# быстрый путь: crud -> rows_to_page, маршрут -> json_response
+def fast_path(dto: type, rows: list[dict[str, Any]]) -> bytes:
+    return json_response(rows_to_page(dto, rows, None)).body
+
+def per_row_us(func: Callable[[type, list], bytes], dto: type, rows: list, repeat: int) -> float:
+    func(dto, rows)
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func(dto, rows)
+        best = min(best, time.perf_counter() - started)
+    return best / len(rows) * 1e6
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Стоимость сериализации строки списка до и после быстрого пути")
+    parser.add_argument("--rows", type=int, default=1000, help="количество строк на странице")
+    parser.add_argument("--repeat", type=int, default=20, help="количество повторов, берется лучший результат")
+    args = parser.parse_args()
+
+    print(f"{'DTO':<22}{'до, мкс/строка':>16}{'после, мкс/строка':>20}{'ускорение':>12}")
+    for dto in (ProductDTO, SupplierDTO, StorageDTO, LeftoversDTO, ProductsAndSuppliers):
+        rows = make_rows(dto, args.rows)
+        # оба пути должны отдавать один и тот же JSON
+        assert json.loads(legacy_path(dto, rows)) == json.loads(fast_path(dto, rows))
+        before = per_row_us(legacy_path, dto, rows, args.repeat)
+        after = per_row_us(fast_path, dto, rows, args.repeat)
+        print(f"{dto.__name__:<22}{before:>16.2f}{after:>20.2f}{before / after:>11.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+# Данный файл содержит общие для замеров функции: перцентили, таблица результатов,
+# сохранение результатов в JSON и сравнение с результатами предыдущего релиза
+import json
+import math
+import platform
+import sys
+import time
+from typing import Any, Optional, Sequence
+
+# перцентиль по методу ближайшего ранга; values должны быть отсортированы
+def percentile(values: Sequence[float], q: float) -> float:
+    if not values:
+        return 0.0
+    rank = max(1, math.ceil(q / 100 * len(values)))
+    return values[rank - 1]
+
+# сводка по одной операции (методу AsyncORM или эндпоинту); latencies - длительности в секундах
+def summarize(name: str, latencies: list[float], elapsed: float, errors: int = 0) -> dict[str, Any]:
+    values = sorted(latencies)
+    ms = lambda seconds: round(seconds * 1000, 3)
+    return {
+        "name": name,
+        "count": len(values),
+        "errors": errors,
+        "throughput": round(len(values) / elapsed, 1) if elapsed > 0 else 0.0,
+        "mean_ms": ms(sum(values) / len(values)) if values else 0.0,
+        "p50_ms": ms(percentile(values, 50)),
+        "p95_ms": ms(percentile(values, 95)),
+        "p99_ms": ms(percentile(values, 99)),
+        "max_ms": ms(values[-1]) if values else 0.0,
+    }
+
+def print_table(results: list[dict[str, Any]]) -> None:
+    width = max([len(result["name"]) for result in results] + [10]) + 2
+    print(f"{'операция':<{width}}{'кол-во':>9}{'ошибки':>8}{'оп/с':>10}{'mean, мс':>11}{'p50, мс':>10}{'p95, мс':>10}{'p99, мс':>10}")
+    for result in results:
+        print(
+            f"{result['name']:<{width}}{result['count']:>9}{result['errors']:>8}{result['throughput']:>10.1f}"
+            f"{result['mean_ms']:>11.3f}{result['p50_ms']:>10.3f}{result['p95_ms']:>10.3f}{result['p99_ms']:>10.3f}"
+        )
+
+# результаты сохраняются вместе с параметрами запуска, чтобы сравнивать только сопоставимые замеры
+def save_results(path: str, kind: str, params: dict[str, Any], results: list[dict[str, Any]]) -> None:
+    payload = {
+        "kind": kind,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "params": params,
+        "results": results,
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(payload, f, ensure_ascii=False, indent=2)
+
+# Сравнение с базовым замером: регрессией считается рост p95 больше чем на tolerance (доля, 0.2 = 20%)
+# или появление ошибок. Возвращает список описаний регрессий
+def compare(results: list[dict[str, Any]], params: dict[str, Any], baseline_path: str, tolerance: float) -> list[str]:
+    with open(baseline_path, encoding="utf-8") as f:
+        payload = json.load(f)
+    baseline = {result["name"]: result for result in payload["results"]}
+
+    regressions = []
+    print(f"\nСравнение с {baseline_path} (допуск {tolerance:.0%} по p95):")
+    differs = sorted(key for key in params.keys() & payload["params"].keys() if params[key] != payload["params"][key])
+    if differs:
+        print(f"  внимание: параметры запуска отличаются от базового замера ({', '.join(differs)})")
+    for result in results:
+        base: Optional[dict[str, Any]] = baseline.get(result["name"])
+        if base is None:
+            print(f"  {result['name']}: нет в базовом замере")
+            continue
+        change = (result["p95_ms"] - base["p95_ms"]) / base["p95_ms"] if base["p95_ms"] else 0.0
+        print(f"  {result['name']}: p95 {base['p95_ms']:.3f} -> {result['p95_ms']:.3f} мс ({change:+.1%})")
+        if change > tolerance:
+            regressions.append(f"{result['name']}: p95 вырос на {change:.1%}")
+        if result["errors"] > base["errors"]:
+            regressions.append(f"{result['name']}: ошибок {base['errors']} -> {result['errors']}")
+    return regressions
+
+# общие для замеров параметры командной строки
+def add_report_arguments(parser) -> None:
+    parser.add_argument("--save", metavar="PATH", help="сохранить результаты в JSON")
+    parser.add_argument("--baseline", metavar="PATH", help="сравнить с результатами, сохраненными через --save")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="допустимый рост p95 относительно базового замера (0.2 = 20%%)")
+
+# печать, сохранение и сравнение; код возврата 1, если найдены регрессии
+def report(args, kind: str, params: dict[str, Any], results: list[dict[str, Any]]) -> int:
+    print_table(results)
+    if args.save:
+        save_results(args.save, kind, params, results)
+        print(f"\nРезультаты сохранены в {args.save}")
+    if args.baseline:
+        regressions = compare(results, params, args.baseline, args.tolerance)
+        if regressions:
+            print("\nРегрессии:")
+            for regression in regressions:
+                print(f"  {regression}")
+            return 1
+    return 0
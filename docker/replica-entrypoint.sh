@@ -0,0 +1,19 @@
+#!/bin/sh
+# Запуск реплики для docker-compose.replica.yml: при первом запуске (пустой том) данные копируются
+# с основного сервера (pg_basebackup -R создает standby.signal и строку подключения к нему),
+# затем стандартный entrypoint образа запускает postgres в режиме реплики
+set -e
+
+if [ ! -s "$PGDATA/PG_VERSION" ]; then
+    until pg_isready -h db -U "$POSTGRES_USER" -q; do
+        echo "ожидание основного сервера БД..."
+        sleep 1
+    done
+    mkdir -p "$PGDATA"
+    chown postgres:postgres "$PGDATA"
+    chmod 700 "$PGDATA"
+    PGPASSWORD="$POSTGRES_PASSWORD" su-exec postgres \
+        pg_basebackup -h db -U "$POSTGRES_USER" -D "$PGDATA" -R -X stream
+fi
+
+exec docker-entrypoint.sh postgres
@@ -0,0 +1,76 @@
+# Данный файл содержит окружение Alembic: подключение к БД из настроек приложения
+# и метаданные ORM моделей (для alembic revision --autogenerate)
+import asyncio
+from logging.config import fileConfig
+
+from alembic import context
+from sqlalchemy import pool
+from sqlalchemy.engine import Connection
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from src.DB.config import settings
+from src.DB.database import Base
+# импорт моделей регистрирует таблицы в Base.metadata
+import src.DB.models  # noqa: F401
+
+config = context.config
+# при запуске из приложения (src.DB.schema) соединение передается готовым,
+# а журналирование приложения не перенастраивается
+connection = config.attributes.get("connection")
+if connection is None and config.config_file_name is not None:
+    fileConfig(config.config_file_name)
+
+target_metadata = Base.metadata
+
+# Индексы по выражениям с info={"skip_autogenerate": True} не сравниваются: PostgreSQL хранит выражение
+# в собственной записи (с приведениями типов и скобками), и autogenerate каждый раз видит в нем изменение.
+# Такие индексы создаются и изменяются только миграциями, написанными вручную
+def include_object(object, name, type_, reflected, compare_to) -> bool:
+    if type_ == "index":
+        index = compare_to if reflected else object
+        if index is not None and index.info.get("skip_autogenerate"):
+            return False
+    return True
+
+# генерация SQL-скрипта без подключения к БД: alembic upgrade head --sql
+def run_migrations_offline() -> None:
+    context.configure(
+        url=settings.DATABASE_URL_asyncpg,
+        target_metadata=target_metadata,
+        include_object=include_object,
+        literal_binds=True,
+        dialect_opts={"paramstyle": "named"},
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+# Каждая миграция выполняется в своей транзакции: миграции с CREATE INDEX CONCURRENTLY
+# выходят из транзакции (autocommit_block), и уже примененные миграции не откатываются
+def do_run_migrations(connection: Connection) -> None:
+    context.configure(
+        connection=connection,
+        target_metadata=target_metadata,
+        include_object=include_object,
+        transaction_per_migration=True,
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+# Отдельное соединение без пула; подготовленные запросы не кэшируются -
+# миграции выполняются один раз, а через PgBouncer (DB_PGBOUNCER) кэш не работает
+async def run_async_migrations() -> None:
+    engine = create_async_engine(
+        settings.DATABASE_URL_asyncpg,
+        poolclass=pool.NullPool,
+        connect_args={"statement_cache_size": 0, "prepared_statement_cache_size": 0},
+    )
+    async with engine.connect() as conn:
+        await conn.run_sync(do_run_migrations)
+    await engine.dispose()
+
+if context.is_offline_mode():
+    run_migrations_offline()
+elif connection is not None:
+    do_run_migrations(connection)
+else:
+    asyncio.run(run_async_migrations())
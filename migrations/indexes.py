@@ -0,0 +1,17 @@
+# Данный файл содержит общую часть миграций, создающих индексы без блокировки записи (CONCURRENTLY)
+from alembic import op
+import sqlalchemy as sa
+
+
+# Прерванная сборка CREATE INDEX CONCURRENTLY оставляет невалидный индекс, который IF NOT EXISTS считает
+# созданным. Такой индекс удаляется перед повторной сборкой. Вызывается внутри autocommit_block()
+def drop_invalid_index(name: str, table: str) -> None:
+    invalid = op.get_bind().execute(
+        sa.text(
+            "SELECT 1 FROM pg_index JOIN pg_class ON pg_class.oid = pg_index.indexrelid "
+            "WHERE pg_class.relname = :name AND NOT pg_index.indisvalid"
+        ),
+        {"name": name},
+    ).first()
+    if invalid:
+        op.drop_index(name, table_name=table, postgresql_concurrently=True)
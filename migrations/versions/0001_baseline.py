@@ -0,0 +1,185 @@
+"""Исходная схема: справочники, связи, сводные остатки и триггеры сводки
+
+Схема совпадает с создававшейся ранее через metadata.create_all при запуске приложения.
+Для такой БД миграция создает только недостающие таблицы, добавляет колонки version
+(если таблицы созданы до их появления) и пересоздает триггеры - отдельный alembic stamp не нужен.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18 12:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0001"
+down_revision: Union[str, Sequence[str], None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+VERSIONED_TABLES = ("products", "suppliers", "storages", "products_and_storages")
+
+# Триггеры уровня оператора получают все измененные строки сразу (transition tables),
+# поэтому массовые операции обновляют сводку одним запросом на таблицу, а не построчно.
+STOCK_TOTALS_DDL = [
+    """
+    CREATE OR REPLACE FUNCTION apply_stock_totals() RETURNS trigger AS $$
+    DECLARE
+        p int[]; s int[]; l bigint[]; c int[];
+    BEGIN
+        -- изменения собираются в массивы: вставленные строки с плюсом, удаленные с минусом
+        IF TG_OP = 'INSERT' THEN
+            SELECT array_agg(product_id), array_agg(storage_id), array_agg(leftover::bigint), array_agg(1)
+            INTO p, s, l, c FROM new_rows;
+        ELSIF TG_OP = 'DELETE' THEN
+            SELECT array_agg(product_id), array_agg(storage_id), array_agg(-leftover::bigint), array_agg(-1)
+            INTO p, s, l, c FROM old_rows;
+        ELSE
+            SELECT array_agg(d.product_id), array_agg(d.storage_id), array_agg(d.leftover), array_agg(d.cnt)
+            INTO p, s, l, c
+            FROM (
+                SELECT product_id, storage_id, leftover::bigint AS leftover, 1 AS cnt FROM new_rows
+                UNION ALL
+                SELECT product_id, storage_id, -leftover::bigint, -1 FROM old_rows
+            ) AS d;
+        END IF;
+        IF p IS NULL THEN
+            RETURN NULL;
+        END IF;
+
+        INSERT INTO product_stock_totals AS t (product_id, total_leftover, storages_count)
+        SELECT d.product_id, sum(d.leftover), sum(d.cnt)
+        FROM unnest(p, l, c) AS d(product_id, leftover, cnt)
+        GROUP BY d.product_id ORDER BY d.product_id
+        ON CONFLICT (product_id) DO UPDATE
+        SET total_leftover = t.total_leftover + excluded.total_leftover,
+            storages_count = t.storages_count + excluded.storages_count;
+
+        INSERT INTO storage_stock_totals AS t (storage_id, total_leftover, products_count)
+        SELECT d.storage_id, sum(d.leftover), sum(d.cnt)
+        FROM unnest(s, l, c) AS d(storage_id, leftover, cnt)
+        GROUP BY d.storage_id ORDER BY d.storage_id
+        ON CONFLICT (storage_id) DO UPDATE
+        SET total_leftover = t.total_leftover + excluded.total_leftover,
+            products_count = t.products_count + excluded.products_count;
+
+        -- позиции, которых не осталось ни на одном складе, удаляются из сводки
+        DELETE FROM product_stock_totals WHERE storages_count = 0 AND product_id = ANY(p);
+        DELETE FROM storage_stock_totals WHERE products_count = 0 AND storage_id = ANY(s);
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE OR REPLACE TRIGGER stock_totals_insert AFTER INSERT ON products_and_storages
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION apply_stock_totals()
+    """,
+    """
+    CREATE OR REPLACE TRIGGER stock_totals_update AFTER UPDATE ON products_and_storages
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION apply_stock_totals()
+    """,
+    """
+    CREATE OR REPLACE TRIGGER stock_totals_delete AFTER DELETE ON products_and_storages
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION apply_stock_totals()
+    """,
+    # первичное заполнение сводки, если она создается для уже заполненной БД
+    """
+    INSERT INTO product_stock_totals (product_id, total_leftover, storages_count)
+    SELECT product_id, sum(leftover), count(*) FROM products_and_storages
+    WHERE NOT EXISTS (SELECT 1 FROM product_stock_totals)
+    GROUP BY product_id
+    """,
+    """
+    INSERT INTO storage_stock_totals (storage_id, total_leftover, products_count)
+    SELECT storage_id, sum(leftover), count(*) FROM products_and_storages
+    WHERE NOT EXISTS (SELECT 1 FROM storage_stock_totals)
+    GROUP BY storage_id
+    """,
+]
+
+
+def version_column() -> sa.Column:
+    return sa.Column("version", sa.Integer(), server_default=sa.text("1"), nullable=False)
+
+
+def upgrade() -> None:
+    existing = set(sa.inspect(op.get_bind()).get_table_names())
+
+    if "products" not in existing:
+        op.create_table(
+            "products",
+            sa.Column("product_id", sa.Integer(), primary_key=True),
+            sa.Column("product_name", sa.String(), nullable=False),
+            sa.Column("product_description", sa.String(), nullable=True, unique=True),
+            version_column(),
+        )
+    if "suppliers" not in existing:
+        op.create_table(
+            "suppliers",
+            sa.Column("supplier_id", sa.Integer(), primary_key=True),
+            sa.Column("supplier_name", sa.String(), nullable=False),
+            sa.Column("email", sa.String(), nullable=True, unique=True),
+            sa.Column("phone", sa.String(), nullable=False, unique=True),
+            version_column(),
+        )
+    if "storages" not in existing:
+        op.create_table(
+            "storages",
+            sa.Column("storage_id", sa.Integer(), primary_key=True),
+            sa.Column("storage_name", sa.String(), nullable=False),
+            sa.Column("address", sa.String(), nullable=True, unique=True),
+            version_column(),
+        )
+    if "products_and_suppliers" not in existing:
+        op.create_table(
+            "products_and_suppliers",
+            sa.Column("product_id", sa.Integer(), sa.ForeignKey("products.product_id", ondelete="CASCADE"), primary_key=True),
+            sa.Column("supplier_id", sa.Integer(), sa.ForeignKey("suppliers.supplier_id", ondelete="CASCADE"), primary_key=True),
+        )
+    if "products_and_storages" not in existing:
+        op.create_table(
+            "products_and_storages",
+            sa.Column("product_id", sa.Integer(), sa.ForeignKey("products.product_id", ondelete="CASCADE"), primary_key=True),
+            sa.Column("storage_id", sa.Integer(), sa.ForeignKey("storages.storage_id", ondelete="CASCADE"), primary_key=True),
+            sa.Column("leftover", sa.Integer(), nullable=False),
+            version_column(),
+            sa.CheckConstraint("leftover >= 0", name="leftover_non_negative"),
+        )
+    if "product_stock_totals" not in existing:
+        op.create_table(
+            "product_stock_totals",
+            sa.Column("product_id", sa.Integer(), primary_key=True, autoincrement=False),
+            sa.Column("total_leftover", sa.BigInteger(), nullable=False),
+            sa.Column("storages_count", sa.Integer(), nullable=False),
+        )
+    if "storage_stock_totals" not in existing:
+        op.create_table(
+            "storage_stock_totals",
+            sa.Column("storage_id", sa.Integer(), primary_key=True, autoincrement=False),
+            sa.Column("total_leftover", sa.BigInteger(), nullable=False),
+            sa.Column("products_count", sa.Integer(), nullable=False),
+        )
+
+    # таблицы, созданные create_all до появления оптимистичной блокировки
+    for table in VERSIONED_TABLES:
+        op.execute(f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS version integer NOT NULL DEFAULT 1")
+    for statement in STOCK_TOTALS_DDL:
+        op.execute(sa.DDL(statement))
+
+
+def downgrade() -> None:
+    for trigger in ("stock_totals_insert", "stock_totals_update", "stock_totals_delete"):
+        op.execute(f"DROP TRIGGER IF EXISTS {trigger} ON products_and_storages")
+    op.execute("DROP FUNCTION IF EXISTS apply_stock_totals()")
+    for table in (
+        "storage_stock_totals", "product_stock_totals", "products_and_storages",
+        "products_and_suppliers", "storages", "suppliers", "products",
+    ):
+        op.drop_table(table)
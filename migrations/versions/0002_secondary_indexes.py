@@ -0,0 +1,46 @@
+"""Вторичные индексы для запросов crud.py, создаются без блокировки записи (CONCURRENTLY)
+
+- products_and_storages(storage_id): остатки склада, каскадное удаление склада
+- products_and_suppliers(supplier_id): товары поставщика, каскадное удаление поставщика
+- products_and_storages(leftover): фильтр "Товары в дефиците" (leftover < N) и max(leftover)
+- products(product_name, product_id): сортировка "Товары и поставщики" по названию
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18 12:10:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+from migrations.indexes import drop_invalid_index
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0002"
+down_revision: Union[str, Sequence[str], None] = "0001"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# (имя, таблица, колонки) - совпадают с Index в src/DB/models.py
+INDEXES = [
+    ("ix_products_and_storages_storage_id", "products_and_storages", ["storage_id"]),
+    ("ix_products_and_suppliers_supplier_id", "products_and_suppliers", ["supplier_id"]),
+    ("ix_products_and_storages_leftover", "products_and_storages", ["leftover"]),
+    ("ix_products_product_name_product_id", "products", ["product_name", "product_id"]),
+]
+
+
+def upgrade() -> None:
+    # CREATE INDEX CONCURRENTLY не выполняется внутри транзакции
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            drop_invalid_index(name, table)
+            op.create_index(name, table, columns, postgresql_concurrently=True, if_not_exists=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, table, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
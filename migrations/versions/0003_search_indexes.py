@@ -0,0 +1,61 @@
+"""Индексы поиска товаров и поставщиков для подсказок при вводе, создаются без блокировки записи (CONCURRENTLY)
+
+- products: полнотекстовый GIN-индекс по названию и описанию
+- suppliers: полнотекстовый GIN-индекс по названию и частям email
+- suppliers: индекс по цифрам телефона для поиска по началу номера
+
+Выражения совпадают с product_search_document, supplier_search_document и supplier_phone_digits
+из src/DB/models.py.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18 14:30:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+from migrations.indexes import drop_invalid_index
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0003"
+down_revision: Union[str, Sequence[str], None] = "0002"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# (имя, таблица, выражение, метод доступа)
+INDEXES = [
+    (
+        "ix_products_search", "products",
+        "to_tsvector('simple', product_name || ' ' || coalesce(product_description, ''))",
+        "gin",
+    ),
+    (
+        "ix_suppliers_search", "suppliers",
+        "to_tsvector('simple', supplier_name || ' ' || coalesce(translate(email, '@.', '  '), ''))",
+        "gin",
+    ),
+    (
+        "ix_suppliers_phone_digits", "suppliers",
+        "regexp_replace(phone, '\\D', '', 'g') text_pattern_ops",
+        "btree",
+    ),
+]
+
+
+def upgrade() -> None:
+    # CREATE INDEX CONCURRENTLY не выполняется внутри транзакции
+    with op.get_context().autocommit_block():
+        for name, table, expression, using in INDEXES:
+            drop_invalid_index(name, table)
+            op.execute(
+                f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {table} USING {using} ({expression})"
+            )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, table, _, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
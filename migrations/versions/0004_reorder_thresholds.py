@@ -0,0 +1,62 @@
+"""Пороги пополнения для каждой пары товар - склад
+
+- products_and_storages.min_stock: минимальный остаток, ниже которого позиция попадает в отчет о пополнении
+- products_and_storages.reorder_qty: количество для заказа (партия), 0 - заказывать только недостающее до min_stock
+- частичный индекс позиций с остатком ниже минимума: отчет читает только их, а индекс содержит только их
+
+Колонки с постоянным значением по умолчанию добавляются без перезаписи таблицы. Ограничения CHECK объявлены
+вместе с колонками: PostgreSQL проверяет их одним проходом по таблице под блокировкой ADD COLUMN
+(ACCESS EXCLUSIVE), на это время запись и чтение таблицы ждут. Отдельные NOT VALID / VALIDATE ничего бы
+не дали: в одной транзакции миграции VALIDATE выполнялся бы под той же блокировкой.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18 16:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from migrations.indexes import drop_invalid_index
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0004"
+down_revision: Union[str, Sequence[str], None] = "0003"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TABLE = "products_and_storages"
+# (колонка, имя ограничения, условие) - совпадают с CheckConstraint в src/DB/models.py
+COLUMNS = [
+    ("min_stock", "min_stock_non_negative", "min_stock >= 0"),
+    ("reorder_qty", "reorder_qty_non_negative", "reorder_qty >= 0"),
+]
+INDEX = "ix_products_and_storages_below_min_stock"
+
+
+def upgrade() -> None:
+    for column, name, condition in COLUMNS:
+        op.add_column(
+            TABLE,
+            sa.Column(column, sa.Integer(), sa.CheckConstraint(condition, name=name), server_default=sa.text("0"), nullable=False),
+        )
+
+    # CREATE INDEX CONCURRENTLY не выполняется внутри транзакции
+    with op.get_context().autocommit_block():
+        drop_invalid_index(INDEX, TABLE)
+        op.create_index(
+            INDEX, TABLE, ["product_id", "storage_id"],
+            postgresql_where=sa.text("leftover < min_stock"),
+            postgresql_concurrently=True, if_not_exists=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(INDEX, table_name=TABLE, postgresql_concurrently=True, if_exists=True)
+    # ограничения CHECK удаляются вместе с колонками
+    for column, _, _ in reversed(COLUMNS):
+        op.drop_column(TABLE, column)
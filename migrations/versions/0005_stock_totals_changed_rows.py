@@ -0,0 +1,98 @@
+"""Сводные остатки пересчитываются только по строкам с изменившимся остатком
+
+apply_stock_totals пропускает строки, у которых после UPDATE остались тот же ключ и тот же остаток:
+изменение порогов пополнения (min_stock, reorder_qty) или только версии строки не перезаписывает и не
+блокирует строки сводки. Список колонок в самом триггере (AFTER UPDATE OF leftover) PostgreSQL не допускает
+для триггеров с transition tables, поэтому строки отбираются в функции.
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18 18:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0005"
+down_revision: Union[str, Sequence[str], None] = "0004"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Тело функции совпадает с migrations/versions/0001_baseline.py, кроме выборки изменений для UPDATE
+FUNCTION_TEMPLATE = """
+    CREATE OR REPLACE FUNCTION apply_stock_totals() RETURNS trigger AS $$
+    DECLARE
+        p int[]; s int[]; l bigint[]; c int[];
+    BEGIN
+        -- изменения собираются в массивы: вставленные строки с плюсом, удаленные с минусом
+        IF TG_OP = 'INSERT' THEN
+            SELECT array_agg(product_id), array_agg(storage_id), array_agg(leftover::bigint), array_agg(1)
+            INTO p, s, l, c FROM new_rows;
+        ELSIF TG_OP = 'DELETE' THEN
+            SELECT array_agg(product_id), array_agg(storage_id), array_agg(-leftover::bigint), array_agg(-1)
+            INTO p, s, l, c FROM old_rows;
+        ELSE
+            SELECT array_agg(d.product_id), array_agg(d.storage_id), array_agg(d.leftover), array_agg(d.cnt)
+            INTO p, s, l, c
+            FROM (
+{update_rows}
+            ) AS d;
+        END IF;
+        IF p IS NULL THEN
+            RETURN NULL;
+        END IF;
+
+        INSERT INTO product_stock_totals AS t (product_id, total_leftover, storages_count)
+        SELECT d.product_id, sum(d.leftover), sum(d.cnt)
+        FROM unnest(p, l, c) AS d(product_id, leftover, cnt)
+        GROUP BY d.product_id ORDER BY d.product_id
+        ON CONFLICT (product_id) DO UPDATE
+        SET total_leftover = t.total_leftover + excluded.total_leftover,
+            storages_count = t.storages_count + excluded.storages_count;
+
+        INSERT INTO storage_stock_totals AS t (storage_id, total_leftover, products_count)
+        SELECT d.storage_id, sum(d.leftover), sum(d.cnt)
+        FROM unnest(s, l, c) AS d(storage_id, leftover, cnt)
+        GROUP BY d.storage_id ORDER BY d.storage_id
+        ON CONFLICT (storage_id) DO UPDATE
+        SET total_leftover = t.total_leftover + excluded.total_leftover,
+            products_count = t.products_count + excluded.products_count;
+
+        -- позиции, которых не осталось ни на одном складе, удаляются из сводки
+        DELETE FROM product_stock_totals WHERE storages_count = 0 AND product_id = ANY(p);
+        DELETE FROM storage_stock_totals WHERE products_count = 0 AND storage_id = ANY(s);
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql
+"""
+
+# строки, у которых после UPDATE остались тот же ключ и тот же остаток, в сводку не попадают
+CHANGED_ROWS = """
+                SELECT n.product_id, n.storage_id, n.leftover::bigint AS leftover, 1 AS cnt FROM new_rows AS n
+                WHERE NOT EXISTS (
+                    SELECT 1 FROM old_rows AS o
+                    WHERE o.product_id = n.product_id AND o.storage_id = n.storage_id AND o.leftover = n.leftover
+                )
+                UNION ALL
+                SELECT o.product_id, o.storage_id, -o.leftover::bigint, -1 FROM old_rows AS o
+                WHERE NOT EXISTS (
+                    SELECT 1 FROM new_rows AS n
+                    WHERE n.product_id = o.product_id AND n.storage_id = o.storage_id AND n.leftover = o.leftover
+                )"""
+
+ALL_ROWS = """
+                SELECT product_id, storage_id, leftover::bigint AS leftover, 1 AS cnt FROM new_rows
+                UNION ALL
+                SELECT product_id, storage_id, -leftover::bigint, -1 FROM old_rows"""
+
+
+def upgrade() -> None:
+    op.execute(sa.DDL(FUNCTION_TEMPLATE.format(update_rows=CHANGED_ROWS)))
+
+
+def downgrade() -> None:
+    op.execute(sa.DDL(FUNCTION_TEMPLATE.format(update_rows=ALL_ROWS)))
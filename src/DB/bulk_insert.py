@@ -0,0 +1,52 @@
+# Данный файл содержит вспомогательные функции для массовой вставки записей
+from collections import defaultdict, deque
+from typing import Any, Iterator, Optional, Sequence
+from sqlalchemy import Row
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+# у asyncpg ограничение на количество параметров в одном запросе
+MAX_QUERY_PARAMS = 32767
+
+# разбиение входных данных на порции, каждая из которых вставляется одним запросом
+def chunked(items: Sequence[Any], size: int, columns: int = 1) -> Iterator[Sequence[Any]]:
+    size = max(1, min(size, MAX_QUERY_PARAMS // max(columns, 1)))
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+# многострочный INSERT ... ON CONFLICT DO NOTHING RETURNING
+# Возвращает для каждой входной строки вставленную запись или None, если строка нарушила уникальность.
+# key - колонки, по которым вставленная запись сопоставляется с входной строкой,
+# order - serial-колонка, по которой восстанавливается порядок вставки (если есть)
+async def insert_skip_conflicts(
+    session: AsyncSession,
+    model: type,
+    rows: Sequence[dict],
+    returning: Sequence[Any],
+    key: Sequence[str],
+    order: Optional[str] = None,
+) -> list[Optional[Row]]:
+    if not rows:
+        return []
+    stmt = (
+        pg_insert(model)
+        .values(list(rows))
+        .on_conflict_do_nothing()
+        .returning(*returning)
+    )
+    res = await session.execute(stmt)
+    returned = res.all()
+    if order is not None:
+        # значения sequence выдаются в порядке строк VALUES - сортировка по ID восстанавливает порядок вставки
+        returned.sort(key=lambda row: row._mapping[order])
+
+    # вставленные записи раскладываются по ключам; при повторе ключа во входных данных
+    # вставлена была первая из строк, остальные отброшены как конфликтующие
+    buckets: dict[Any, deque] = defaultdict(deque)
+    for row in returned:
+        buckets[tuple(row._mapping[name] for name in key)].append(row)
+    matched = []
+    for row in rows:
+        bucket = buckets.get(tuple(row.get(name) for name in key))
+        matched.append(bucket.popleft() if bucket else None)
+    return matched
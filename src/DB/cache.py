@@ -0,0 +1,111 @@
+# Данный файл содержит кэш справочных данных (товары, поставщики, склады) внутри процесса
+import bisect
+import time
+from collections import OrderedDict, defaultdict
+from typing import Any, Awaitable, Callable, Iterable
+from src.DB.config import settings
+from src.DB.pagination import decode_cursor
+from src.DB.versions import table_versions
+
+# Ключ записи - кортеж (пространство имен, вид, ...): ("products", "item", 5), ("products", "list", limit, after).
+# Кэш живет в памяти одного процесса: записи других процессов сбрасывают его через ленту изменений
+# (src/DB/changes.py). Без ленты при нескольких процессах кэш отключен (см. src/DB/versions.py).
+class TTLCache:
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        # порядок записей = порядок последнего обращения (LRU)
+        self._data: OrderedDict[tuple, tuple[float, Any]] = OrderedDict()
+        # поколение пространства имен увеличивается при каждой записи в БД - результат чтения,
+        # начатого до изменения, не попадет в кэш
+        self._generations: dict[str, int] = defaultdict(int)
+        self.hits: dict[str, int] = defaultdict(int)
+        self.misses: dict[str, int] = defaultdict(int)
+        self.evictions = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_size > 0 and self.ttl > 0
+
+    def get(self, key: tuple) -> tuple[bool, Any]:
+        entry = self._data.get(key)
+        if entry is not None:
+            expires_at, value = entry
+            if expires_at > time.monotonic():
+                self._data.move_to_end(key)
+                self.hits[key[0]] += 1
+                return True, value
+            del self._data[key]
+        self.misses[key[0]] += 1
+        return False, None
+
+    def set(self, key: tuple, value: Any, generation: int) -> None:
+        if not self.enabled or self._generations[key[0]] != generation:
+            return
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def generation(self, namespace: str) -> int:
+        return self._generations[namespace]
+
+    # чтение через кэш: при промахе данные загружаются функцией load и сохраняются
+    async def get_or_load(self, key: tuple, load: Callable[[], Awaitable[Any]]) -> Any:
+        found, value = self.get(key)
+        if found:
+            return value
+        generation = self.generation(key[0])
+        value = await load()
+        self.set(key, value, generation)
+        return value
+
+    # удаление записей пространства имен, для которых predicate(key, value) истинно
+    def invalidate_where(self, namespace: str, predicate: Callable[[tuple, Any], bool]) -> None:
+        self._generations[namespace] += 1
+        for key in [key for key, (_, value) in self._data.items() if key[0] == namespace and predicate(key, value)]:
+            del self._data[key]
+
+    # удаление карточек сущностей с указанными ID и только тех страниц списка, в диапазон ключей которых они попадают.
+    # Списки отсортированы по ID, поэтому страница (after, последний ID] с курсором на следующую страницу
+    # содержит все ID из этого диапазона, а последняя страница (без курсора) - все ID больше after.
+    def invalidate_ids(self, namespace: str, ids: Iterable[int], id_attr: str) -> None:
+        ids = sorted(ids)
+        if not ids:
+            return
+        id_set = set(ids)
+
+        def touched(key: tuple, value: Any) -> bool:
+            if key[1] == "item":
+                return key[2] in id_set
+            after = key[3]
+            low = decode_cursor(after, 1)[0] if after is not None else None
+            high = getattr(value.items[-1], id_attr) if value.next_cursor is not None else None
+            start = bisect.bisect_right(ids, low) if low is not None else 0
+            return start < len(ids) and (high is None or ids[start] <= high)
+
+        self.invalidate_where(namespace, touched)
+
+    def clear(self) -> None:
+        for namespace in list(self._generations):
+            self._generations[namespace] += 1
+        self._data.clear()
+
+    def stats(self) -> dict[str, Any]:
+        namespaces = sorted(set(self.hits) | set(self.misses))
+        return {
+            "enabled": self.enabled,
+            "size": len(self._data),
+            "max_size": self.max_size,
+            "ttl": self.ttl,
+            "hits": sum(self.hits.values()),
+            "misses": sum(self.misses.values()),
+            "evictions": self.evictions,
+            "namespaces": {
+                namespace: {"hits": self.hits[namespace], "misses": self.misses[namespace]}
+                for namespace in namespaces
+            },
+        }
+
+reference_cache = TTLCache(max_size=settings.CACHE_MAX_SIZE if table_versions.enabled else 0, ttl=settings.CACHE_TTL)
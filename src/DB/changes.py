@@ -0,0 +1,198 @@
+# Данный файл содержит ленту изменений: AsyncORM публикует событие о каждой записи через NOTIFY в той же транзакции
+# (событие доставляется только после COMMIT и в порядке фиксации транзакций), а каждый процесс приложения слушает
+# канал через LISTEN и раздает события подключенным клиентам (GET /changes). События других процессов
+# также сбрасывают кэш справочников и версии таблиц для ETag этого процесса.
+#
+# Событие - JSON: {"source": "...", "table": "products", "op": "upsert" | "delete" | "reload", "rows": [...]}
+# upsert - строки целиком (новые или измененные), delete - только ключевые колонки удаленных строк,
+# reload - изменено слишком много строк (или события могли быть потеряны), клиент перечитывает таблицу.
+# Удаление товара, поставщика или склада удаляет и связанные строки (ON DELETE CASCADE) - отдельных событий о них нет
+import asyncio
+import json
+import logging
+import signal
+import threading
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Iterable, Optional
+
+import asyncpg
+from sqlalchemy import Text, bindparam, text
+from sqlalchemy.dialects.postgresql import ARRAY
+from src.DB.cache import reference_cache
+from src.DB.config import settings
+from src.metrics import CallbackGauge, registry
+from src.DB.versions import PRODUCTS, PRODUCTS_AND_STORAGES, PRODUCTS_AND_SUPPLIERS, STORAGES, SUPPLIERS, table_versions
+
+logger = logging.getLogger("inventory.changes")
+
+CHANNEL = "inventory_changes"
+# размер сообщения NOTIFY ограничен 8000 байт - строки большого изменения делятся на несколько сообщений
+PAYLOAD_LIMIT = 7500
+# событие для клиентов после разрыва LISTEN или переполнения очереди: перечитать все таблицы
+RELOAD_ALL = json.dumps({"table": None, "op": "reload", "rows": []})
+
+# ключи строк справочников в кэше и таблицы связей, строки которых удаляет каскад
+_ID_COLUMNS = {PRODUCTS: "product_id", SUPPLIERS: "supplier_id", STORAGES: "storage_id"}
+_CASCADES = {
+    PRODUCTS: (PRODUCTS_AND_SUPPLIERS, PRODUCTS_AND_STORAGES),
+    SUPPLIERS: (PRODUCTS_AND_SUPPLIERS,),
+    STORAGES: (PRODUCTS_AND_STORAGES,),
+}
+
+# все сообщения одного изменения отправляются одним запросом
+_NOTIFY = text("SELECT pg_notify(:channel, payload) FROM unnest(:payloads) AS payload").bindparams(
+    bindparam("payloads", type_=ARRAY(Text)),
+)
+
+def _payloads(table: str, op: str, rows: list[dict[str, Any]]) -> list[str]:
+    head = {"source": table_versions.boot_id, "table": table, "op": op}
+    if op == "reload" or len(rows) > settings.CHANGE_FEED_MAX_ROWS:
+        return [json.dumps({**head, "op": "reload", "rows": []}, ensure_ascii=False)]
+    empty = len(json.dumps({**head, "rows": []}, ensure_ascii=False).encode("utf-8"))
+    payloads, chunk, size = [], [], empty
+    for row in rows:
+        row_size = len(json.dumps(row, ensure_ascii=False).encode("utf-8")) + 1
+        if chunk and size + row_size > PAYLOAD_LIMIT:
+            payloads.append(json.dumps({**head, "rows": chunk}, ensure_ascii=False))
+            chunk, size = [], empty
+        chunk.append(row)
+        size += row_size
+    payloads.append(json.dumps({**head, "rows": chunk}, ensure_ascii=False))
+    return payloads
+
+# Публикация события в текущей транзакции session: при откате транзакции событие не отправляется.
+# rows - словари со значениями, сериализуемыми в JSON
+async def publish(session, table: str, op: str, rows: Iterable[dict[str, Any]] = ()) -> None:
+    if not settings.CHANGE_FEED:
+        return
+    rows = list(rows)
+    if op != "reload" and not rows:
+        return
+    await session.execute(_NOTIFY, {"channel": CHANNEL, "payloads": _payloads(table, op, rows)})
+
+# события других процессов: в этом процессе сбрасываются кэш и версии таблиц, как при собственной записи
+def _apply_remote(event: dict[str, Any]) -> None:
+    table, op = event.get("table"), event.get("op")
+    if table is None:
+        return
+    tables = (table,) + (_CASCADES.get(table, ()) if op in ("delete", "reload") else ())
+    table_versions.bump(*tables)
+    id_column = _ID_COLUMNS.get(table)
+    if id_column is None:
+        return
+    if op == "reload":
+        reference_cache.invalidate_where(table, lambda key, value: True)
+    else:
+        reference_cache.invalidate_ids(table, [row[id_column] for row in event.get("rows", [])], id_column)
+
+# Соединение LISTEN одно на процесс и не занимает соединение пула. Соединение проверяется раз в CHANGE_FEED_PING
+# секунд; после разрыва оно открывается заново, а клиенты получают RELOAD_ALL - события за время разрыва потеряны
+class ChangeFeed:
+    def __init__(self):
+        self._subscribers: set[asyncio.Queue] = set()
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self) -> None:
+        if settings.CHANGE_FEED and not self.running:
+            self._task = asyncio.create_task(self._listen())
+            self._close_on_exit_signals()
+
+    # Uvicorn при остановке ждет закрытия всех соединений, а поток событий клиента бесконечен: по сигналу
+    # остановки потоки завершаются (браузер переподключится к новому процессу), затем вызывается обработчик uvicorn
+    def _close_on_exit_signals(self) -> None:
+        if threading.current_thread() is not threading.main_thread():
+            return
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            previous = signal.getsignal(sig)
+
+            def handler(signum, frame, previous=previous):
+                loop.call_soon_threadsafe(self._broadcast, None)
+                if callable(previous):
+                    previous(signum, frame)
+
+            signal.signal(sig, handler)
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    # очередь сообщений (строк JSON) для одного клиента на время подключения; None - завершить поток клиента
+    @asynccontextmanager
+    async def subscribe(self) -> AsyncIterator[asyncio.Queue]:
+        queue: asyncio.Queue = asyncio.Queue(maxsize=settings.CHANGE_FEED_QUEUE_SIZE)
+        self._subscribers.add(queue)
+        try:
+            yield queue
+        finally:
+            self._subscribers.discard(queue)
+
+    @property
+    def subscribers(self) -> int:
+        return len(self._subscribers)
+
+    def _broadcast(self, message: Optional[str]) -> None:
+        for queue in self._subscribers:
+            try:
+                queue.put_nowait(message)
+            except asyncio.QueueFull:
+                # клиент не успевает читать - вместо накопленных событий он перечитает таблицы
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(RELOAD_ALL if message is not None else None)
+
+    def _on_notify(self, connection, pid: int, channel: str, payload: str) -> None:
+        try:
+            event = json.loads(payload)
+        except ValueError:
+            logger.warning("некорректное событие в канале %s: %r", channel, payload[:200])
+            return
+        if event.get("source") != table_versions.boot_id:
+            _apply_remote(event)
+        self._broadcast(payload)
+
+    async def _listen(self) -> None:
+        delay, connected_before = 1.0, False
+        while True:
+            try:
+                connection = await asyncpg.connect(
+                    host=settings.DB_LISTEN_HOST or settings.DB_HOST,
+                    port=settings.DB_LISTEN_PORT or settings.DB_PORT,
+                    user=settings.DB_USER,
+                    password=settings.DB_PASS,
+                    database=settings.DB_NAME,
+                )
+            except (OSError, asyncpg.PostgresError) as e:
+                logger.warning("лента изменений: нет подключения к БД (%s), повтор через %.0f с", e, delay)
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 30.0)
+                continue
+            try:
+                await connection.add_listener(CHANNEL, self._on_notify)
+                delay = 1.0
+                if connected_before:
+                    # изменения за время разрыва неизвестны: сбрасываем кэш этого процесса и данные клиентов
+                    reference_cache.clear()
+                    table_versions.bump(*_ID_COLUMNS, PRODUCTS_AND_SUPPLIERS, PRODUCTS_AND_STORAGES)
+                    self._broadcast(RELOAD_ALL)
+                connected_before = True
+                while True:
+                    await asyncio.sleep(settings.CHANGE_FEED_PING)
+                    await asyncio.wait_for(connection.fetchval("SELECT 1"), timeout=settings.CHANGE_FEED_PING)
+            except (OSError, asyncio.TimeoutError, asyncpg.PostgresError, asyncpg.InterfaceError) as e:
+                logger.warning("лента изменений: соединение LISTEN потеряно (%s), переподключение", e)
+            finally:
+                connection.terminate()
+
+change_feed = ChangeFeed()
+
+registry.register(CallbackGauge("change_feed_clients", "Клиенты, подключенные к ленте изменений.", lambda: change_feed.subscribers))
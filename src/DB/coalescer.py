@@ -0,0 +1,76 @@
+# Данный файл содержит объединение параллельных записей: одиночные запросы на запись, пришедшие в течение
+# короткого окна (WRITE_COALESCE_WINDOW_MS) или до набора WRITE_COALESCE_MAX_ITEMS штук, выполняются одним
+# многострочным запросом в одной транзакции - вместо COMMIT (и fsync) на каждый запрос.
+# Каждый вызывающий получает свой результат или свою ошибку (HTTPException), как при отдельной записи
+import asyncio
+import contextvars
+import copy
+from typing import Awaitable, Callable, Generic, Optional, TypeVar, Union
+from fastapi import HTTPException, status
+from src.DB.config import settings
+from src.metrics import orm_write_batch_size
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+# Ошибка пакета поднимается в каждом ожидающем запросе. Каждый получает свою копию: один объект, поднятый
+# в нескольких запросах, накапливал бы их traceback и контекст. Исходная ошибка остается в __cause__
+def _copy_error(error: Exception) -> Exception:
+    try:
+        copied = copy.copy(error)
+    except Exception:
+        copied = HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Ошибка записи в БД.")
+    copied.__cause__ = error
+    return copied
+
+# flush получает элементы в порядке поступления и возвращает для каждого результат или исключение
+class WriteCoalescer(Generic[T, R]):
+    def __init__(self, operation: str, flush: Callable[[list[T]], Awaitable[list[Union[R, Exception]]]]):
+        self.operation = operation
+        self._flush = flush
+        self._pending: list[tuple[T, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        # ссылки на выполняющиеся пакеты, чтобы задачи не удалил сборщик мусора
+        self._tasks: set[asyncio.Task] = set()
+
+    async def submit(self, item: T) -> R:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((item, future))
+        # пакет запускается из обратного вызова цикла событий с пустым контекстом: SQL-запросы пакета
+        # не попадают в Server-Timing запроса, который открыл окно или заполнил пакет
+        if len(self._pending) >= settings.WRITE_COALESCE_MAX_ITEMS:
+            loop.call_soon(self._start_batch, context=contextvars.Context())
+        elif self._timer is None:
+            self._timer = loop.call_later(
+                settings.WRITE_COALESCE_WINDOW_MS / 1000, self._start_batch, context=contextvars.Context(),
+            )
+        return await future
+
+    def _start_batch(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        # до запуска обратного вызова могли прийти еще записи - пакет не больше WRITE_COALESCE_MAX_ITEMS
+        size = max(1, settings.WRITE_COALESCE_MAX_ITEMS)
+        while self._pending:
+            batch, self._pending = self._pending[:size], self._pending[size:]
+            task = asyncio.get_running_loop().create_task(self._run(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: list[tuple[T, asyncio.Future]]) -> None:
+        orm_write_batch_size.observe(len(batch), operation=self.operation)
+        try:
+            results = await self._flush([item for item, _ in batch])
+        except Exception as e:
+            # ошибка, не относящаяся к отдельным элементам (например, БД недоступна), - общая для всего пакета
+            results = [_copy_error(e) for _ in batch]
+        for (_, future), result in zip(batch, results):
+            # вызывающий мог быть отменен (клиент отключился) - запись при этом уже выполнена
+            if future.done():
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
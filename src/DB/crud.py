@@ -1,87 +1,103 @@
 # Данный файл содержит реализацию всех необходимых запросов в БД
-from typing import Optional
-from sqlalchemy import and_, func, select, update
-from sqlalchemy.orm import selectinload
+import re
+from collections import defaultdict
+from itertools import groupby
+from typing import AsyncIterator, Awaitable, Callable, Optional, Sequence, TypeVar, Union
+from sqlalchemy import Integer, RowMapping, Text, and_, any_, bindparam, cast, column, delete, func, insert, literal, literal_column, or_, select, text, tuple_, update, values
+from sqlalchemy.dialects.postgresql import ARRAY, aggregate_order_by, insert as pg_insert
 from sqlalchemy.exc import IntegrityError
 from fastapi import HTTPException, status
-from src.DB.database import Base, async_engine, async_session_factory
-from src.DB.models import ProductOrm, ProductsAndStoragesORM, ProductsAndSuppliersORM, StorageOrm, SupplierOrm
-from src.schemas import LeftoversDTO, ProductAddDTO, ProductDTO, ProductsAndSuppliers, PurchaseDTO, StorageAddDTO, StorageDTO, SupplierAddDTO, SupplierDTO, SupplyDTO
+from src.DB.config import settings
+from src.DB.database import async_session_factory
+from src.DB.replicas import read_session
+from src.DB.cache import reference_cache
+from src.DB.changes import publish
+from src.DB.coalescer import WriteCoalescer
+from src.DB.versions import PRODUCTS, PRODUCTS_AND_STORAGES, PRODUCTS_AND_SUPPLIERS, STORAGES, SUPPLIERS, table_versions
+from src.metrics import orm_leftover_updates_total, orm_rows_inserted_total, orm_rows_rejected_total
+from src.DB.bulk_insert import chunked, insert_skip_conflicts
+from src.DB.pagination import clamp_limit, keyset_filter, split_page
+from src.DB.models import ProductOrm, ProductStockTotalsORM, ProductsAndStoragesORM, ProductsAndSuppliersORM, StorageOrm, StorageStockTotalsORM, SupplierOrm, product_search_document, supplier_phone_digits, supplier_search_document
+from src.serialization import rows_to_page
+from src.schemas import BulkRowErrorDTO, LeftoverChangeDTO, LeftoversDTO, MovementDTO, Page, TransferDTO, ProductAddDTO, ProductDTO, ProductStockDTO, StorageStockDTO, ProductsAndSuppliers, PurchaseDTO, PurchasePatchDTO, PurchaseUpdateDTO, PurchaseVersionDTO, ProductPatchDTO, ReplenishmentItemDTO, SupplierOrderDTO, SupplierPatchDTO, StoragePatchDTO, StorageAddDTO, StorageDTO, SupplierAddDTO, SupplierDTO, SupplyDTO
 
-# взаимодействие с БД в асинхронном режиме
-class AsyncORM:
-    # создание всех таблиц
-    @staticmethod
-    async def create_tables():
-        async with async_engine.begin() as conn:
-            await conn.run_sync(Base.metadata.create_all)
+T = TypeVar("T")
+R = TypeVar("R")
 
+# взаимодействие с БД в асинхронном режиме;
+# каждая запись публикует событие ленты изменений (src/DB/changes.py) в своей транзакции перед COMMIT
+class AsyncORM:
     # ===================== CREATE - ФУНКЦИИ ДОБАВЛЕНИЯ =====================
     # товара 
     @classmethod
     async def insert_product(cls, data: ProductAddDTO) -> int:
         async with async_session_factory() as session:
-            product_dict = data.model_dump()
-
-            product = ProductOrm(**product_dict)
-            session.add(product)
+            # присвоенный ID (и вся строка для ленты изменений) возвращается тем же запросом (INSERT ... RETURNING)
+            stmt = insert(ProductOrm).values(**data.model_dump()).returning(*ProductOrm.__table__.columns)
+            row = (await session.execute(stmt)).mappings().one()
+            product_id = row["product_id"]
+            await publish(session, PRODUCTS, "upsert", [dict(row)])
             await session.commit()
-            # для получения присвоенного ID
-            await session.refresh(product) 
-            return product.product_id
+            table_versions.bump(PRODUCTS)
+            orm_rows_inserted_total.inc(table="products")
+            reference_cache.invalidate_ids("products", [product_id], "product_id")
+            return product_id
         
     # поставщика
     @classmethod
     async def insert_supplier(cls, data: SupplierAddDTO) -> int:
         async with async_session_factory() as session:
             try:
-                supplier_dict = data.model_dump()
-                supplier = SupplierOrm(**supplier_dict)
-                session.add(supplier)
+                # присвоенный ID (и вся строка для ленты изменений) возвращается тем же запросом (INSERT ... RETURNING)
+                stmt = insert(SupplierOrm).values(**data.model_dump()).returning(*SupplierOrm.__table__.columns)
+                row = (await session.execute(stmt)).mappings().one()
+                supplier_id = row["supplier_id"]
+                await publish(session, SUPPLIERS, "upsert", [dict(row)])
                 await session.commit()
-                # для получения присвоенного ID
-                await session.refresh(supplier)
-                return supplier.supplier_id
+                table_versions.bump(SUPPLIERS)
+                orm_rows_inserted_total.inc(table="suppliers")
+                reference_cache.invalidate_ids("suppliers", [supplier_id], "supplier_id")
+                return supplier_id
                 
             except IntegrityError as e:
                 await session.rollback()
-                
-                # Анализируем текст ошибки для определения конкретного нарушения
-                error_msg = str(e.orig).lower()
-                
-                if "email" in error_msg and "unique" in error_msg:
-                    raise HTTPException(
-                        status_code=status.HTTP_400_BAD_REQUEST,
-                        detail="Поставщик с такой почтой уже есть."
-                    )
-                elif "phone" in error_msg and "unique" in error_msg:
-                    raise HTTPException(
-                        status_code=status.HTTP_400_BAD_REQUEST,
-                        detail="Поставщик с таким номером телефона уже есть."
-                    )
+                cls._raise_supplier_conflict(e)
             
             
     # склада
     @classmethod
     async def insert_storage(cls, data: StorageAddDTO) -> int:
         async with async_session_factory() as session:
-            storage_dict = data.model_dump()
-            storage = StorageOrm(**storage_dict)
-            session.add(storage)
+            # присвоенный ID (и вся строка для ленты изменений) возвращается тем же запросом (INSERT ... RETURNING)
+            stmt = insert(StorageOrm).values(**data.model_dump()).returning(*StorageOrm.__table__.columns)
+            row = (await session.execute(stmt)).mappings().one()
+            storage_id = row["storage_id"]
+            await publish(session, STORAGES, "upsert", [dict(row)])
             await session.commit()
-            # для получения присвоенного ID
-            await session.refresh(storage) 
-            return storage.storage_id  
+            table_versions.bump(STORAGES)
+            orm_rows_inserted_total.inc(table="storages")
+            reference_cache.invalidate_ids("storages", [storage_id], "storage_id")
+            return storage_id
         
     # добавление поставки - связь между продуктом и поставщиком
+    # (при WRITE_COALESCING - в пакете с параллельными добавлениями, см. _insert_supplies_batch)
     @classmethod
     async def add_supplier_product_rel(cls, data: SupplyDTO):
+        if settings.WRITE_COALESCING:
+            return await supply_writes.submit(data)
+        return await cls._insert_supply(data)
+
+    @classmethod
+    async def _insert_supply(cls, data: SupplyDTO):
         async with async_session_factory() as session:
             try:
                 supply_dict = data.model_dump()
                 supply = ProductsAndSuppliersORM(**supply_dict)
                 session.add(supply)
+                await publish(session, PRODUCTS_AND_SUPPLIERS, "upsert", [supply_dict])
                 await session.commit()
+                table_versions.bump(PRODUCTS_AND_SUPPLIERS)
+                orm_rows_inserted_total.inc(table="products_and_suppliers")
                 
             except IntegrityError as e:
                 await session.rollback()
@@ -92,16 +108,33 @@ class AsyncORM:
                         status_code=status.HTTP_400_BAD_REQUEST,
                         detail="Такая поставка уже существует."
                     )
+                elif "foreign key" in error_msg:
+                    raise HTTPException(
+                        status_code=status.HTTP_404_NOT_FOUND,
+                        detail="Товар или поставщик не найден."
+                    )
+                raise
 
     # добавление закупки - связь между продуктом и складом
+    # (при WRITE_COALESCING - в пакете с параллельными добавлениями, см. _insert_purchases_batch)
     @classmethod
     async def add_storage_product_rel(cls, data: PurchaseDTO):
+        if settings.WRITE_COALESCING:
+            return await purchase_writes.submit(data)
+        return await cls._insert_purchase(data)
+
+    @classmethod
+    async def _insert_purchase(cls, data: PurchaseDTO):
         async with async_session_factory() as session:
             try:
-                storage_dict = data.model_dump()
-                purchase = ProductsAndStoragesORM(**storage_dict)
+                purchase = ProductsAndStoragesORM(**data.model_dump())
                 session.add(purchase)
+                # flush получает версию новой строки (server_default) через RETURNING
+                await session.flush()
+                await publish(session, PRODUCTS_AND_STORAGES, "upsert", [{**data.model_dump(), "version": purchase.version}])
                 await session.commit()
+                table_versions.bump(PRODUCTS_AND_STORAGES)
+                orm_rows_inserted_total.inc(table="products_and_storages")
                 
             except IntegrityError as e:
                 await session.rollback()
@@ -118,251 +151,1235 @@ class AsyncORM:
                         status_code=status.HTTP_400_BAD_REQUEST,
                         detail="Количество товара не может быть отрицательным."
                     )
-            
+                elif "foreign key" in error_msg:
+                    raise HTTPException(
+                        status_code=status.HTTP_404_NOT_FOUND,
+                        detail="Товар или склад не найден."
+                    )
+                raise
+
+    # ===================== COALESCE - ПАКЕТЫ ОДИНОЧНЫХ ЗАПИСЕЙ =====================
+    # Пакет параллельных одиночных записей (src/DB/coalescer.py) выполняется одним многострочным запросом
+    # в одной транзакции; для каждой записи возвращается результат или HTTPException - такой же, как при
+    # отдельной записи. Ссылки на несуществующие записи отсеиваются заранее, конфликты уникальности пропускает
+    # ON CONFLICT DO NOTHING. Если пакет все же отклонен ограничением БД (например, параллельно удален товар),
+    # записи пакета выполняются по одной
+    @staticmethod
+    async def _run_each(write: Callable[[T], Awaitable[R]], items: list[T]) -> list[Union[R, Exception]]:
+        results = []
+        for item in items:
+            try:
+                results.append(await write(item))
+            except HTTPException as e:
+                results.append(e)
+        return results
+
+    # ID из ids, которые есть в таблице
+    @staticmethod
+    async def _existing_ids(session, id_column, ids: set[int]) -> set[int]:
+        res = await session.execute(select(id_column).where(id_column.in_(ids)))
+        return set(res.scalars().all())
+
+    # поставок
+    @classmethod
+    async def _insert_supplies_batch(cls, items: list[SupplyDTO]) -> list[Optional[Exception]]:
+        results: list[Optional[Exception]] = [None] * len(items)
+        async with async_session_factory() as session:
+            try:
+                known_products = await cls._existing_ids(session, ProductOrm.product_id, {item.product_id for item in items})
+                known_suppliers = await cls._existing_ids(session, SupplierOrm.supplier_id, {item.supplier_id for item in items})
+                valid = []
+                for i, item in enumerate(items):
+                    if item.product_id in known_products and item.supplier_id in known_suppliers:
+                        valid.append(i)
+                    else:
+                        results[i] = HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Товар или поставщик не найден.")
+                matched = await insert_skip_conflicts(
+                    session, ProductsAndSuppliersORM, [items[i].model_dump() for i in valid],
+                    returning=[ProductsAndSuppliersORM.product_id, ProductsAndSuppliersORM.supplier_id],
+                    key=["product_id", "supplier_id"],
+                )
+                inserted = []
+                for i, row in zip(valid, matched):
+                    if row is None:
+                        results[i] = HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Такая поставка уже существует.")
+                    else:
+                        inserted.append(dict(row._mapping))
+                await publish(session, PRODUCTS_AND_SUPPLIERS, "upsert", inserted)
+                await session.commit()
+            except IntegrityError:
+                await session.rollback()
+                return await cls._run_each(cls._insert_supply, items)
+        # пакет, в котором все записи отклонены, таблицу не изменил - ETag и кэш остаются в силе
+        if inserted:
+            table_versions.bump(PRODUCTS_AND_SUPPLIERS)
+        orm_rows_inserted_total.inc(len(inserted), table="products_and_suppliers")
+        return results
+
+    # закупок
+    @classmethod
+    async def _insert_purchases_batch(cls, items: list[PurchaseDTO]) -> list[Optional[Exception]]:
+        results: list[Optional[Exception]] = [None] * len(items)
+        async with async_session_factory() as session:
+            try:
+                known_products = await cls._existing_ids(session, ProductOrm.product_id, {item.product_id for item in items})
+                known_storages = await cls._existing_ids(session, StorageOrm.storage_id, {item.storage_id for item in items})
+                valid = []
+                for i, item in enumerate(items):
+                    if item.product_id in known_products and item.storage_id in known_storages:
+                        valid.append(i)
+                    else:
+                        results[i] = HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Товар или склад не найден.")
+                matched = await insert_skip_conflicts(
+                    session, ProductsAndStoragesORM, [items[i].model_dump() for i in valid],
+                    returning=[
+                        ProductsAndStoragesORM.product_id, ProductsAndStoragesORM.storage_id, ProductsAndStoragesORM.leftover,
+                        ProductsAndStoragesORM.version,
+                    ],
+                    key=["product_id", "storage_id"],
+                )
+                inserted = []
+                for i, row in zip(valid, matched):
+                    if row is None:
+                        results[i] = HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Такая закупка уже существует.")
+                    else:
+                        inserted.append(dict(row._mapping))
+                await publish(session, PRODUCTS_AND_STORAGES, "upsert", inserted)
+                await session.commit()
+            except IntegrityError:
+                await session.rollback()
+                return await cls._run_each(cls._insert_purchase, items)
+        if inserted:
+            table_versions.bump(PRODUCTS_AND_STORAGES)
+        orm_rows_inserted_total.inc(len(inserted), table="products_and_storages")
+        return results
+
+    # Движений товара. Строки пакета блокируются и изменяются теми же запросами, что и в _apply_deltas;
+    # движения применяются по очереди поступления: каждое проверяется по остатку после предыдущих
+    # и получает свой остаток и свою версию (как при отдельных движениях)
+    @classmethod
+    async def _move_stock_items(cls, items: list[MovementDTO]) -> list[Union[LeftoverChangeDTO, Exception]]:
+        async with async_session_factory() as session:
+            locked = await cls._lock_leftovers(session, {(item.product_id, item.storage_id) for item in items})
+            current = {key: {"leftover": row.leftover, "version": row.version} for key, row in locked.items()}
+
+            results: list[Union[LeftoverChangeDTO, Exception]] = []
+            for item in items:
+                key = (item.product_id, item.storage_id)
+                if key not in current:
+                    results.append(HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Товар на складе не найден."))
+                elif current[key]["leftover"] + item.delta < 0:
+                    results.append(HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Недостаточно товара на складе."))
+                else:
+                    current[key]["leftover"] += item.delta
+                    current[key]["version"] += 1
+                    results.append(LeftoverChangeDTO(product_id=item.product_id, storage_id=item.storage_id, **current[key]))
+
+            changes = [
+                (product_id, storage_id, state["leftover"] - locked[(product_id, storage_id)].leftover,
+                 state["version"] - locked[(product_id, storage_id)].version)
+                for (product_id, storage_id), state in sorted(current.items())
+                if state["version"] != locked[(product_id, storage_id)].version
+            ]
+            if changes:
+                rows = await cls._update_leftovers(session, changes)
+                await publish(session, PRODUCTS_AND_STORAGES, "upsert", [row.model_dump() for row in rows])
+                await session.commit()
+                table_versions.bump(PRODUCTS_AND_STORAGES)
+        orm_leftover_updates_total.inc(sum(isinstance(result, LeftoverChangeDTO) for result in results), operation="move_stock")
+        return results
+
+
+    # ===================== BULK - МАССОВАЯ ЗАГРУЗКА =====================
+    # На вход - провалидированные строки с их номерами во входных данных.
+    # Каждая порция из BULK_CHUNK_SIZE строк вставляется одним запросом INSERT ... ON CONFLICT DO NOTHING RETURNING,
+    # строки, нарушившие уникальность, попадают в список ошибок и не прерывают загрузку остальных.
+    # Возвращается словарь "номер строки -> присвоенный ID" и список ошибок.
+    # товаров
+    @classmethod
+    async def bulk_insert_products(cls, rows: dict[int, ProductAddDTO]) -> tuple[dict[int, int], list[BulkRowErrorDTO]]:
+        ids, errors = {}, []
+        async with async_session_factory() as session:
+            for chunk in chunked(list(rows.items()), settings.BULK_CHUNK_SIZE, columns=2):
+                matched = await insert_skip_conflicts(
+                    session, ProductOrm, [data.model_dump() for _, data in chunk],
+                    returning=[ProductOrm.product_id, ProductOrm.product_description],
+                    key=["product_description"], order="product_id",
+                )
+                for (row_num, _), inserted in zip(chunk, matched):
+                    if inserted is None:
+                        errors.append(BulkRowErrorDTO(row=row_num, detail="Товар с таким описанием уже есть."))
+                    else:
+                        ids[row_num] = inserted.product_id
+                await publish(session, PRODUCTS, "reload")
+                await session.commit()
+                table_versions.bump(PRODUCTS)
+                reference_cache.invalidate_ids("products", [row.product_id for row in matched if row is not None], "product_id")
+        orm_rows_inserted_total.inc(len(rows) - len(errors), table="products")
+        orm_rows_rejected_total.inc(len(errors), table="products")
+        return ids, errors
+
+    # поставщиков
+    @classmethod
+    async def bulk_insert_suppliers(cls, rows: dict[int, SupplierAddDTO]) -> tuple[dict[int, int], list[BulkRowErrorDTO]]:
+        ids, errors = {}, []
+        async with async_session_factory() as session:
+            for chunk in chunked(list(rows.items()), settings.BULK_CHUNK_SIZE, columns=3):
+                matched = await insert_skip_conflicts(
+                    session, SupplierOrm, [data.model_dump() for _, data in chunk],
+                    returning=[SupplierOrm.supplier_id, SupplierOrm.email, SupplierOrm.phone],
+                    key=["phone", "email"], order="supplier_id",
+                )
+                rejected = [data for (_, data), inserted in zip(chunk, matched) if inserted is None]
+                # для отклоненных строк одним запросом выясняем, какой из уникальных контактов уже занят
+                taken_phones = set()
+                if rejected:
+                    res = await session.execute(
+                        select(SupplierOrm.phone)
+                        .where(SupplierOrm.phone.in_([data.phone for data in rejected]))
+                    )
+                    taken_phones = set(res.scalars().all())
+                for (row_num, data), inserted in zip(chunk, matched):
+                    if inserted is not None:
+                        ids[row_num] = inserted.supplier_id
+                    elif data.phone in taken_phones:
+                        errors.append(BulkRowErrorDTO(row=row_num, detail="Поставщик с таким номером телефона уже есть."))
+                    else:
+                        errors.append(BulkRowErrorDTO(row=row_num, detail="Поставщик с такой почтой уже есть."))
+                await publish(session, SUPPLIERS, "reload")
+                await session.commit()
+                table_versions.bump(SUPPLIERS)
+                reference_cache.invalidate_ids("suppliers", [row.supplier_id for row in matched if row is not None], "supplier_id")
+        orm_rows_inserted_total.inc(len(rows) - len(errors), table="suppliers")
+        orm_rows_rejected_total.inc(len(errors), table="suppliers")
+        return ids, errors
+
+    # складов
+    @classmethod
+    async def bulk_insert_storages(cls, rows: dict[int, StorageAddDTO]) -> tuple[dict[int, int], list[BulkRowErrorDTO]]:
+        ids, errors = {}, []
+        async with async_session_factory() as session:
+            for chunk in chunked(list(rows.items()), settings.BULK_CHUNK_SIZE, columns=2):
+                matched = await insert_skip_conflicts(
+                    session, StorageOrm, [data.model_dump() for _, data in chunk],
+                    returning=[StorageOrm.storage_id, StorageOrm.address],
+                    key=["address"], order="storage_id",
+                )
+                for (row_num, _), inserted in zip(chunk, matched):
+                    if inserted is None:
+                        errors.append(BulkRowErrorDTO(row=row_num, detail="Склад с таким адресом уже есть."))
+                    else:
+                        ids[row_num] = inserted.storage_id
+                await publish(session, STORAGES, "reload")
+                await session.commit()
+                table_versions.bump(STORAGES)
+                reference_cache.invalidate_ids("storages", [row.storage_id for row in matched if row is not None], "storage_id")
+        orm_rows_inserted_total.inc(len(rows) - len(errors), table="storages")
+        orm_rows_rejected_total.inc(len(errors), table="storages")
+        return ids, errors
+
+    # закупок (остатков товаров на складах) - у закупки нет собственного ID, словарь ID всегда пустой
+    @classmethod
+    async def bulk_insert_purchases(cls, rows: dict[int, PurchaseDTO]) -> tuple[dict[int, int], list[BulkRowErrorDTO]]:
+        errors = []
+        async with async_session_factory() as session:
+            for chunk in chunked(list(rows.items()), settings.BULK_CHUNK_SIZE, columns=5):
+                # строки со ссылками на несуществующие товары или склады отсеиваем заранее,
+                # иначе нарушение внешнего ключа отменило бы вставку всей порции
+                known_products = await cls._existing_ids(session, ProductOrm.product_id, {data.product_id for _, data in chunk})
+                known_storages = await cls._existing_ids(session, StorageOrm.storage_id, {data.storage_id for _, data in chunk})
+
+                valid = []
+                for row_num, data in chunk:
+                    if data.product_id in known_products and data.storage_id in known_storages:
+                        valid.append((row_num, data))
+                    else:
+                        errors.append(BulkRowErrorDTO(row=row_num, detail="Товар или склад не найден."))
+
+                matched = await insert_skip_conflicts(
+                    session, ProductsAndStoragesORM, [data.model_dump() for _, data in valid],
+                    returning=[ProductsAndStoragesORM.product_id, ProductsAndStoragesORM.storage_id],
+                    key=["product_id", "storage_id"],
+                )
+                for (row_num, _), inserted in zip(valid, matched):
+                    if inserted is None:
+                        errors.append(BulkRowErrorDTO(row=row_num, detail="Такая закупка уже существует."))
+                await publish(session, PRODUCTS_AND_STORAGES, "reload")
+                await session.commit()
+                table_versions.bump(PRODUCTS_AND_STORAGES)
+        orm_rows_inserted_total.inc(len(rows) - len(errors), table="products_and_storages")
+        orm_rows_rejected_total.inc(len(errors), table="products_and_storages")
+        return {}, errors
 
     # ===================== READ - SELECT ЗАПРОСЫ - ПОЛУЧЕНИЕ ИНФОРМАЦИИ =====================
-    # "Номенклатура" (полный список всех товаров, имеющихся в системе)
+    # сессии чтения открываются через read_session: GET-запросы могут читать с реплики (src/DB/replicas.py)
+    # общая часть запросов к сводной таблице "Остатки на складах"
+    @staticmethod
+    def _leftovers_select():
+        return (
+            select(
+                ProductOrm.product_id,
+                ProductOrm.product_name,
+                StorageOrm.storage_id.label("storage_id"),
+                StorageOrm.storage_name.label("storage_name"),
+                ProductsAndStoragesORM.leftover,
+                ProductsAndStoragesORM.version,
+            )
+            .join(
+                ProductsAndStoragesORM, 
+                ProductOrm.product_id == ProductsAndStoragesORM.product_id
+            )
+            .join(
+                StorageOrm, 
+                ProductsAndStoragesORM.storage_id == StorageOrm.storage_id
+            )
+        )
+
+    # общая часть запросов к сводной таблице "Товары и поставщики"
+    @staticmethod
+    def _products_with_suppliers_select():
+        return (
+            select(
+                ProductOrm.product_id,
+                ProductOrm.product_name,
+                SupplierOrm.supplier_id,
+                SupplierOrm.supplier_name.label("supplier_name"),
+                SupplierOrm.email.label("email"),
+                SupplierOrm.phone.label("phone"),
+                SupplierOrm.version,
+            )
+            .join(
+                ProductsAndSuppliersORM, 
+                ProductOrm.product_id == ProductsAndSuppliersORM.product_id
+            )
+            .join(
+                SupplierOrm, 
+                ProductsAndSuppliersORM.supplier_id == SupplierOrm.supplier_id
+            )
+        )
+
+    # "Номенклатура" (полный список всех товаров, имеющихся в системе) - постранично
+    @classmethod
+    async def get_all_products(cls, limit: Optional[int] = None, after: Optional[str] = None) -> Page[ProductDTO]:
+        limit = clamp_limit(limit)
+        return await reference_cache.get_or_load(
+            ("products", "list", limit, after),
+            lambda: cls._select_products_page(limit, after),
+        )
+
     @classmethod
-    async def get_all_products(cls) -> list[ProductDTO]:
-        async with async_session_factory() as session:        
+    async def _select_products_page(cls, limit: int, after: Optional[str]) -> Page[ProductDTO]:
+        async with read_session() as session:        
             query = (
-                select(ProductOrm)
+                # только колонки таблицы, без построения ORM-объектов
+                select(ProductOrm.__table__)
                 # сортировка в порядке возрастания артикула
                 .order_by(ProductOrm.product_id.asc())
+                # читаем на одну строку больше, чтобы понять, есть ли следующая страница
+                .limit(limit + 1)
             )
+            if after is not None:
+                query = query.where(keyset_filter([ProductOrm.product_id], after))
             res = await session.execute(query)
-            result_orm = res.unique().scalars().all() 
-            result_dto = [ProductDTO.model_validate(row, from_attributes=True) for row in result_orm]
-            return result_dto
+            rows, next_cursor = split_page(res.mappings().all(), limit, key=lambda row: (row["product_id"],))
+            return rows_to_page(ProductDTO, rows, next_cursor)
 
     # таблица "Поставщики"
     @classmethod
-    async def get_all_suppliers(cls) -> list[SupplierDTO]:
-        async with async_session_factory() as session:        
+    async def get_all_suppliers(cls, limit: Optional[int] = None, after: Optional[str] = None) -> Page[SupplierDTO]:
+        limit = clamp_limit(limit)
+        return await reference_cache.get_or_load(
+            ("suppliers", "list", limit, after),
+            lambda: cls._select_suppliers_page(limit, after),
+        )
+
+    @classmethod
+    async def _select_suppliers_page(cls, limit: int, after: Optional[str]) -> Page[SupplierDTO]:
+        async with read_session() as session:        
             query = (
-                select(SupplierOrm)
+                # только колонки таблицы, без построения ORM-объектов
+                select(SupplierOrm.__table__)
                 # сортировка в порядке возрастания ID
                 .order_by(SupplierOrm.supplier_id.asc())
+                .limit(limit + 1)
             )
+            if after is not None:
+                query = query.where(keyset_filter([SupplierOrm.supplier_id], after))
             res = await session.execute(query)
-            result_orm = res.unique().scalars().all() 
-            result_dto = [SupplierDTO.model_validate(row, from_attributes=True) for row in result_orm]
-            return result_dto  
+            rows, next_cursor = split_page(res.mappings().all(), limit, key=lambda row: (row["supplier_id"],))
+            return rows_to_page(SupplierDTO, rows, next_cursor)
         
     # Таблица "Склады"
     @classmethod
-    async def get_all_storages(cls) -> list[StorageDTO]:
-        async with async_session_factory() as session:        
+    async def get_all_storages(cls, limit: Optional[int] = None, after: Optional[str] = None) -> Page[StorageDTO]:
+        limit = clamp_limit(limit)
+        return await reference_cache.get_or_load(
+            ("storages", "list", limit, after),
+            lambda: cls._select_storages_page(limit, after),
+        )
+
+    @classmethod
+    async def _select_storages_page(cls, limit: int, after: Optional[str]) -> Page[StorageDTO]:
+        async with read_session() as session:        
             query = (
-                select(StorageOrm)
+                # только колонки таблицы, без построения ORM-объектов
+                select(StorageOrm.__table__)
                 # сортировка в порядке возрастания ID
                 .order_by(StorageOrm.storage_id.asc())
+                .limit(limit + 1)
+            )
+            if after is not None:
+                query = query.where(keyset_filter([StorageOrm.storage_id], after))
+            res = await session.execute(query)
+            rows, next_cursor = split_page(res.mappings().all(), limit, key=lambda row: (row["storage_id"],))
+            return rows_to_page(StorageDTO, rows, next_cursor)
+
+    # карточка товара
+    @classmethod
+    async def get_product(cls, product_id: int) -> ProductDTO:
+        return await reference_cache.get_or_load(
+            ("products", "item", product_id),
+            lambda: cls._select_one(ProductOrm, ProductDTO, product_id, "Товар не найден."),
+        )
+
+    # карточка поставщика
+    @classmethod
+    async def get_supplier(cls, supplier_id: int) -> SupplierDTO:
+        return await reference_cache.get_or_load(
+            ("suppliers", "item", supplier_id),
+            lambda: cls._select_one(SupplierOrm, SupplierDTO, supplier_id, "Поставщик не найден."),
+        )
+
+    # карточка склада
+    @classmethod
+    async def get_storage(cls, storage_id: int) -> StorageDTO:
+        return await reference_cache.get_or_load(
+            ("storages", "item", storage_id),
+            lambda: cls._select_one(StorageOrm, StorageDTO, storage_id, "Склад не найден."),
+        )
+
+    # карточка закупки - остатки меняются чаще справочников, поэтому без кэша
+    @classmethod
+    async def get_purchase(cls, product_id: int, storage_id: int) -> PurchaseVersionDTO:
+        return await cls._select_one(ProductsAndStoragesORM, PurchaseVersionDTO, (product_id, storage_id), "Товар на складе не найден.")
+
+    @staticmethod
+    async def _select_one(model: type, dto: type, entity_id: Union[int, tuple[int, int]], not_found_msg: str):
+        async with read_session() as session:
+            entity = await session.get(model, entity_id)
+            if entity is None:
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail=not_found_msg
+                )
+            return dto.model_validate(entity, from_attributes=True)
+
+    # Поиск для подсказок при вводе (выпадающие списки интерфейса): каждое слово запроса - начало слова
+    # в названии или описании товара ("бол м8" находит "Болт М8-40"). Сначала товары, название которых
+    # начинается с запроса, затем остальные по алфавиту
+    @classmethod
+    async def search_products(cls, q: str, limit: Optional[int] = None) -> list[ProductDTO]:
+        tsquery = cls._prefix_tsquery(q)
+        if tsquery is None:
+            return []
+        async with read_session() as session:
+            query = (
+                select(ProductOrm.__table__)
+                .where(product_search_document().op("@@")(func.to_tsquery(text("'simple'"), tsquery)))
+                # сортировка не совпадает с индексом по названию, поэтому планировщик всегда выбирает
+                # GIN-индекс поиска, а не просмотр всей таблицы в порядке названий с проверкой каждой строки
+                .order_by(
+                    func.lower(ProductOrm.product_name).startswith(q.strip().lower(), autoescape=True).desc(),
+                    ProductOrm.product_name.asc(),
+                    ProductOrm.product_id.asc(),
+                )
+                .limit(cls._clamp_search_limit(limit))
             )
             res = await session.execute(query)
-            result_orm = res.unique().scalars().all() 
-            result_dto = [StorageDTO.model_validate(row, from_attributes=True) for row in result_orm]
-            return result_dto  
+            return [ProductDTO.model_validate(dict(row)) for row in res.mappings().all()]
+
+    # Поиск поставщика по началу слов названия и email; запрос только из цифр и символов номера
+    # ("+7 (900) 12") ищется также по началу телефона без учета форматирования
+    @classmethod
+    async def search_suppliers(cls, q: str, limit: Optional[int] = None) -> list[SupplierDTO]:
+        tsquery = cls._prefix_tsquery(q)
+        if tsquery is None:
+            return []
+        condition = supplier_search_document().op("@@")(func.to_tsquery(text("'simple'"), tsquery))
+        if re.fullmatch(r"[\d\s()+\-]+", q):
+            # шаблон подставляется в текст запроса (в нем только цифры): с параметром вместо константы
+            # общий план подготовленного запроса не может использовать индекс для LIKE по началу строки
+            prefix = bindparam("phone_prefix", re.sub(r"\D", "", q) + "%", literal_execute=True)
+            condition = or_(condition, supplier_phone_digits().like(prefix))
+        async with read_session() as session:
+            query = (
+                select(SupplierOrm.__table__)
+                .where(condition)
+                .order_by(
+                    func.lower(SupplierOrm.supplier_name).startswith(q.strip().lower(), autoescape=True).desc(),
+                    SupplierOrm.supplier_name.asc(),
+                    SupplierOrm.supplier_id.asc(),
+                )
+                .limit(cls._clamp_search_limit(limit))
+            )
+            res = await session.execute(query)
+            return [SupplierDTO.model_validate(dict(row)) for row in res.mappings().all()]
+
+    # Запрос полнотекстового поиска "слово1:* & слово2:*" из строки пользователя. В запрос попадают только
+    # буквы и цифры, поэтому символы синтаксиса tsquery (&, |, !, скобки, кавычки) не вызывают ошибку разбора.
+    # None - в строке нет ни одного слова
+    @staticmethod
+    def _prefix_tsquery(q: str) -> Optional[str]:
+        words = re.findall(r"[^\W_]+", q)
+        if not words:
+            return None
+        return " & ".join(f"{word}:*" for word in words)
+
+    @staticmethod
+    def _clamp_search_limit(limit: Optional[int]) -> int:
+        if limit is None:
+            return settings.SEARCH_LIMIT
+        return max(1, min(limit, settings.MAX_SEARCH_LIMIT))
 
     # Реализовать главную сводную таблицу "Остатки на складах". Таблица должна выводить данные в формате: 
     # "Артикул", "Название Товара", "Название Склада", "Текущий остаток" (в шт.)          
     # Реализовать фильтр "Товары в дефиците" (показать все позиции, остаток которых на любом из складов меньше N единиц).
     @classmethod
-    async def get_leftovers(cls, num: Optional[int] = None) -> list[LeftoversDTO]:
-        async with async_session_factory() as session: 
+    async def get_leftovers(cls, num: Optional[int] = None, limit: Optional[int] = None, after: Optional[str] = None) -> Page[LeftoversDTO]:
+        limit = clamp_limit(limit)
+        async with read_session() as session: 
+            query = (
+                cls._leftovers_select()
+                # у товара может быть несколько складов - склад входит в ключ сортировки
+                .order_by(ProductsAndStoragesORM.product_id.asc(), ProductsAndStoragesORM.storage_id.asc())
+                .limit(limit + 1)
+            )
             # если не получили ограничение на количество остатков -> отображаем все товары на складах
             # иначе -> выводим товары, остатки которых строго меньше ограничения
-            if num == None:
-                stmt = func.max(ProductsAndStoragesORM.leftover)
-                res = await session.execute(stmt)
-                num = res.scalar() + 1
+            if num is not None:
+                query = query.filter(ProductsAndStoragesORM.leftover < num)
+            if after is not None:
+                query = query.where(keyset_filter(
+                    [ProductsAndStoragesORM.product_id, ProductsAndStoragesORM.storage_id], after
+                ))
+
+            res = await session.execute(query)
+            result_rows = res.mappings().all()
+            rows, next_cursor = split_page(result_rows, limit, key=lambda row: (row["product_id"], row["storage_id"]))
+            return rows_to_page(LeftoversDTO, rows, next_cursor)
+    
+    # Сводка "Остатки по товарам": суммарный остаток товара по всем складам.
+    # Читается из поддерживаемой триггерами таблицы product_stock_totals, без пересчета по products_and_storages
+    @classmethod
+    async def get_product_stock_summary(cls, limit: Optional[int] = None, after: Optional[str] = None) -> Page[ProductStockDTO]:
+        limit = clamp_limit(limit)
+        async with read_session() as session:
             query = (
                 select(
-                    ProductOrm.product_id,
+                    ProductStockTotalsORM.product_id,
                     ProductOrm.product_name,
-                    StorageOrm.storage_id.label("storage_id"),
-                    StorageOrm.storage_name.label("storage_name"),
-                    ProductsAndStoragesORM.leftover,
-                )
-                .join(
-                    ProductsAndStoragesORM, 
-                    ProductOrm.product_id == ProductsAndStoragesORM.product_id
+                    ProductStockTotalsORM.total_leftover,
+                    ProductStockTotalsORM.storages_count,
                 )
-                .join(
-                    StorageOrm, 
-                    ProductsAndStoragesORM.storage_id == StorageOrm.storage_id
+                .join(ProductOrm, ProductOrm.product_id == ProductStockTotalsORM.product_id)
+                .order_by(ProductStockTotalsORM.product_id.asc())
+                .limit(limit + 1)
+            )
+            if after is not None:
+                query = query.where(keyset_filter([ProductStockTotalsORM.product_id], after))
+            res = await session.execute(query)
+            rows, next_cursor = split_page(res.mappings().all(), limit, key=lambda row: (row["product_id"],))
+            return rows_to_page(ProductStockDTO, rows, next_cursor)
+
+    # Сводка "Остатки по складам": суммарный остаток и количество позиций на каждом складе
+    @classmethod
+    async def get_storage_stock_summary(cls, limit: Optional[int] = None, after: Optional[str] = None) -> Page[StorageStockDTO]:
+        limit = clamp_limit(limit)
+        async with read_session() as session:
+            query = (
+                select(
+                    StorageStockTotalsORM.storage_id,
+                    StorageOrm.storage_name,
+                    StorageStockTotalsORM.total_leftover,
+                    StorageStockTotalsORM.products_count,
                 )
-                .filter(ProductsAndStoragesORM.leftover < num)
-                .order_by(ProductOrm.product_id.asc())
+                .join(StorageOrm, StorageOrm.storage_id == StorageStockTotalsORM.storage_id)
+                .order_by(StorageStockTotalsORM.storage_id.asc())
+                .limit(limit + 1)
             )
+            if after is not None:
+                query = query.where(keyset_filter([StorageStockTotalsORM.storage_id], after))
+            res = await session.execute(query)
+            rows, next_cursor = split_page(res.mappings().all(), limit, key=lambda row: (row["storage_id"],))
+            return rows_to_page(StorageStockDTO, rows, next_cursor)
 
+    # Отчет о пополнении по всей сети складов одним запросом: позиции с остатком ниже min_stock (частичный индекс
+    # ix_products_and_storages_below_min_stock), недостача и количество к заказу считаются в SQL для всех позиций сразу.
+    # Позиция заказывается у поставщика товара с наименьшим ID, остальные поставщики перечислены в позиции;
+    # строки отсортированы по поставщику, поэтому заказы собираются за один проход
+    @classmethod
+    async def get_replenishment(cls) -> list[SupplierOrderDTO]:
+        below = (
+            select(
+                ProductsAndStoragesORM.product_id,
+                ProductsAndStoragesORM.storage_id,
+                ProductsAndStoragesORM.leftover,
+                ProductsAndStoragesORM.min_stock,
+                ProductsAndStoragesORM.reorder_qty,
+            )
+            .where(ProductsAndStoragesORM.leftover < ProductsAndStoragesORM.min_stock)
+            .cte("below")
+        )
+        suppliers_of = (
+            select(
+                ProductsAndSuppliersORM.product_id,
+                func.array_agg(aggregate_order_by(ProductsAndSuppliersORM.supplier_id, ProductsAndSuppliersORM.supplier_id), type_=ARRAY(Integer)).label("supplier_ids"),
+            )
+            .where(ProductsAndSuppliersORM.product_id.in_(select(below.c.product_id)))
+            .group_by(ProductsAndSuppliersORM.product_id)
+            .cte("suppliers_of")
+        )
+        shortfall = below.c.min_stock - below.c.leftover
+        supplier_id = suppliers_of.c.supplier_ids[1]
+        query = (
+            select(
+                below.c.product_id,
+                ProductOrm.product_name,
+                below.c.storage_id,
+                StorageOrm.storage_name,
+                below.c.leftover,
+                below.c.min_stock,
+                below.c.reorder_qty,
+                shortfall.label("shortfall"),
+                func.greatest(below.c.reorder_qty, shortfall).label("order_qty"),
+                func.coalesce(
+                    suppliers_of.c.supplier_ids[2:func.cardinality(suppliers_of.c.supplier_ids)], literal_column("'{}'::integer[]"),
+                ).label("alternative_supplier_ids"),
+                supplier_id.label("supplier_id"),
+                SupplierOrm.supplier_name,
+                SupplierOrm.email,
+                SupplierOrm.phone,
+            )
+            .join(ProductOrm, ProductOrm.product_id == below.c.product_id)
+            .join(StorageOrm, StorageOrm.storage_id == below.c.storage_id)
+            .outerjoin(suppliers_of, suppliers_of.c.product_id == below.c.product_id)
+            .outerjoin(SupplierOrm, SupplierOrm.supplier_id == supplier_id)
+            .order_by(supplier_id.asc().nulls_last(), below.c.product_id, below.c.storage_id)
+        )
+        async with read_session() as session:
             res = await session.execute(query)
-            result_rows = res.mappings().all()
-            result_dto = [LeftoversDTO.model_validate(row) for row in result_rows]
-            return result_dto 
-    
-    # Реализовать возможность отфильтровать номенклатуру по конкретному поставщику.
+            rows = res.mappings().all()
+
+        orders = []
+        for _, group in groupby(rows, key=lambda row: row["supplier_id"]):
+            group = list(group)
+            head = group[0]
+            orders.append(SupplierOrderDTO(
+                supplier_id=head["supplier_id"],
+                supplier_name=head["supplier_name"],
+                email=head["email"],
+                phone=head["phone"],
+                total_order_qty=sum(row["order_qty"] for row in group),
+                items=[ReplenishmentItemDTO.model_validate(row) for row in group],
+            ))
+        return orders
+
+    # Реализовать возможность отфильтровать номенклатуру по поставщикам.
+    # Товары любого из поставщиков supplier_ids, которые есть на любом из складов storage_ids (in_stock - с ненулевым
+    # остатком, без storage_ids - на любом складе). Связи проверяются подзапросами EXISTS по индексам таблиц связей:
+    # один запрос без загрузки ORM-объектов, товар не повторяется при нескольких совпадениях. Страница - по артикулу,
+    # как в номенклатуре. Неизвестные поставщики и склады - 404
     @classmethod
-    async def get_supplied_products(cls, supplier_id: int) -> list[ProductDTO]:
-        async with async_session_factory() as session:     
-            query = (
-                select(SupplierOrm)
-                .options(selectinload(SupplierOrm.supplied_products))
-                .where(SupplierOrm.supplier_id==supplier_id)
+    async def filter_products(
+        cls,
+        supplier_ids: Sequence[int] = (),
+        storage_ids: Sequence[int] = (),
+        in_stock: bool = False,
+        limit: Optional[int] = None,
+        after: Optional[str] = None,
+    ) -> Page[ProductDTO]:
+        limit = clamp_limit(limit)
+        supplier_ids, storage_ids = sorted(set(supplier_ids)), sorted(set(storage_ids))
+        query = (
+            select(ProductOrm.__table__)
+            .order_by(ProductOrm.product_id.asc())
+            .limit(limit + 1)
+        )
+        # массив в одном параметре: текст запроса (и подготовленный запрос) не зависит от количества ID
+        if supplier_ids:
+            query = query.where(
+                select(ProductsAndSuppliersORM.product_id)
+                .where(
+                    ProductsAndSuppliersORM.product_id == ProductOrm.product_id,
+                    ProductsAndSuppliersORM.supplier_id == any_(literal(supplier_ids, ARRAY(Integer))),
+                )
+                .exists()
             )
+        if storage_ids or in_stock:
+            stock = select(ProductsAndStoragesORM.product_id).where(ProductsAndStoragesORM.product_id == ProductOrm.product_id)
+            if storage_ids:
+                stock = stock.where(ProductsAndStoragesORM.storage_id == any_(literal(storage_ids, ARRAY(Integer))))
+            if in_stock:
+                stock = stock.where(ProductsAndStoragesORM.leftover > 0)
+            query = query.where(stock.exists())
+        if after is not None:
+            query = query.where(keyset_filter([ProductOrm.product_id], after))
+
+        async with read_session() as session:
+            await cls._check_filter_ids(session, supplier_ids, storage_ids)
             res = await session.execute(query)
-            result_orm = res.unique().scalars().one() 
-            # из всех атрибутов поставщика выбираем только список поставляемых им товаров
-            result_dto = [ProductDTO.model_validate(product, from_attributes=True) for product in result_orm.supplied_products]
-            return result_dto
-    
-        
+            rows, next_cursor = split_page(res.mappings().all(), limit, key=lambda row: (row["product_id"],))
+            return rows_to_page(ProductDTO, rows, next_cursor)
+
+    # существование поставщиков и складов фильтра - одним запросом по первичным ключам
+    @staticmethod
+    async def _check_filter_ids(session, supplier_ids: list[int], storage_ids: list[int]) -> None:
+        if not supplier_ids and not storage_ids:
+            return
+        query = (
+            select(literal(SUPPLIERS).label("table"), SupplierOrm.supplier_id.label("id"))
+            .where(SupplierOrm.supplier_id == any_(literal(supplier_ids, ARRAY(Integer))))
+            .union_all(
+                select(literal(STORAGES), StorageOrm.storage_id)
+                .where(StorageOrm.storage_id == any_(literal(storage_ids, ARRAY(Integer))))
+            )
+        )
+        res = await session.execute(query)
+        found = defaultdict(set)
+        for table, entity_id in res.all():
+            found[table].add(entity_id)
+        missing_suppliers = [i for i in supplier_ids if i not in found[SUPPLIERS]]
+        missing_storages = [i for i in storage_ids if i not in found[STORAGES]]
+        if missing_suppliers or missing_storages:
+            parts = []
+            if missing_suppliers:
+                parts.append("поставщики " + ", ".join(map(str, missing_suppliers)))
+            if missing_storages:
+                parts.append("склады " + ", ".join(map(str, missing_storages)))
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Не найдены: " + "; ".join(parts) + ".",
+            )
+
     # Реализовать сводную таблицу "Товары и поставщики": "Название Товара", "Название Поставщика", "Контакты Поставщика".
     @classmethod
-    async def get_products_with_suppliers(cls) -> list[ProductsAndSuppliers]:
-        async with async_session_factory() as session:        
+    async def get_products_with_suppliers(cls, limit: Optional[int] = None, after: Optional[str] = None) -> Page[ProductsAndSuppliers]:
+        limit = clamp_limit(limit)
+        async with read_session() as session:        
             query = (
-                select(
-                    ProductOrm.product_id,
-                    ProductOrm.product_name,
-                    SupplierOrm.supplier_id,
-                    SupplierOrm.supplier_name.label("supplier_name"),
-                    SupplierOrm.email.label("email"),
-                    SupplierOrm.phone.label("phone"),
-                )
-                .join(
-                    ProductsAndSuppliersORM, 
-                    ProductOrm.product_id == ProductsAndSuppliersORM.product_id
-                )
-                .join(
-                    SupplierOrm, 
-                    ProductsAndSuppliersORM.supplier_id == SupplierOrm.supplier_id
+                cls._products_with_suppliers_select()
+                # названия товаров не уникальны - добавляем ID в ключ сортировки для однозначного курсора
+                .order_by(
+                    ProductOrm.product_name.asc(),
+                    ProductsAndSuppliersORM.product_id.asc(),
+                    ProductsAndSuppliersORM.supplier_id.asc(),
                 )
-                .order_by(ProductOrm.product_name.asc())
+                .limit(limit + 1)
             )
+            if after is not None:
+                query = query.where(keyset_filter(
+                    [ProductOrm.product_name, ProductsAndSuppliersORM.product_id, ProductsAndSuppliersORM.supplier_id], after
+                ))
 
             res = await session.execute(query)
             result_rows = res.mappings().all()
-            result_dto = [ProductsAndSuppliers.model_validate(row) for row in result_rows]
-            return result_dto 
+            rows, next_cursor = split_page(
+                result_rows, limit, key=lambda row: (row["product_name"], row["product_id"], row["supplier_id"])
+            )
+            return rows_to_page(ProductsAndSuppliers, rows, next_cursor)
+
+    # Все данные стартовой загрузки веб-интерфейса одним запросом (GET /bootstrap): справочники - строками таблиц,
+    # остатки и поставки - массивами [ID товара, ID склада, остаток, версия] и [ID товара, ID поставщика], без повторения
+    # названий и контактов в каждой строке. JSON собирает PostgreSQL (json_agg), приложение передает готовый текст
+    # клиенту без разбора и сериализации; один запрос - один снимок данных, все таблицы согласованы между собой
+    @classmethod
+    async def get_bootstrap(cls) -> str:
+        def json_array(item, order_by, from_clause=None):
+            query = select(func.coalesce(func.json_agg(aggregate_order_by(item, *order_by)), literal_column("'[]'::json")))
+            if from_clause is not None:
+                query = query.select_from(from_clause)
+            return query.scalar_subquery()
+
+        products, suppliers, storages = ProductOrm.__table__, SupplierOrm.__table__, StorageOrm.__table__
+        leftovers, supplies = ProductsAndStoragesORM.__table__, ProductsAndSuppliersORM.__table__
+        document = func.json_build_object(
+            "products", json_array(products.table_valued(), [products.c.product_id]),
+            "suppliers", json_array(suppliers.table_valued(), [suppliers.c.supplier_id]),
+            "storages", json_array(storages.table_valued(), [storages.c.storage_id]),
+            "leftovers", json_array(
+                func.json_build_array(leftovers.c.product_id, leftovers.c.storage_id, leftovers.c.leftover, leftovers.c.version),
+                [leftovers.c.product_id, leftovers.c.storage_id],
+            ),
+            # порядок таблицы "Товары и поставщики" - по названию товара
+            "supplies", json_array(
+                func.json_build_array(supplies.c.product_id, supplies.c.supplier_id),
+                [products.c.product_name, supplies.c.product_id, supplies.c.supplier_id],
+                supplies.join(products, products.c.product_id == supplies.c.product_id),
+            ),
+        )
+        async with read_session() as session:
+            res = await session.execute(select(cast(document, Text)))
+            return res.scalar_one()
+
+    # ===================== EXPORT - ПОТОКОВАЯ ВЫГРУЗКА =====================
+    # строки читаются через серверный курсор порциями по EXPORT_CHUNK_SIZE,
+    # поэтому потребление памяти не зависит от размера таблицы
+    # "Остатки на складах" (с необязательным фильтром "Товары в дефиците")
+    @classmethod
+    async def stream_leftovers(cls, num: Optional[int] = None) -> AsyncIterator[Sequence[RowMapping]]:
+        query = (
+            cls._leftovers_select()
+            .order_by(ProductsAndStoragesORM.product_id.asc(), ProductsAndStoragesORM.storage_id.asc())
+        )
+        if num is not None:
+            query = query.filter(ProductsAndStoragesORM.leftover < num)
+        async with read_session() as session:
+            res = await session.stream(query.execution_options(yield_per=settings.EXPORT_CHUNK_SIZE))
+            async for chunk in res.mappings().partitions():
+                yield chunk
+
+    # "Товары и поставщики"
+    @classmethod
+    async def stream_products_with_suppliers(cls) -> AsyncIterator[Sequence[RowMapping]]:
+        query = (
+            cls._products_with_suppliers_select()
+            .order_by(
+                ProductOrm.product_name.asc(),
+                ProductsAndSuppliersORM.product_id.asc(),
+                ProductsAndSuppliersORM.supplier_id.asc(),
+            )
+        )
+        async with read_session() as session:
+            res = await session.stream(query.execution_options(yield_per=settings.EXPORT_CHUNK_SIZE))
+            async for chunk in res.mappings().partitions():
+                yield chunk
 
     # ===================== UPDATE - ИЗМЕНЕНИЕ ЗАПИСЕЙ В БД =====================
+    # Изменение одной записи одним запросом UPDATE ... SET version = version + 1 RETURNING:
+    # в ответе сразу вся запись с новой версией. Если передана версия, прочитанная клиентом,
+    # она добавляется в условие - параллельное изменение той же записи отклоняется (409) без блокировок.
+    # Повторный запрос выполняется, только если ни одна строка не изменена: запись не найдена (404) или версия устарела (409)
+    @staticmethod
+    async def _update_versioned(session, model: type, key: dict[str, int], values: dict, version: Optional[int], not_found_msg: str) -> RowMapping:
+        conditions = [getattr(model, name) == value for name, value in key.items()]
+        stmt = (
+            update(model)
+            .where(*conditions, *([model.version == version] if version is not None else []))
+            .values(**values, version=model.version + 1)
+            .returning(*model.__table__.columns)
+        )
+        row = (await session.execute(stmt)).mappings().one_or_none()
+        if row is not None:
+            return row
+        current = (await session.execute(select(model.version).where(*conditions))).scalar_one_or_none()
+        if current is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=not_found_msg)
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Запись изменена другим пользователем (текущая версия {current}), обновите данные и повторите изменение."
+        )
+
+    @staticmethod
+    def _check_changes(values: dict) -> None:
+        if not values:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Не передано ни одного поля для изменения."
+            )
+
+    # нарушение уникальности почты или телефона поставщика
+    @staticmethod
+    def _raise_supplier_conflict(e: IntegrityError) -> None:
+        # Анализируем текст ошибки для определения конкретного нарушения
+        error_msg = str(e.orig).lower()
+        
+        if "email" in error_msg and "unique" in error_msg:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Поставщик с такой почтой уже есть."
+            )
+        elif "phone" in error_msg and "unique" in error_msg:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Поставщик с таким номером телефона уже есть."
+            )
+
     # продукта
     @classmethod
-    async def update_product(cls, data: ProductDTO):
+    async def update_product(cls, data: ProductDTO) -> ProductDTO:
+        return await cls._save_product(data.product_id, data.model_dump(exclude={"product_id", "version"}), data.version)
+
+    # продукта - только переданные поля
+    @classmethod
+    async def patch_product(cls, product_id: int, data: ProductPatchDTO) -> ProductDTO:
+        changes = data.changes()
+        cls._check_changes(changes)
+        return await cls._save_product(product_id, changes, data.version)
+
+    @classmethod
+    async def _save_product(cls, product_id: int, values: dict, version: Optional[int]) -> ProductDTO:
         async with async_session_factory() as session:
-            product_dict = data.model_dump()
-            product_updated = ProductOrm(**product_dict)
-            stmt = (
-                update(ProductOrm)
-                .where(ProductOrm.product_id == product_updated.product_id)
-                .values(product_name=product_updated.product_name, product_description = product_updated.product_description)
-            )
-            await session.execute(stmt)
+            row = await cls._update_versioned(session, ProductOrm, {"product_id": product_id}, values, version, "Товар не найден.")
+            await publish(session, PRODUCTS, "upsert", [dict(row)])
             await session.commit()
+            table_versions.bump(PRODUCTS)
+            reference_cache.invalidate_ids("products", [product_id], "product_id")
+            return ProductDTO.model_validate(dict(row))
 
     # поставщика
     @classmethod
-    async def update_supplier(cls, data: SupplierDTO):
+    async def update_supplier(cls, data: SupplierDTO) -> SupplierDTO:
+        return await cls._save_supplier(data.supplier_id, data.model_dump(exclude={"supplier_id", "version"}), data.version)
+
+    # поставщика - только переданные поля
+    @classmethod
+    async def patch_supplier(cls, supplier_id: int, data: SupplierPatchDTO) -> SupplierDTO:
+        changes = data.changes()
+        cls._check_changes(changes)
+        return await cls._save_supplier(supplier_id, changes, data.version)
+
+    @classmethod
+    async def _save_supplier(cls, supplier_id: int, values: dict, version: Optional[int]) -> SupplierDTO:
         async with async_session_factory() as session:
             try:
-                supplier_dict = data.model_dump()
-                supplier_updated = SupplierOrm(**supplier_dict)
-                stmt = (
-                update(SupplierOrm)
-                .where(SupplierOrm.supplier_id == supplier_updated.supplier_id)
-                .values(supplier_name=supplier_updated.supplier_name, email = supplier_updated.email, phone = supplier_updated.phone)
-                )
-                await session.execute(stmt)
+                row = await cls._update_versioned(session, SupplierOrm, {"supplier_id": supplier_id}, values, version, "Поставщик не найден.")
+                await publish(session, SUPPLIERS, "upsert", [dict(row)])
                 await session.commit()
                 
             except IntegrityError as e:
                 await session.rollback()
-                
-                # Анализируем текст ошибки для определения конкретного нарушения
-                error_msg = str(e.orig).lower()
-                
-                if "email" in error_msg and "unique" in error_msg:
-                    raise HTTPException(
-                        status_code=status.HTTP_400_BAD_REQUEST,
-                        detail="Поставщик с такой почтой уже есть."
-                    )
-                elif "phone" in error_msg and "unique" in error_msg:
-                    raise HTTPException(
-                        status_code=status.HTTP_400_BAD_REQUEST,
-                        detail="Поставщик с таким номером телефона уже есть."
-                    )
+                cls._raise_supplier_conflict(e)
+                raise
+            table_versions.bump(SUPPLIERS)
+            reference_cache.invalidate_ids("suppliers", [supplier_id], "supplier_id")
+            return SupplierDTO.model_validate(dict(row))
 
     # склада
     @classmethod
-    async def update_storage(cls, data: StorageDTO):
+    async def update_storage(cls, data: StorageDTO) -> StorageDTO:
+        return await cls._save_storage(data.storage_id, data.model_dump(exclude={"storage_id", "version"}), data.version)
+
+    # склада - только переданные поля
+    @classmethod
+    async def patch_storage(cls, storage_id: int, data: StoragePatchDTO) -> StorageDTO:
+        changes = data.changes()
+        cls._check_changes(changes)
+        return await cls._save_storage(storage_id, changes, data.version)
+
+    @classmethod
+    async def _save_storage(cls, storage_id: int, values: dict, version: Optional[int]) -> StorageDTO:
         async with async_session_factory() as session:
-            storage_dict = data.model_dump()
-            storage_updated = StorageOrm(**storage_dict)
-            stmt = (
-                update(StorageOrm)
-                .where(StorageOrm.storage_id == storage_updated.storage_id)
-                .values(storage_name=storage_updated.storage_name, address = storage_updated.address)
-            )
-            await session.execute(stmt)
+            row = await cls._update_versioned(session, StorageOrm, {"storage_id": storage_id}, values, version, "Склад не найден.")
+            await publish(session, STORAGES, "upsert", [dict(row)])
             await session.commit()
+            table_versions.bump(STORAGES)
+            reference_cache.invalidate_ids("storages", [storage_id], "storage_id")
+            return StorageDTO.model_validate(dict(row))
 
     # остатка на складе
     @classmethod
-    async def update_purchase(cls, data: PurchaseDTO):
+    async def update_purchase(cls, data: PurchaseUpdateDTO) -> PurchaseVersionDTO:
+        return await cls._save_purchase(data.product_id, data.storage_id, {"leftover": data.leftover}, data.version, "update_purchase")
+
+    # остатка на складе - с проверкой версии
+    @classmethod
+    async def patch_purchase(cls, product_id: int, storage_id: int, data: PurchasePatchDTO) -> PurchaseVersionDTO:
+        changes = data.changes()
+        cls._check_changes(changes)
+        return await cls._save_purchase(product_id, storage_id, changes, data.version, "patch_purchase")
+
+    @classmethod
+    async def _save_purchase(cls, product_id: int, storage_id: int, values: dict, version: Optional[int], operation: str) -> PurchaseVersionDTO:
         async with async_session_factory() as session:
-            purchase_dict = data.model_dump()
-            purchase_updated = ProductsAndStoragesORM(**purchase_dict)
-            stmt = (
-                update(ProductsAndStoragesORM)
-                .where(and_(ProductsAndStoragesORM.product_id == purchase_updated.product_id, ProductsAndStoragesORM.storage_id == purchase_updated.storage_id))
-                .values(leftover=purchase_updated.leftover)
+            row = await cls._update_versioned(
+                session, ProductsAndStoragesORM, {"product_id": product_id, "storage_id": storage_id},
+                values, version, "Товар на складе не найден.",
             )
-            await session.execute(stmt)
+            await publish(session, PRODUCTS_AND_STORAGES, "upsert", [dict(row)])
             await session.commit()
+            table_versions.bump(PRODUCTS_AND_STORAGES)
+            orm_leftover_updates_total.inc(operation=operation)
+            return PurchaseVersionDTO.model_validate(dict(row))
+
+    # движение товара (приход / расход) - выполняется как пакет из одного движения (см. _move_stock_items):
+    # строка блокируется, остаток проверяется и меняется на величину delta, поэтому параллельные изменения
+    # одной позиции не затирают друг друга.
+    # Каждое изменение остатка (в _update_leftovers и в _apply_deltas) увеличивает версию строки:
+    # PATCH с версией, прочитанной до движения, получает 409, а не затирает движение.
+    # При WRITE_COALESCING движение выполняется в пакете с параллельными движениями
+    @classmethod
+    async def move_stock(cls, data: MovementDTO) -> LeftoverChangeDTO:
+        if settings.WRITE_COALESCING:
+            return await movement_writes.submit(data)
+        [result] = await cls._move_stock_items([data])
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    # Применение набора изменений остатков {(товар, склад): delta} в текущей транзакции.
+    # Строки блокируются в фиксированном порядке (см. _lock_leftovers), существующие меняются одним
+    # UPDATE ... FROM (VALUES ...) (см. _update_leftovers), отсутствующие (если create_missing) создаются
+    # одним INSERT ... ON CONFLICT DO UPDATE.
+    # Если нужны оба запроса, строки сводных остатков блокируются заранее (см. _lock_stock_totals)
+    @classmethod
+    async def _apply_deltas(cls, session, deltas: dict[tuple[int, int], int], create_missing: bool = False) -> list[LeftoverChangeDTO]:
+        keys = sorted(deltas)
+        current = {key: row.leftover for key, row in (await cls._lock_leftovers(session, keys)).items()}
+
+        missing = [key for key in keys if key not in current and (not create_missing or deltas[key] < 0)]
+        if missing:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Товар на складе не найден (товар {missing[0][0]}, склад {missing[0][1]})."
+            )
+        short = [key for key in keys if key in current and current[key] + deltas[key] < 0]
+        if short:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Недостаточно товара на складе (товар {short[0][0]}, склад {short[0][1]})."
+            )
+
+        result_dto = []
+        existing = [key for key in keys if key in current]
+        # встречные перемещения могут дать нулевое итоговое изменение - пустая строка для него не создается
+        created = [key for key in keys if key not in current and deltas[key] != 0]
+        if existing and created:
+            await cls._lock_stock_totals(session, keys)
+        if existing:
+            result_dto += await cls._update_leftovers(session, [(product_id, storage_id, deltas[(product_id, storage_id)], 1) for product_id, storage_id in existing])
+
+        if created:
+            # строку мог создать параллельный запрос - тогда остаток увеличивается на delta
+            stmt = pg_insert(ProductsAndStoragesORM).values([
+                {"product_id": product_id, "storage_id": storage_id, "leftover": deltas[(product_id, storage_id)]}
+                for product_id, storage_id in created
+            ])
+            stmt = (
+                stmt.on_conflict_do_update(
+                    index_elements=[ProductsAndStoragesORM.product_id, ProductsAndStoragesORM.storage_id],
+                    set_={
+                        "leftover": ProductsAndStoragesORM.leftover + stmt.excluded.leftover,
+                        "version": ProductsAndStoragesORM.version + 1,
+                    },
+                )
+                .returning(ProductsAndStoragesORM.product_id, ProductsAndStoragesORM.storage_id, ProductsAndStoragesORM.leftover, ProductsAndStoragesORM.version)
+            )
+            res = await session.execute(stmt)
+            result_dto += [LeftoverChangeDTO.model_validate(row) for row in res.mappings().all()]
+
+        return sorted(result_dto, key=lambda row: (row.product_id, row.storage_id))
+
+    # Блокировка строк остатков в порядке (product_id, storage_id) - общий порядок для всех изменений остатков,
+    # поэтому параллельные движения, пакеты и перемещения не взаимоблокируются. Возвращаются найденные строки
+    @staticmethod
+    async def _lock_leftovers(session, keys) -> dict[tuple[int, int], RowMapping]:
+        res = await session.execute(
+            select(
+                ProductsAndStoragesORM.product_id, ProductsAndStoragesORM.storage_id,
+                ProductsAndStoragesORM.leftover, ProductsAndStoragesORM.version,
+            )
+            .where(tuple_(ProductsAndStoragesORM.product_id, ProductsAndStoragesORM.storage_id).in_(sorted(keys)))
+            .order_by(ProductsAndStoragesORM.product_id, ProductsAndStoragesORM.storage_id)
+            .with_for_update()
+        )
+        return {(row.product_id, row.storage_id): row for row in res}
+
+    # Изменение заблокированных строк одним UPDATE ... FROM (VALUES ...): items - (товар, склад, delta, steps),
+    # остаток увеличивается на delta, версия - на steps (число примененных к строке изменений)
+    @staticmethod
+    async def _update_leftovers(session, items: list[tuple[int, int, int, int]]) -> list[LeftoverChangeDTO]:
+        changes = values(
+            column("product_id", Integer),
+            column("storage_id", Integer),
+            column("delta", Integer),
+            column("steps", Integer),
+            name="changes",
+        ).data(items)
+        stmt = (
+            update(ProductsAndStoragesORM)
+            .where(and_(ProductsAndStoragesORM.product_id == changes.c.product_id, ProductsAndStoragesORM.storage_id == changes.c.storage_id))
+            .values(leftover=ProductsAndStoragesORM.leftover + changes.c.delta, version=ProductsAndStoragesORM.version + changes.c.steps)
+            .returning(ProductsAndStoragesORM.product_id, ProductsAndStoragesORM.storage_id, ProductsAndStoragesORM.leftover, ProductsAndStoragesORM.version)
+            .execution_options(synchronize_session=False)
+        )
+        res = await session.execute(stmt)
+        return [LeftoverChangeDTO.model_validate(row) for row in res.mappings().all()]
+
+    # остаток ушел бы в минус (ограничение leftover_non_negative) или строки, на которую ссылается изменение, нет
+    @staticmethod
+    def _raise_leftover_conflict(e: IntegrityError, not_found_msg: str) -> None:
+        error_msg = str(e.orig).lower()
+
+        if "leftover_non_negative" in error_msg or "check constraint" in error_msg:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Недостаточно товара на складе."
+            )
+        elif "foreign key" in error_msg:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=not_found_msg
+            )
+
+    # Сводные остатки обновляют триггеры - отдельно для каждого запроса, и каждый запрос блокирует свои строки
+    # сводки. Два запроса одной транзакции блокировали бы их двумя волнами, и встречные перемещения
+    # (A: склад 1 -> 2, B: склад 2 -> 1) ждали бы друг друга. Поэтому все строки сводки, которые изменят
+    # запросы транзакции, блокируются одним проходом в порядке ID - товары, затем склады, как в триггере.
+    # Недостающие строки создаются пустыми: их удалит триггер, если остатков так и не появится
+    @staticmethod
+    async def _lock_stock_totals(session, keys: list[tuple[int, int]]) -> None:
+        for model, id_column, count_column, ids in (
+            (ProductStockTotalsORM, "product_id", "storages_count", sorted({product_id for product_id, _ in keys})),
+            (StorageStockTotalsORM, "storage_id", "products_count", sorted({storage_id for _, storage_id in keys})),
+        ):
+            stmt = pg_insert(model).values([{id_column: entity_id, "total_leftover": 0, count_column: 0} for entity_id in ids])
+            # DO UPDATE без изменений блокирует существующую строку, DO NOTHING ее бы не заблокировал
+            await session.execute(
+                stmt.on_conflict_do_update(index_elements=[id_column], set_={"total_leftover": model.total_leftover})
+            )
+
+    # пакетное движение товара - все изменения применяются в одной транзакции или не применяются вовсе
+    @classmethod
+    async def move_stock_batch(cls, items: list[MovementDTO]) -> list[LeftoverChangeDTO]:
+        # несколько движений одной позиции складываются в одно изменение
+        deltas: dict[tuple[int, int], int] = defaultdict(int)
+        for item in items:
+            deltas[(item.product_id, item.storage_id)] += item.delta
+        if not deltas:
+            return []
+
+        async with async_session_factory() as session:
+            try:
+                result_dto = await cls._apply_deltas(session, deltas)
+                await publish(session, PRODUCTS_AND_STORAGES, "upsert", [row.model_dump() for row in result_dto])
+                await session.commit()
+                table_versions.bump(PRODUCTS_AND_STORAGES)
+                orm_leftover_updates_total.inc(len(result_dto), operation="move_stock_batch")
+
+            except IntegrityError as e:
+                await session.rollback()
+                cls._raise_leftover_conflict(e, "Товар на складе не найден.")
+                raise
+
+            return result_dto
+
+    # перемещение товаров между складами: списание со склада-источника и зачисление на склад-получатель
+    # (строка на складе-получателе создается при необходимости) выполняются в одной транзакции
+    @classmethod
+    async def transfer_stock(cls, items: list[TransferDTO]) -> list[LeftoverChangeDTO]:
+        deltas: dict[tuple[int, int], int] = defaultdict(int)
+        for item in items:
+            deltas[(item.product_id, item.from_storage_id)] -= item.quantity
+            deltas[(item.product_id, item.to_storage_id)] += item.quantity
+        if not deltas:
+            return []
+
+        async with async_session_factory() as session:
+            try:
+                result_dto = await cls._apply_deltas(session, deltas, create_missing=True)
+                await publish(session, PRODUCTS_AND_STORAGES, "upsert", [row.model_dump() for row in result_dto])
+                await session.commit()
+                table_versions.bump(PRODUCTS_AND_STORAGES)
+                orm_leftover_updates_total.inc(len(result_dto), operation="transfer_stock")
+
+            except IntegrityError as e:
+                await session.rollback()
+                cls._raise_leftover_conflict(e, "Товар или склад-получатель не найден.")
+                raise
+
+            return result_dto
 
     # изменять поставку нельзя, так как с точки зрения реальной предметной области нужно удалить ненужную поставку и добавить нужную
             
     # ===================== DELETE - УДАЛЕНИЕ =====================
+    # Удаление одним запросом DELETE ... WHERE id = ANY(:ids) RETURNING, без предварительной загрузки записей:
+    # связи удаляет сама БД (ON DELETE CASCADE), а сводные остатки - триггеры.
+    # Список ID передается одним параметром-массивом, поэтому текст запроса не зависит от количества ID.
+    # Возвращаются ID удаленных записей (несуществующие ID пропускаются)
+    @staticmethod
+    async def _delete_by_ids(id_column, ids: Sequence[int]) -> list[int]:
+        if not ids:
+            return []
+        async with async_session_factory() as session:
+            stmt = delete(id_column.table).where(id_column == any_(literal(list(ids), ARRAY(Integer)))).returning(id_column)
+            deleted = list((await session.execute(stmt)).scalars())
+            await publish(session, id_column.table.name, "delete", [{id_column.name: entity_id} for entity_id in deleted])
+            await session.commit()
+            return deleted
+
+    # товаров
+    @classmethod
+    async def delete_products(cls, product_ids: Sequence[int]) -> list[int]:
+        deleted = await cls._delete_by_ids(ProductOrm.product_id, product_ids)
+        if deleted:
+            table_versions.bump(PRODUCTS, PRODUCTS_AND_SUPPLIERS, PRODUCTS_AND_STORAGES)
+            reference_cache.invalidate_ids("products", deleted, "product_id")
+        return deleted
+
+    # поставщиков
+    @classmethod
+    async def delete_suppliers(cls, supplier_ids: Sequence[int]) -> list[int]:
+        deleted = await cls._delete_by_ids(SupplierOrm.supplier_id, supplier_ids)
+        if deleted:
+            table_versions.bump(SUPPLIERS, PRODUCTS_AND_SUPPLIERS)
+            reference_cache.invalidate_ids("suppliers", deleted, "supplier_id")
+        return deleted
+
+    # складов
+    @classmethod
+    async def delete_storages(cls, storage_ids: Sequence[int]) -> list[int]:
+        deleted = await cls._delete_by_ids(StorageOrm.storage_id, storage_ids)
+        if deleted:
+            table_versions.bump(STORAGES, PRODUCTS_AND_STORAGES)
+            reference_cache.invalidate_ids("storages", deleted, "storage_id")
+        return deleted
+
     # товара 
     @classmethod
     async def delete_product(cls, product_id: int):
-        async with async_session_factory() as session:
-            product = await session.get(ProductOrm, product_id)
-            if product:
-                await session.delete(product)
-                await session.commit()  
+        await cls.delete_products([product_id])
     
     # поставщика
     @classmethod
     async def delete_supplier(cls, supplier_id: int):
-        async with async_session_factory() as session:
-            supplier = await session.get(SupplierOrm, supplier_id)
-            if supplier:
-                await session.delete(supplier) 
-                await session.commit()  
+        await cls.delete_suppliers([supplier_id])
+
     # склада 
     @classmethod
     async def delete_storage(cls, storage_id: int):
-        async with async_session_factory() as session:
-            storage = await session.get(StorageOrm, storage_id)
-            if storage:
-                await session.delete(storage)
-                await session.commit() 
+        await cls.delete_storages([storage_id])
 
     # поставки 
     @classmethod
     async def delete_supply(cls, product_id: int, supplier_id: int):
         async with async_session_factory() as session:
-            supply = await session.get(ProductsAndSuppliersORM, (product_id, supplier_id))
-            if supply:
-                await session.delete(supply)
-                await session.commit() 
+            stmt = (
+                delete(ProductsAndSuppliersORM)
+                .where(and_(ProductsAndSuppliersORM.product_id == product_id, ProductsAndSuppliersORM.supplier_id == supplier_id))
+            )
+            res = await session.execute(stmt)
+            if res.rowcount:
+                await publish(session, PRODUCTS_AND_SUPPLIERS, "delete", [{"product_id": product_id, "supplier_id": supplier_id}])
+            await session.commit()
+            if res.rowcount:
+                table_versions.bump(PRODUCTS_AND_SUPPLIERS)
 
     # закупки 
     @classmethod
     async def delete_purchase(cls, product_id: int, storage_id: int):
         async with async_session_factory() as session:
-            purchase = await session.get(ProductsAndStoragesORM, (product_id, storage_id))
-            if purchase:
-                await session.delete(purchase)
-                await session.commit() 
\ No newline at end of file
+            stmt = (
+                delete(ProductsAndStoragesORM)
+                .where(and_(ProductsAndStoragesORM.product_id == product_id, ProductsAndStoragesORM.storage_id == storage_id))
+            )
+            res = await session.execute(stmt)
+            if res.rowcount:
+                await publish(session, PRODUCTS_AND_STORAGES, "delete", [{"product_id": product_id, "storage_id": storage_id}])
+            await session.commit()
+            if res.rowcount:
+                table_versions.bump(PRODUCTS_AND_STORAGES)
+
+# объединение параллельных одиночных записей в пакеты (WRITE_COALESCING)
+supply_writes = WriteCoalescer("supply", AsyncORM._insert_supplies_batch)
+purchase_writes = WriteCoalescer("purchase", AsyncORM._insert_purchases_batch)
+movement_writes = WriteCoalescer("move_stock", AsyncORM._move_stock_items)
@@ -1,15 +1,132 @@
-from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+import time
+from typing import Optional
+from uuid import uuid4
+from sqlalchemy import event, exc
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import DeclarativeBase
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool, QueuePool
 from src.DB.config import settings
-
-async_engine = create_async_engine(
-    url=settings.DATABASE_URL_asyncpg,
-    # запросы НЕ будут выводится в консоль
-    echo=False,
+from src.metrics import (
+    db_integrity_errors_total, db_pool_timeouts_total, db_pool_wait_seconds, db_statement_duration_seconds, register_pool_gauges,
 )
+from src.timing import record_statement
+
+# замер времени получения соединения (ожидание свободного или открытие нового) и отказов по DB_POOL_TIMEOUT
+class TimedCheckout:
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            db_pool_timeouts_total.inc()
+            raise
+        finally:
+            db_pool_wait_seconds.observe(time.perf_counter() - started)
+
+class InstrumentedPool(TimedCheckout, AsyncAdaptedQueuePool):
+    pass
+
+# в режиме PgBouncer соединение открывается на каждую сессию и закрывается после нее
+class InstrumentedNullPool(TimedCheckout, NullPool):
+    pass
+
+# Движок с параметрами пула из настроек; benchmarks.pool создает движки с другим размером пула,
+# src/DB/replicas.py - движки реплик (url) с коротким таймаутом подключения (connect_timeout, в секундах)
+# и проверкой соединения перед выдачей из пула (pre_ping).
+# PgBouncer в режиме transaction выдает каждой транзакции любое серверное соединение, поэтому подготовленные
+# запросы не кэшируются, а их имена уникальны (иначе имя, подготовленное на одном соединении, конфликтует на другом)
+def make_engine(
+    pool_size: Optional[int] = None,
+    max_overflow: Optional[int] = None,
+    url: Optional[str] = None,
+    connect_timeout: Optional[float] = None,
+    pre_ping: Optional[bool] = None,
+) -> AsyncEngine:
+    if settings.DB_PGBOUNCER:
+        pool_options = {"poolclass": InstrumentedNullPool}
+        connect_args = {
+            "statement_cache_size": 0,
+            "prepared_statement_cache_size": 0,
+            "prepared_statement_name_func": lambda: f"__asyncpg_{uuid4()}__",
+        }
+    else:
+        pool_options = {
+            "poolclass": InstrumentedPool,
+            "pool_size": settings.DB_POOL_SIZE if pool_size is None else pool_size,
+            "max_overflow": settings.DB_MAX_OVERFLOW if max_overflow is None else max_overflow,
+            "pool_timeout": settings.DB_POOL_TIMEOUT,
+        }
+        # statement_cache_size - кэш asyncpg, prepared_statement_cache_size - кэш диалекта SQLAlchemy
+        connect_args = {
+            "statement_cache_size": settings.DB_STATEMENT_CACHE_SIZE,
+            "prepared_statement_cache_size": settings.DB_STATEMENT_CACHE_SIZE,
+        }
+    if connect_timeout is not None:
+        connect_args["timeout"] = connect_timeout
+    return create_async_engine(
+        url=url or settings.DATABASE_URL_asyncpg,
+        # запросы НЕ будут выводится в консоль
+        echo=False,
+        pool_recycle=settings.DB_POOL_RECYCLE,
+        pool_pre_ping=settings.DB_POOL_PRE_PING if pre_ping is None else pre_ping,
+        connect_args=connect_args,
+        **pool_options,
+    )
+
+async_engine = make_engine()
 
 async_session_factory = async_sessionmaker(async_engine)
 
+# показатели пула читаются в момент запроса /metrics; после dispose() у движка новый пул того же класса.
+# В режиме PgBouncer приложение не держит соединения, и показателей пула нет
+if isinstance(async_engine.pool, QueuePool):
+    register_pool_gauges(
+        checked_out=lambda: async_engine.pool.checkedout(),
+        overflow=lambda: async_engine.pool.overflow(),
+        size=lambda: async_engine.pool.size(),
+        checked_in=lambda: async_engine.pool.checkedin(),
+    )
+
+# учет количества и длительности SQL-запросов (Server-Timing, журнал медленных запросов, метрики)
+def _statement_finished(statement, parameters, executemany, started):
+    elapsed = time.perf_counter() - started
+    db_statement_duration_seconds.observe(elapsed)
+    record_statement(statement, parameters, executemany, elapsed)
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._query_started = time.perf_counter()
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    _statement_finished(statement, parameters, executemany, context._query_started)
+
+# запрос, завершившийся ошибкой, тоже занимал время БД; отказы по ограничениям целостности
+# считаются по таблице и имени ограничения (их перечень фиксирован схемой БД)
+def _handle_error(exception_context):
+    context = exception_context.execution_context
+    if context is not None and hasattr(context, "_query_started"):
+        _statement_finished(
+            exception_context.statement or "",
+            exception_context.parameters,
+            context.executemany,
+            context._query_started,
+        )
+    original = exception_context.original_exception
+    # у asyncpg исходное исключение драйвера доступно через __cause__ исключения DBAPI-адаптера
+    if getattr(original, "sqlstate", None) and original.sqlstate.startswith("23"):
+        cause = original.__cause__
+        db_integrity_errors_total.inc(
+            table=getattr(cause, "table_name", None) or "unknown",
+            constraint=getattr(cause, "constraint_name", None) or "unknown",
+        )
+
+# события асинхронного движка регистрируются на его синхронной части
+def instrument(engine: AsyncEngine) -> None:
+    event.listen(engine.sync_engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine.sync_engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine.sync_engine, "handle_error", _handle_error)
+
+instrument(async_engine)
+
 # Базовый класс для всех ORM моделей
 class Base(DeclarativeBase):
-    pass
\ No newline at end of file
+    pass
@@ -0,0 +1,110 @@
+# Данный файл содержит проверку индексов: для каждого шаблона запросов crud.py (фильтр, сортировка, соединение)
+# и каждого внешнего ключа в БД должен быть валидный индекс, начинающийся с нужных колонок.
+# Запуск из корня репозитория: python -m src.DB.indexes (код возврата 1, если индексов не хватает)
+import asyncio
+from dataclasses import dataclass
+from typing import Optional
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+from src.DB.database import Base, async_engine
+# импорт моделей регистрирует таблицы в Base.metadata
+import src.DB.models  # noqa: F401
+
+@dataclass(frozen=True)
+class IndexPattern:
+    table: str
+    # ведущие колонки индекса в нужном порядке
+    columns: tuple[str, ...]
+    # где используется: метод AsyncORM или ограничение БД
+    used_by: str
+    # индекс по выражению ищется по имени: колонки выражения в pg_index не перечисляются
+    index: Optional[str] = None
+
+# Шаблоны запросов crud.py, которым нужен индекс помимо первичного ключа.
+# При добавлении запроса с новым фильтром или сортировкой шаблон добавляется сюда, а индекс - миграцией
+QUERY_PATTERNS = [
+    IndexPattern("products_and_storages", ("leftover",), "get_leftovers / stream_leftovers: leftover < N"),
+    IndexPattern(
+        "products_and_storages", (), "get_replenishment: leftover < min_stock (частичный индекс)",
+        index="ix_products_and_storages_below_min_stock",
+    ),
+    IndexPattern("products_and_storages", ("storage_id",), "остатки и сводка по складу"),
+    IndexPattern("products_and_suppliers", ("supplier_id",), "filter_products: товары поставщиков"),
+    IndexPattern("products", ("product_name", "product_id"), "get_products_with_suppliers: сортировка по названию"),
+    IndexPattern("products", (), "search_products: полнотекстовый поиск", index="ix_products_search"),
+    IndexPattern("suppliers", (), "search_suppliers: полнотекстовый поиск", index="ix_suppliers_search"),
+    IndexPattern("suppliers", (), "search_suppliers: поиск по началу телефона", index="ix_suppliers_phone_digits"),
+]
+
+# Внешние ключи: без индекса по колонкам ключа каскадное удаление родительской записи просматривает всю таблицу
+def foreign_key_patterns() -> list[IndexPattern]:
+    patterns = []
+    for table in Base.metadata.sorted_tables:
+        for fk in table.foreign_key_constraints:
+            columns = tuple(column.name for column in fk.columns)
+            patterns.append(IndexPattern(table.name, columns, f"ON DELETE CASCADE из {fk.referred_table.name}"))
+    return patterns
+
+# колонки каждого индекса в порядке их следования (у выражений колонки нет - NULL); невалидные индексы
+# (прерванный CREATE INDEX CONCURRENTLY) не используются планировщиком
+INDEXES_SQL = text("""
+    SELECT t.relname AS table_name, i.relname AS index_name, ix.indisvalid AS valid,
+           array_agg(a.attname ORDER BY k.ord) AS columns
+    FROM pg_index ix
+    JOIN pg_class t ON t.oid = ix.indrelid
+    JOIN pg_class i ON i.oid = ix.indexrelid
+    JOIN pg_namespace n ON n.oid = t.relnamespace
+    CROSS JOIN LATERAL unnest(ix.indkey) WITH ORDINALITY AS k(attnum, ord)
+    LEFT JOIN pg_attribute a ON a.attrelid = t.oid AND a.attnum = k.attnum
+    WHERE n.nspname = current_schema()
+    GROUP BY t.relname, i.relname, ix.indisvalid
+""")
+
+@dataclass
+class IndexReport:
+    missing: list[IndexPattern]
+    # имена невалидных индексов - их нужно удалить и создать заново
+    invalid: list[str]
+
+async def check_indexes(conn: AsyncConnection) -> IndexReport:
+    rows = (await conn.execute(INDEXES_SQL)).mappings().all()
+    valid: dict[str, list[tuple[str, ...]]] = {}
+    valid_names: set[tuple[str, str]] = set()
+    for row in rows:
+        if row["valid"]:
+            valid.setdefault(row["table_name"], []).append(tuple(row["columns"]))
+            valid_names.add((row["table_name"], row["index_name"]))
+    # один индекс может требоваться нескольким запросам - в отчете они перечисляются через "; "
+    missing: dict[tuple[str, tuple[str, ...], Optional[str]], list[str]] = {}
+    for pattern in QUERY_PATTERNS + foreign_key_patterns():
+        if pattern.index is not None:
+            covered = (pattern.table, pattern.index) in valid_names
+        else:
+            covered = any(columns[:len(pattern.columns)] == pattern.columns for columns in valid.get(pattern.table, []))
+        if not covered:
+            missing.setdefault((pattern.table, pattern.columns, pattern.index), []).append(pattern.used_by)
+    invalid = sorted(row["index_name"] for row in rows if not row["valid"])
+    return IndexReport(
+        missing=[
+            IndexPattern(table, columns, "; ".join(used_by), index)
+            for (table, columns, index), used_by in missing.items()
+        ],
+        invalid=invalid,
+    )
+
+async def main() -> int:
+    async with async_engine.connect() as conn:
+        report = await check_indexes(conn)
+    await async_engine.dispose()
+    for pattern in report.missing:
+        target = pattern.index or f"{pattern.table}({', '.join(pattern.columns)})"
+        print(f"нет индекса {target} - {pattern.used_by}")
+    for name in report.invalid:
+        print(f"невалидный индекс {name} - удалите его и выполните миграцию повторно")
+    if report.missing or report.invalid:
+        return 1
+    print("Индексы для всех шаблонов запросов на месте.")
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(asyncio.run(main()))
@@ -1,12 +1,15 @@
 # Данный файл содержит описание всех сущностей базы данных
 
 from typing import Annotated, Optional
-from sqlalchemy import CheckConstraint, String, ForeignKey
+from sqlalchemy import BigInteger, CheckConstraint, Index, String, ForeignKey, func, literal_column, text
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from src.DB.database import Base
 
 # intpk - integer primary key - вводим новый тип данных
 intpk = Annotated[int, mapped_column(primary_key=True)]
+# версия записи для оптимистичной блокировки: каждое изменение увеличивает ее на 1,
+# изменение с устаревшей версией отклоняется (409) без блокировки строки на время редактирования
+intversion = Annotated[int, mapped_column(server_default=text("1"))]
 
 # товары
 class  ProductOrm(Base):
@@ -16,17 +19,26 @@ class  ProductOrm(Base):
     product_id: Mapped[intpk]
     product_name: Mapped[str]
     product_description: Mapped[str] = mapped_column(String, unique=True, nullable=True)  
+    version: Mapped[intversion]
 
-    # связь многие ко многим
+    # индекс для сортировки по названию ("Товары и поставщики")
+    __table_args__ = (
+        Index("ix_products_product_name_product_id", "product_name", "product_id"),
+    )
+
+    # связь многие ко многим; строки таблиц связей при удалении удаляет БД (ON DELETE CASCADE),
+    # поэтому ORM не загружает связи перед удалением (passive_deletes)
     # с поставщиками 
     product_suppliers: Mapped[list["SupplierOrm"]] = relationship(
         back_populates="supplied_products",
         secondary="products_and_suppliers",
+        passive_deletes=True,
     )
     # со складами 
     product_in_storages: Mapped[list["StorageOrm"]] = relationship(
         back_populates="available_products",
         secondary="products_and_storages",
+        passive_deletes=True,
     )
 
 # поставщики
@@ -37,14 +49,52 @@ class SupplierOrm(Base):
     supplier_name: Mapped[str]
     email: Mapped[str] = mapped_column(String, unique=True, nullable=True)  
     phone: Mapped[str] = mapped_column(String, unique=True, nullable=False)  
+    version: Mapped[intversion]
 
     # связь многие ко многим
     # с товарами 
     supplied_products: Mapped[list["ProductOrm"]] = relationship(
         back_populates="product_suppliers",
         secondary="products_and_suppliers",
+        passive_deletes=True,
+    )
+
+# ===================== ПОИСК =====================
+# Выражения совпадают с выражениями индексов migrations/versions/0003_search_indexes.py посимвольно:
+# PostgreSQL использует индекс по выражению, только если запрос содержит то же выражение.
+# Константы записаны текстом SQL (text, literal_column), а не параметрами - с параметром выражение запроса не совпадет с индексным.
+# Конфигурация 'simple' не приводит слова к основе и не удаляет стоп-слова, поэтому подходит для поиска по началу слова
+
+# документ полнотекстового поиска товара: название и описание
+def product_search_document():
+    return func.to_tsvector(
+        text("'simple'"),
+        ProductOrm.product_name + literal_column("' '") + func.coalesce(ProductOrm.product_description, literal_column("''")),
+    )
+
+# документ полнотекстового поиска поставщика: название и части email ("ivanov@mail.ru" -> "ivanov mail ru")
+def supplier_search_document():
+    return func.to_tsvector(
+        text("'simple'"),
+        SupplierOrm.supplier_name + literal_column("' '")
+        + func.coalesce(func.translate(SupplierOrm.email, literal_column("'@.'"), literal_column("'  '")), literal_column("''")),
     )
 
+# только цифры телефона: "+7(900)123-45-67" -> "79001234567"; разбор полнотекстового поиска делит номер на части
+def supplier_phone_digits():
+    return func.regexp_replace(SupplierOrm.phone, literal_column("'\\D'"), literal_column("''"), literal_column("'g'"))
+
+# выражения полнотекстовых индексов не сравниваются alembic autogenerate (см. include_object в migrations/env.py)
+Index("ix_products_search", product_search_document(), postgresql_using="gin", info={"skip_autogenerate": True})
+Index("ix_suppliers_search", supplier_search_document(), postgresql_using="gin", info={"skip_autogenerate": True})
+# text_pattern_ops - для поиска по началу номера (LIKE '7900%') при любой локали БД
+Index(
+    "ix_suppliers_phone_digits",
+    supplier_phone_digits().label("phone_digits"),
+    postgresql_ops={"phone_digits": "text_pattern_ops"},
+    info={"skip_autogenerate": True},
+)
+
 # связь поставщиков и товаров
 class ProductsAndSuppliersORM(Base):
     __tablename__ = "products_and_suppliers"
@@ -57,6 +107,11 @@ class ProductsAndSuppliersORM(Base):
         primary_key=True,
     )
 
+    # первичный ключ начинается с product_id, поэтому для выборки по поставщику нужен отдельный индекс
+    __table_args__ = (
+        Index("ix_products_and_suppliers_supplier_id", "supplier_id"),
+    )
+
 #  склады 
 class StorageOrm(Base):
     __tablename__ = "storages"
@@ -64,12 +119,14 @@ class StorageOrm(Base):
     storage_id: Mapped[intpk]
     storage_name: Mapped[str]
     address: Mapped[str] = mapped_column(String, unique=True, nullable=True) 
+    version: Mapped[intversion]
 
     # связь многие ко многим
     # с товарами 
     available_products: Mapped[list["ProductOrm"]] = relationship(
         back_populates="product_in_storages",
         secondary="products_and_storages",
+        passive_deletes=True,
     )
 
 # связь складов и товаров  
@@ -84,8 +141,44 @@ class ProductsAndStoragesORM(Base):
         primary_key=True,
     )
     leftover: Mapped[int]
+    # порог пополнения: при остатке ниже min_stock позиция попадает в отчет о пополнении,
+    # reorder_qty - партия заказа (0 - заказывать только недостающее до min_stock)
+    min_stock: Mapped[int] = mapped_column(server_default=text("0"))
+    reorder_qty: Mapped[int] = mapped_column(server_default=text("0"))
+    version: Mapped[intversion]
 
     __table_args__ = (
         CheckConstraint('leftover >= 0', name='leftover_non_negative'),
+        CheckConstraint('min_stock >= 0', name='min_stock_non_negative'),
+        CheckConstraint('reorder_qty >= 0', name='reorder_qty_non_negative'),
+        # выборка и каскадное удаление по складу, фильтр "Товары в дефиците" (leftover < N)
+        Index("ix_products_and_storages_storage_id", "storage_id"),
+        Index("ix_products_and_storages_leftover", "leftover"),
+        # отчет о пополнении: в индексе только позиции ниже минимума
+        Index(
+            "ix_products_and_storages_below_min_stock", "product_id", "storage_id",
+            postgresql_where=text("leftover < min_stock"),
+        ),
     )
 
+
+
+# ===================== СВОДНЫЕ ОСТАТКИ =====================
+# Таблицы поддерживаются триггерами на products_and_storages (создаются миграцией migrations/versions/0001_baseline.py):
+# любое изменение остатков, включая каскадное удаление товара или склада, сразу учитывается в сводке.
+# Внешних ключей нет намеренно - при каскадном удалении строки сводки удаляет сам триггер.
+
+# суммарный остаток товара по всем складам
+class ProductStockTotalsORM(Base):
+    __tablename__ = "product_stock_totals"
+    product_id: Mapped[int] = mapped_column(primary_key=True, autoincrement=False)
+    total_leftover: Mapped[int] = mapped_column(BigInteger)
+    # на скольких складах есть позиция товара
+    storages_count: Mapped[int]
+
+# суммарный остаток и количество позиций (SKU) на складе
+class StorageStockTotalsORM(Base):
+    __tablename__ = "storage_stock_totals"
+    storage_id: Mapped[int] = mapped_column(primary_key=True, autoincrement=False)
+    total_leftover: Mapped[int] = mapped_column(BigInteger)
+    products_count: Mapped[int]
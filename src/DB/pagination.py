@@ -0,0 +1,63 @@
+# Данный файл содержит вспомогательные функции для курсорной (keyset) пагинации списков
+import base64
+import binascii
+import json
+from typing import Any, Callable, Optional, Sequence
+from sqlalchemy import BigInteger, tuple_
+from fastapi import HTTPException, status
+from src.DB.config import settings
+
+# ограничение размера страницы сверху - один запрос не может выгрузить всю таблицу
+def clamp_limit(limit: Optional[int]) -> int:
+    if limit is None:
+        return settings.PAGE_SIZE
+    return max(1, min(limit, settings.MAX_PAGE_SIZE))
+
+# курсор - значения ключей сортировки последней строки страницы, упакованные в base64
+def encode_cursor(values: Sequence[Any]) -> str:
+    raw = json.dumps(list(values), ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+def _invalid_cursor() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        detail="Некорректный курсор пагинации."
+    )
+
+def decode_cursor(cursor: str, size: int) -> tuple:
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except (ValueError, binascii.Error, UnicodeError):
+        values = None
+    if not isinstance(values, list) or len(values) != size:
+        raise _invalid_cursor()
+    return tuple(values)
+
+# значение курсора должно подходить к типу колонки: иначе запрос упадет в БД (DataError) с ответом 500
+def _fits_column(column: Any, value: Any) -> bool:
+    python_type = column.type.python_type
+    if python_type is int:
+        bound = 2 ** 63 if isinstance(column.type, BigInteger) else 2 ** 31
+        # bool - подкласс int, но в курсоре это ошибка
+        return type(value) is int and -bound <= value < bound
+    if python_type is str:
+        # PostgreSQL не хранит символ \x00 в текстовых значениях
+        return isinstance(value, str) and "\x00" not in value
+    return isinstance(value, python_type)
+
+# условие "строго после курсора" для набора колонок, по которым идет сортировка по возрастанию
+def keyset_filter(columns: Sequence[Any], after: str):
+    values = decode_cursor(after, len(columns))
+    if not all(_fits_column(column, value) for column, value in zip(columns, values)):
+        raise _invalid_cursor()
+    if len(columns) == 1:
+        return columns[0] > values[0]
+    return tuple_(*columns) > tuple_(*values)
+
+# из limit + 1 прочитанных строк формируем страницу и курсор на следующую
+def split_page(rows: Sequence[Any], limit: int, key: Callable[[Any], Sequence[Any]]) -> tuple[list, Optional[str]]:
+    rows = list(rows)
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(key(rows[-1]))
@@ -0,0 +1,172 @@
+# Данный файл содержит распределение чтений между основным сервером БД и репликами (DB_REPLICA_URLS).
+# С реплики читают только GET-запросы: методы чтения AsyncORM открывают сессию через read_session(),
+# запись всегда идет через async_session_factory на основной сервер. Чтение идет на основной сервер, если:
+# - реплик нет, все реплики исключены проверкой или подключение к выбранной реплике не удалось;
+# - запрос не GET (чтения внутри записи) или клиент недавно писал (cookie db_primary, см. src/main.py);
+# - таблицы ответа менялись за последние DB_REPLICA_PIN_SECONDS секунд: реплика еще может отдавать старые данные,
+#   а ответ попал бы в кэш справочников и получил бы ETag новой версии таблицы
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from itertools import count
+from typing import AsyncIterator, Optional
+
+from sqlalchemy import text
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from src.DB.config import settings
+from src.DB.database import async_session_factory, instrument, make_engine
+from src.DB.versions import ALL_TABLES, table_versions
+from src.metrics import CallbackGauge, db_read_sessions_total, registry
+
+logger = logging.getLogger("inventory.replicas")
+
+# отставание реплики в секундах: 0, если все полученные изменения применены (или сервер не в режиме восстановления).
+# Время последней примененной транзакции без сравнения позиций WAL не подходит: при простое основного сервера
+# оно растет, хотя реплика ничего не пропустила (после перезапуска реплики receive может быть меньше replay)
+_LAG_QUERY = text(
+    "SELECT CASE WHEN NOT pg_is_in_recovery() OR pg_last_wal_replay_lsn() >= pg_last_wal_receive_lsn() THEN 0 "
+    "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END"
+)
+
+# маршрут чтения текущего HTTP-запроса; заполняется в src/main.py, tables - в зависимости etag_for
+# (изменяется сам объект: синхронные зависимости FastAPI выполняются в другом потоке с копией контекста)
+@dataclass
+class ReadRoute:
+    primary: bool
+    tables: Optional[tuple[str, ...]] = None
+
+# вне HTTP-запроса (скрипты, фоновые задачи) - None: чтение с основного сервера
+_current_route: ContextVar[Optional[ReadRoute]] = ContextVar("read_route", default=None)
+
+def start_route(primary: bool):
+    return _current_route.set(ReadRoute(primary=primary))
+
+def finish_route(token) -> None:
+    _current_route.reset(token)
+
+# таблицы, из которых собирается ответ текущего запроса
+def read_tables(tables: tuple[str, ...]) -> None:
+    route = _current_route.get()
+    if route is not None:
+        route.tables = tables
+
+class Replica:
+    def __init__(self, url: str):
+        url = make_url(url).set(drivername="postgresql+asyncpg")
+        self.name = f"{url.host}:{url.port or 5432}"
+        # реплика может остановиться при работающем основном сервере: соединение из пула проверяется до выдачи,
+        # и сбой обнаруживается при подключении в read_session(), а не посреди запроса
+        self.engine = make_engine(
+            url=url.render_as_string(hide_password=False),
+            connect_timeout=settings.DB_REPLICA_CONNECT_TIMEOUT,
+            pre_ping=True,
+        )
+        instrument(self.engine)
+        self.session_factory = async_sessionmaker(self.engine)
+        # до первой успешной проверки чтения идут на основной сервер
+        self.healthy = False
+        self.lag: Optional[float] = None
+
+    def mark(self, healthy: bool, reason: str = "") -> None:
+        if healthy != self.healthy:
+            if healthy:
+                logger.info("реплика %s снова используется для чтения", self.name)
+            else:
+                logger.warning("реплика %s исключена из чтения: %s", self.name, reason)
+        self.healthy = healthy
+
+    async def check(self) -> None:
+        try:
+            async with self.engine.connect() as connection:
+                lag = await asyncio.wait_for(connection.scalar(_LAG_QUERY), timeout=settings.DB_REPLICA_CHECK_INTERVAL)
+        except (OSError, asyncio.TimeoutError, DBAPIError) as e:
+            self.lag = None
+            self.mark(False, f"нет подключения ({e!r})")
+            return
+        self.lag = float(lag)
+        if self.lag > settings.DB_REPLICA_MAX_LAG:
+            self.mark(False, f"отставание {self.lag:.1f} с")
+        else:
+            self.mark(True)
+
+class ReplicaRouter:
+    def __init__(self, urls: list[str]):
+        self.replicas = [Replica(url) for url in urls]
+        self._next = count()
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        if self.replicas and self._task is None:
+            await self.check()
+            self._task = asyncio.create_task(self._check_forever())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for replica in self.replicas:
+            await replica.engine.dispose()
+
+    async def check(self) -> None:
+        await asyncio.gather(*(replica.check() for replica in self.replicas))
+
+    async def _check_forever(self) -> None:
+        while True:
+            await asyncio.sleep(settings.DB_REPLICA_CHECK_INTERVAL)
+            await self.check()
+
+    @property
+    def healthy_count(self) -> int:
+        return sum(replica.healthy for replica in self.replicas)
+
+    # реплика для чтения в текущем запросе (по кругу среди доступных) или None - основной сервер
+    def choose(self) -> Optional[Replica]:
+        route = _current_route.get()
+        if route is None or route.primary:
+            return None
+        if table_versions.changed_within(route.tables or ALL_TABLES, settings.DB_REPLICA_PIN_SECONDS):
+            return None
+        healthy = [replica for replica in self.replicas if replica.healthy]
+        if not healthy:
+            return None
+        return healthy[next(self._next) % len(healthy)]
+
+replica_router = ReplicaRouter(settings.DB_REPLICA_URLS)
+
+# Сессия для методов чтения. Соединение с репликой берется заранее: если подключиться не удалось,
+# реплика исключается до следующей успешной проверки, а запрос читает с основного сервера
+@asynccontextmanager
+async def read_session() -> AsyncIterator[AsyncSession]:
+    replica = replica_router.choose()
+    connection = None
+    if replica is not None:
+        try:
+            connection = await replica.engine.connect()
+        except (OSError, asyncio.TimeoutError, DBAPIError) as e:
+            replica.mark(False, f"нет подключения ({e!r})")
+    if connection is None:
+        db_read_sessions_total.inc(target="primary")
+        async with async_session_factory() as session:
+            yield session
+        return
+
+    db_read_sessions_total.inc(target="replica")
+    try:
+        async with replica.session_factory(bind=connection) as session:
+            yield session
+    except DBAPIError as e:
+        if e.connection_invalidated:
+            replica.mark(False, f"соединение потеряно ({e.orig!r})")
+        raise
+    finally:
+        await connection.close()
+
+registry.register(CallbackGauge("db_replicas_healthy", "Реплики, используемые для чтения.", lambda: replica_router.healthy_count))
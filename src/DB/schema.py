@@ -0,0 +1,39 @@
+# Данный файл содержит управление схемой БД через миграции Alembic (каталог migrations/):
+# обновление схемы из кода и проверку версии схемы при запуске приложения
+import os
+from alembic import command
+from alembic.config import Config
+from alembic.runtime.migration import MigrationContext
+from alembic.script import ScriptDirectory
+from sqlalchemy.engine import Connection
+from src.DB.database import async_engine
+
+ALEMBIC_INI = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "alembic.ini")
+
+def alembic_config() -> Config:
+    return Config(ALEMBIC_INI)
+
+def _upgrade(connection: Connection, revision: str) -> None:
+    config = alembic_config()
+    config.attributes["connection"] = connection
+    command.upgrade(config, revision)
+
+# обновление схемы до указанной миграции - то же, что alembic upgrade head (генерация данных для замеров, скрипты)
+async def upgrade_schema(revision: str = "head") -> None:
+    async with async_engine.connect() as conn:
+        await conn.run_sync(_upgrade, revision)
+
+def _current_heads(connection: Connection) -> tuple[str, ...]:
+    return MigrationContext.configure(connection).get_current_heads()
+
+# При запуске приложение не меняет схему (миграции выполняются отдельно, до запуска, одним процессом),
+# а только проверяет, что все миграции применены
+async def check_schema() -> None:
+    heads = set(ScriptDirectory.from_config(alembic_config()).get_heads())
+    async with async_engine.connect() as conn:
+        current = set(await conn.run_sync(_current_heads))
+    if current != heads:
+        raise RuntimeError(
+            f"Схема БД не соответствует миграциям (в БД: {', '.join(sorted(current)) or 'нет'}, "
+            f"последняя: {', '.join(sorted(heads))}). Выполните: alembic upgrade head"
+        )
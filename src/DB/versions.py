@@ -0,0 +1,41 @@
+# Данный файл содержит счетчики изменений таблиц БД, на основе которых строятся ETag ответов
+import time
+import uuid
+from collections import defaultdict
+from typing import Iterable
+from src.DB.config import settings
+
+PRODUCTS = "products"
+SUPPLIERS = "suppliers"
+STORAGES = "storages"
+PRODUCTS_AND_SUPPLIERS = "products_and_suppliers"
+PRODUCTS_AND_STORAGES = "products_and_storages"
+ALL_TABLES = (PRODUCTS, SUPPLIERS, STORAGES, PRODUCTS_AND_SUPPLIERS, PRODUCTS_AND_STORAGES)
+
+# Версия таблицы увеличивается после каждой успешной записи в нее через AsyncORM.
+# Идентификатор запуска входит в ETag, чтобы после перезапуска приложения старые ETag не совпали с новыми.
+# Записи других процессов увеличивают версии только через ленту изменений (src/DB/changes.py): без нее
+# при нескольких процессах версии отстают от данных, и enabled = False - ETag и кэш справочников не используются
+class TableVersions:
+    def __init__(self):
+        self.boot_id = uuid.uuid4().hex[:12]
+        self.enabled = settings.CHANGE_FEED or settings.APP_PROCESSES <= 1
+        self._versions: dict[str, int] = defaultdict(int)
+        # время последнего изменения таблицы (time.monotonic) - для выбора между репликой и основным сервером
+        self._changed_at: dict[str, float] = {}
+
+    def bump(self, *tables: str) -> None:
+        now = time.monotonic()
+        for table in tables:
+            self._versions[table] += 1
+            self._changed_at[table] = now
+
+    # менялась ли какая-либо из таблиц за последние seconds секунд
+    def changed_within(self, tables: Iterable[str], seconds: float) -> bool:
+        since = time.monotonic() - seconds
+        return any(self._changed_at.get(table, float("-inf")) > since for table in tables)
+
+    def get(self, *tables: str) -> tuple[int, ...]:
+        return tuple(self._versions[table] for table in tables)
+
+table_versions = TableVersions()
\ No newline at end of file
@@ -0,0 +1,116 @@
+# Данный файл содержит раздачу веб-интерфейса (src/static): файлы читаются и сжимаются один раз при запуске -
+# gzip и, если установлен пакет brotli, br. Каждый файл доступен по адресу с хэшем содержимого
+# (/static/app.3f9c2a1b7d0e.js): адрес меняется вместе с файлом, поэтому браузер кэширует его без повторных
+# запросов (immutable). index.html ссылается на адреса с хэшем и проверяется при каждой загрузке страницы
+# (ETag, ответ 304). Изменения файлов интерфейса применяются после перезапуска приложения
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+from dataclasses import dataclass
+from typing import Optional
+from fastapi import Request, Response
+from src.compression import accepted_encodings, encoded_etag
+from src.etag import etag_matches
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+# предпочтение кодировок, если клиент принимает несколько
+ENCODINGS = ("br", "gzip")
+INDEX = "index.html"
+
+# ссылки на файлы интерфейса в index.html: src="/static/app.js", href="/static/styles.css"
+_STATIC_LINK = re.compile(r"""(["'])/static/([^"'?#]+)\1""")
+
+@dataclass(frozen=True)
+class Asset:
+    media_type: str
+    cache_control: str
+    digest: str
+    # тело ответа по кодировке: identity (без сжатия), gzip, br
+    bodies: dict[str, bytes]
+
+    # у каждой кодировки свой ETag: это разные представления одного файла
+    def etag(self, encoding: str) -> str:
+        return encoded_etag(f'"{self.digest}"', encoding)
+
+def _compress(content: bytes) -> dict[str, bytes]:
+    bodies = {"identity": content}
+    # mtime=0: одинаковый файл дает одинаковый результат при каждом запуске
+    compressed = {"gzip": gzip.compress(content, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        compressed["br"] = brotli.compress(content, quality=11)
+    for encoding, body in compressed.items():
+        # маленькие файлы при сжатии могут вырасти
+        if len(body) < len(content):
+            bodies[encoding] = body
+    return bodies
+
+def _media_type(filename: str) -> str:
+    media_type = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+    if media_type.startswith("text/") or media_type == "application/javascript":
+        media_type += "; charset=utf-8"
+    return media_type
+
+class AssetStore:
+    def __init__(self):
+        self._assets: dict[str, Asset] = {}
+        self.index: Optional[Asset] = None
+
+    # файлы каталога directory (без вложенных каталогов); index.html - с адресами файлов с хэшем
+    def load(self, directory: str) -> None:
+        assets, urls = {}, {}
+        filenames = sorted(os.listdir(directory)) if os.path.isdir(directory) else []
+        for filename in filenames:
+            path = os.path.join(directory, filename)
+            if filename == INDEX or not os.path.isfile(path):
+                continue
+            with open(path, "rb") as f:
+                content = f.read()
+            digest = hashlib.sha256(content).hexdigest()[:12]
+            name, ext = os.path.splitext(filename)
+            hashed = f"{name}.{digest}{ext}"
+            bodies = _compress(content)
+            assets[hashed] = Asset(_media_type(filename), IMMUTABLE, digest, bodies)
+            # адрес без хэша остается доступным (закладки, страницы из кэша браузера), но проверяется каждый раз
+            assets[filename] = Asset(_media_type(filename), REVALIDATE, digest, bodies)
+            urls[filename] = f"/static/{hashed}"
+
+        index = None
+        index_path = os.path.join(directory, INDEX)
+        if os.path.isfile(index_path):
+            with open(index_path, "r", encoding="utf-8") as f:
+                html = f.read()
+            html = _STATIC_LINK.sub(
+                lambda m: f"{m.group(1)}{urls.get(m.group(2), '/static/' + m.group(2))}{m.group(1)}", html,
+            )
+            content = html.encode("utf-8")
+            index = Asset("text/html; charset=utf-8", REVALIDATE, hashlib.sha256(content).hexdigest()[:12], _compress(content))
+        self._assets, self.index = assets, index
+
+    def get(self, filename: str) -> Optional[Asset]:
+        return self._assets.get(filename)
+
+# ответ с подходящей клиенту кодировкой; 304, если у клиента уже есть это представление
+def asset_response(request: Request, asset: Asset) -> Response:
+    accepted = accepted_encodings(request.headers.get("accept-encoding", ""))
+    encoding = next(
+        (name for name in ENCODINGS if name in asset.bodies and (name in accepted or "*" in accepted)),
+        "identity",
+    )
+    etag = asset.etag(encoding)
+    headers = {"ETag": etag, "Cache-Control": asset.cache_control, "Vary": "Accept-Encoding"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    body = asset.bodies[encoding]
+    if encoding != "identity":
+        headers["Content-Encoding"] = encoding
+    return Response(body, media_type=asset.media_type, headers=headers)
+
+assets = AssetStore()
@@ -0,0 +1,72 @@
+# Данный файл содержит разбор входных данных массовой загрузки (JSON-массив или CSV-файл) и массовое удаление
+import csv
+import io
+from typing import Any, Awaitable, Callable, Optional, Sequence, TypeVar
+from fastapi import HTTPException, UploadFile, status
+from pydantic import BaseModel, ValidationError
+from src.DB.config import settings
+from src.schemas import BulkDeleteResultDTO, BulkResultDTO, BulkRowErrorDTO
+
+DTO = TypeVar("DTO", bound=BaseModel)
+
+def _check_size(rows: list) -> None:
+    if len(rows) > settings.BULK_MAX_ROWS:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"За один запрос можно загрузить не более {settings.BULK_MAX_ROWS} строк."
+        )
+
+# чтение CSV-файла: первая строка - заголовок с названиями полей, пустые ячейки считаются отсутствующими значениями
+async def read_csv_rows(file: UploadFile) -> list[dict[str, Any]]:
+    content = await file.read()
+    try:
+        text = content.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="CSV-файл должен быть в кодировке UTF-8."
+        )
+    reader = csv.DictReader(io.StringIO(text))
+    return [{name: (value if value != "" else None) for name, value in row.items()} for row in reader]
+
+# каждая строка валидируется отдельно - ошибка в одной строке не отменяет загрузку остальных
+def validate_rows(dto: type[DTO], rows: list[dict[str, Any]]) -> tuple[dict[int, DTO], list[BulkRowErrorDTO]]:
+    _check_size(rows)
+    valid, errors = {}, []
+    for row_num, row in enumerate(rows, start=1):
+        try:
+            valid[row_num] = dto.model_validate(row)
+        except ValidationError as e:
+            error = e.errors()[0]
+            field = ".".join(str(part) for part in error["loc"])
+            detail = f'Ошибка валидации поля "{field}": {error["msg"]}' if field else error["msg"]
+            errors.append(BulkRowErrorDTO(row=row_num, detail=detail))
+    return valid, errors
+
+# общий сценарий: валидация, вставка в БД, сборка отчета по всем строкам
+async def bulk_load(
+    dto: type[DTO],
+    rows: list[dict[str, Any]],
+    insert: Callable[[dict[int, DTO]], Awaitable[tuple[dict[int, int], list[BulkRowErrorDTO]]]],
+    with_ids: bool = True,
+) -> BulkResultDTO:
+    valid, errors = validate_rows(dto, rows)
+    ids, db_errors = await insert(valid) if valid else ({}, [])
+    errors = sorted(errors + db_errors, key=lambda error: error.row)
+    result_ids: Optional[list[Optional[int]]] = None
+    if with_ids:
+        result_ids = [ids.get(row_num) for row_num in range(1, len(rows) + 1)]
+    return BulkResultDTO(
+        inserted=len(valid) - len(db_errors),
+        ids=result_ids,
+        errors=errors,
+    )
+
+# массовое удаление по списку ID (ограничение размера - то же, что у массовой загрузки)
+async def bulk_delete(
+    ids: list[int],
+    delete: Callable[[Sequence[int]], Awaitable[list[int]]],
+) -> BulkDeleteResultDTO:
+    _check_size(ids)
+    deleted = await delete(ids)
+    return BulkDeleteResultDTO(deleted=len(deleted), not_found=sorted(set(ids).difference(deleted)))
@@ -0,0 +1,78 @@
+# Данный файл содержит сжатие ответов API (gzip). Сжимаются только ответы, тело которых передано целиком:
+# потоковые выгрузки (src/export.py) и поток событий отдаются без сжатия, чтобы клиент получал первые строки
+# сразу, а не после заполнения буфера gzip. Сжатый ответ - другое представление того же ресурса, поэтому его
+# строгий ETag получает суффикс кодировки ("...-gzip"), как у файлов интерфейса (src/assets.py)
+import gzip
+import re
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# кодировки, которые принимает клиент (q=0 - кодировка запрещена)
+def accepted_encodings(header: str) -> set[str]:
+    accepted = set()
+    for part in header.split(","):
+        name, _, params = part.partition(";")
+        match = re.search(r"q\s*=\s*(\d+(?:\.\d*)?)", params)
+        if match is not None and float(match.group(1)) == 0:
+            continue
+        accepted.add(name.strip().lower())
+    return accepted
+
+def accepts_gzip(headers: Headers) -> bool:
+    accepted = accepted_encodings(headers.get("accept-encoding", ""))
+    return "gzip" in accepted or "*" in accepted
+
+# ETag сжатого представления: '"abc"' -> '"abc-gzip"'; слабый ETag (W/) не меняется
+def encoded_etag(etag: str, encoding: str) -> str:
+    if encoding == "identity" or not etag.endswith('"') or etag.startswith("W/"):
+        return etag
+    return f'{etag[:-1]}-{encoding}"'
+
+class CompressionMiddleware:
+    def __init__(self, app: ASGIApp, minimum_size: int, compresslevel: int):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.compresslevel = compresslevel
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        gzip_accepted = accepts_gzip(Headers(scope=scope))
+        start: list[Message] = []
+        passthrough = False
+
+        async def send_compressed(message: Message) -> None:
+            nonlocal passthrough
+            if message["type"] == "http.response.start":
+                # заголовки отправляются вместе с первой частью тела, когда известно, сжимается ли ответ
+                start.append(message)
+                return
+            if passthrough or not start:
+                await send(message)
+                return
+            initial = start.pop()
+            headers = MutableHeaders(scope=initial)
+            # потоковый ответ или тело уже сжато (файлы интерфейса) - ответ передается без изменений
+            if message["type"] != "http.response.body" or message.get("more_body", False) or "content-encoding" in headers:
+                passthrough = True
+                await send(initial)
+                await send(message)
+                return
+            # Vary у всех ответов, которые могли быть сжаты, в том числе у несжатых и у ответов 304
+            if "accept-encoding" not in headers.get("vary", "").lower():
+                headers.add_vary_header("Accept-Encoding")
+            body = message.get("body", b"")
+            if gzip_accepted and len(body) >= self.minimum_size:
+                # mtime=0: одинаковое тело дает одинаковые байты, как требует строгий ETag
+                compressed = gzip.compress(body, compresslevel=self.compresslevel, mtime=0)
+                if len(compressed) < len(body):
+                    headers["Content-Encoding"] = "gzip"
+                    headers["Content-Length"] = str(len(compressed))
+                    if "etag" in headers:
+                        headers["ETag"] = encoded_etag(headers["etag"], "gzip")
+                    message = {**message, "body": compressed}
+            await send(initial)
+            await send(message)
+
+        await self.app(scope, receive, send_compressed)
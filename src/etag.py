@@ -0,0 +1,46 @@
+# Данный файл содержит поддержку условных GET-запросов (ETag / If-None-Match)
+import hashlib
+from typing import Callable, Optional
+from fastapi import HTTPException, Request, Response, status
+from src.compression import accepts_gzip, encoded_etag
+from src.DB.replicas import read_tables
+from src.DB.versions import table_versions
+
+# ETag = идентификатор запуска + версии таблиц, из которых собран ответ, + хэш пути с параметрами запроса
+def make_etag(request: Request, tables: tuple[str, ...]) -> str:
+    versions = ".".join(str(version) for version in table_versions.get(*tables))
+    url = request.url.path + "?" + request.url.query
+    digest = hashlib.blake2b(url.encode("utf-8"), digest_size=8).hexdigest()
+    return f'"{table_versions.boot_id}-{versions}-{digest}"'
+
+# If-None-Match сравнивается по слабому правилу (RFC 9110): префикс W/ не учитывается
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == etag:
+            return True
+    return False
+
+# Зависимость для GET-маршрута: если данные таблиц не менялись, запрос завершается ответом 304
+# до обращения к БД и сериализации, иначе ETag добавляется к ответу. Клиент, получивший сжатый ответ,
+# присылает ETag сжатого представления (src/compression.py) - ответ 304 возвращает его же.
+# Те же таблицы определяют, можно ли читать ответ с реплики (src/DB/replicas.py).
+# Если версии таблиц не согласованы между процессами (table_versions.enabled), ответ отдается без ETag
+def etag_for(*tables: str) -> Callable[[Request, Response], Optional[str]]:
+    def dependency(request: Request, response: Response) -> Optional[str]:
+        read_tables(tables)
+        if not table_versions.enabled:
+            return None
+        etag = make_etag(request, tables)
+        headers = {"ETag": etag, "Cache-Control": "no-cache"}
+        if_none_match = request.headers.get("if-none-match")
+        if etag_matches(if_none_match, etag):
+            raise HTTPException(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+        gzip_etag = encoded_etag(etag, "gzip")
+        if accepts_gzip(request.headers) and etag_matches(if_none_match, gzip_etag):
+            raise HTTPException(status_code=status.HTTP_304_NOT_MODIFIED, headers={**headers, "ETag": gzip_etag})
+        response.headers.update(headers)
+        return etag
+    return dependency
\ No newline at end of file
@@ -0,0 +1,59 @@
+# Данный файл содержит преобразование потока строк БД в файлы выгрузки (NDJSON / CSV)
+import csv
+import io
+import json
+from enum import Enum
+from typing import AsyncIterator, Mapping, Optional, Sequence
+from fastapi.responses import StreamingResponse
+from sqlalchemy import RowMapping
+
+# поддерживаемые форматы выгрузки
+class ExportFormat(str, Enum):
+    ndjson = "ndjson"
+    csv = "csv"
+
+MEDIA_TYPES = {
+    ExportFormat.ndjson: "application/x-ndjson",
+    ExportFormat.csv: "text/csv; charset=utf-8",
+}
+
+# Порция строк в формате выгрузки: NDJSON - одна строка JSON на запись, CSV - строка таблицы (header - со строкой
+# заголовка). Оба формата содержат только колонки columns: служебные поля запроса (например, version для
+# оптимистичной блокировки) в выгрузку не попадают. Функция модуля, а не замыкание: фоновые отчеты
+# (src/jobs.py) выполняют ее в пуле процессов
+def format_rows(fmt: ExportFormat, columns: list[str], rows: Sequence[Mapping], header: bool = False) -> str:
+    if fmt == ExportFormat.csv:
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=columns, extrasaction="ignore")
+        if header:
+            writer.writeheader()
+        writer.writerows(rows)
+        return buffer.getvalue()
+    return "".join(json.dumps({name: row[name] for name in columns}, ensure_ascii=False) + "\n" for row in rows)
+
+# каждая порция строк из БД отправляется клиенту сразу
+async def _ndjson_body(columns: list[str], chunks: AsyncIterator[Sequence[RowMapping]]) -> AsyncIterator[str]:
+    async for chunk in chunks:
+        yield format_rows(ExportFormat.ndjson, columns, chunk)
+
+# заголовок CSV отправляется до первого обращения к БД - клиент сразу получает первые байты
+async def _csv_body(columns: list[str], chunks: AsyncIterator[Sequence[RowMapping]]) -> AsyncIterator[str]:
+    yield format_rows(ExportFormat.csv, columns, [], header=True)
+    async for chunk in chunks:
+        yield format_rows(ExportFormat.csv, columns, chunk)
+
+def export_response(
+    fmt: ExportFormat,
+    columns: list[str],
+    chunks: AsyncIterator[Sequence[RowMapping]],
+    filename: str,
+    etag: Optional[str] = None,
+) -> StreamingResponse:
+    if fmt == ExportFormat.csv:
+        body = _csv_body(columns, chunks)
+    else:
+        body = _ndjson_body(columns, chunks)
+    headers = {"Content-Disposition": f'attachment; filename="{filename}.{fmt.value}"'}
+    if etag is not None:
+        headers.update({"ETag": etag, "Cache-Control": "no-cache"})
+    return StreamingResponse(body, media_type=MEDIA_TYPES[fmt], headers=headers)
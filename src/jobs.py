@@ -0,0 +1,355 @@
+# Данный файл содержит фоновые отчеты: клиент запускает отчет (POST /jobs), опрашивает его состояние
+# (GET /jobs/{job_id}) и скачивает готовый файл (GET /jobs/{job_id}/result). HTTP-запрос не ждет окончания
+# чтения, а одновременно формируется не больше REPORT_JOBS_CONCURRENCY отчетов - остальные ждут в очереди и
+# не занимают соединения пула, нужные интерактивным запросам. Строки читаются порциями и дописываются в файл,
+# форматирование CSV / NDJSON и запись файлов выполняются вне цикла событий (в потоке или в пуле процессов).
+# Отчет формирует процесс, который принял POST /jobs, а состояние отчета (файл <job_id>.json) и готовый файл
+# хранятся в общем для всех процессов приложения каталоге REPORT_JOBS_DIR: состояние, результат и удаление
+# отчета доступны в любом воркере uvicorn. Очередь и ограничение параллельности - свои у каждого процесса
+import asyncio
+import contextvars
+import json
+import logging
+import multiprocessing
+import os
+import re
+import tempfile
+import time
+import uuid
+from concurrent.futures import Executor, ProcessPoolExecutor
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timezone
+from typing import AsyncIterator, Callable, Mapping, Optional, Sequence
+
+from fastapi import HTTPException, status
+from src.DB.config import settings
+from src.DB.crud import AsyncORM
+from src.DB.replicas import read_tables, start_route
+from src.DB.versions import PRODUCTS, PRODUCTS_AND_STORAGES, PRODUCTS_AND_SUPPLIERS, STORAGES, SUPPLIERS
+from src.export import ExportFormat, format_rows
+from src.metrics import CallbackGauge, registry, report_job_duration_seconds, report_jobs_total
+from src.schemas import JobCreateDTO, JobDTO, JobStatus, ReportName
+
+logger = logging.getLogger("inventory.jobs")
+
+# файлы отчетов в каталоге: <job_id>.json - состояние, <job_id>.csv / .ndjson - результат
+JOB_ID = re.compile(r"[0-9a-f]{32}")
+JOB_FILE = re.compile(r"[0-9a-f]{32}\.")
+
+@dataclass(frozen=True)
+class Report:
+    columns: list[str]
+    # таблицы отчета: по ним выбирается сервер для чтения (src/DB/replicas.py)
+    tables: tuple[str, ...]
+    # порции строк отчета по параметрам запуска
+    rows: Callable[[JobCreateDTO], AsyncIterator[Sequence[Mapping]]]
+
+# отчет о пополнении - заказы по поставщикам, в файле одна строка на позицию заказа
+async def _replenishment_rows(params: JobCreateDTO) -> AsyncIterator[Sequence[Mapping]]:
+    orders = await AsyncORM.get_replenishment()
+    rows = [
+        {
+            "supplier_id": order.supplier_id,
+            "supplier_name": order.supplier_name,
+            "email": order.email,
+            "phone": order.phone,
+            **item.model_dump(),
+        }
+        for order in orders
+        for item in order.items
+    ]
+    for start in range(0, len(rows), settings.EXPORT_CHUNK_SIZE):
+        yield rows[start:start + settings.EXPORT_CHUNK_SIZE]
+
+REPORTS: dict[ReportName, Report] = {
+    ReportName.leftovers: Report(
+        ["product_id", "product_name", "storage_id", "storage_name", "leftover"],
+        (PRODUCTS, STORAGES, PRODUCTS_AND_STORAGES),
+        lambda params: AsyncORM.stream_leftovers(params.num),
+    ),
+    ReportName.products_with_suppliers: Report(
+        ["product_id", "product_name", "supplier_id", "supplier_name", "email", "phone"],
+        (PRODUCTS, SUPPLIERS, PRODUCTS_AND_SUPPLIERS),
+        lambda params: AsyncORM.stream_products_with_suppliers(),
+    ),
+    ReportName.replenishment: Report(
+        [
+            "supplier_id", "supplier_name", "email", "phone", "product_id", "product_name", "storage_id", "storage_name",
+            "leftover", "min_stock", "reorder_qty", "shortfall", "order_qty", "alternative_supplier_ids",
+        ],
+        (PRODUCTS, SUPPLIERS, STORAGES, PRODUCTS_AND_STORAGES, PRODUCTS_AND_SUPPLIERS),
+        _replenishment_rows,
+    ),
+}
+
+def _timestamp(value: Optional[float]) -> Optional[datetime]:
+    return datetime.fromtimestamp(value, timezone.utc) if value is not None else None
+
+@dataclass
+class Job:
+    job_id: str
+    params: JobCreateDTO
+    status: JobStatus = JobStatus.queued
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    rows: int = 0
+    size_bytes: int = 0
+    error: Optional[str] = None
+
+    @property
+    def pending(self) -> bool:
+        return self.status in (JobStatus.queued, JobStatus.running)
+
+    def dump(self) -> str:
+        return json.dumps({**asdict(self), "params": self.params.model_dump(mode="json"), "status": self.status.value})
+
+    @classmethod
+    def load(cls, state: str) -> "Job":
+        data = json.loads(state)
+        return cls(**{**data, "params": JobCreateDTO.model_validate(data["params"]), "status": JobStatus(data["status"])})
+
+    def to_dto(self) -> JobDTO:
+        return JobDTO(
+            job_id=self.job_id,
+            report=self.params.report,
+            format=self.params.format,
+            status=self.status,
+            created_at=_timestamp(self.created_at),
+            started_at=_timestamp(self.started_at),
+            finished_at=_timestamp(self.finished_at),
+            rows=self.rows,
+            size_bytes=self.size_bytes,
+            error=self.error,
+            result_url=f"/jobs/{self.job_id}/result" if self.status == JobStatus.done else None,
+        )
+
+# отчет удален (DELETE /jobs/{job_id}, в том числе в другом процессе), пока формировался
+class _JobDeleted(Exception):
+    pass
+
+class JobRunner:
+    def __init__(self):
+        # отчеты этого процесса в очереди и в работе и их задачи
+        self._jobs: dict[str, Job] = {}
+        self._tasks: dict[str, asyncio.Task] = {}
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._executor: Optional[Executor] = None
+        self._dir: Optional[str] = None
+        self._expire_task: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        self._slots = asyncio.Semaphore(max(1, settings.REPORT_JOBS_CONCURRENCY))
+        # каталог общий для всех процессов приложения и не удаляется при остановке процесса
+        self._dir = settings.REPORT_JOBS_DIR or os.path.join(tempfile.gettempdir(), "inventory-reports")
+        await asyncio.to_thread(os.makedirs, self._dir, exist_ok=True)
+        if settings.REPORT_JOBS_PROCESSES > 0:
+            # spawn: процесс с работающим циклом событий и потоками небезопасно копировать через fork
+            self._executor = ProcessPoolExecutor(
+                settings.REPORT_JOBS_PROCESSES, mp_context=multiprocessing.get_context("spawn"),
+            )
+        self._expire_task = asyncio.create_task(self._expire_forever())
+
+    async def stop(self) -> None:
+        jobs = list(self._jobs.values())
+        tasks = list(self._tasks.values())
+        if self._expire_task is not None:
+            tasks.append(self._expire_task)
+            self._expire_task = None
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        # отчеты этого процесса уже не будут сформированы - в других процессах они видны как завершенные ошибкой
+        for job in jobs:
+            job.status = JobStatus.failed
+            job.error = "Отчет прерван остановкой приложения."
+            job.finished_at = time.time()
+            await self._save(job)
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        self._jobs.clear()
+        self._tasks.clear()
+
+    @property
+    def queued(self) -> int:
+        return sum(job.status == JobStatus.queued for job in self._jobs.values())
+
+    @property
+    def running(self) -> int:
+        return sum(job.status == JobStatus.running for job in self._jobs.values())
+
+    async def submit(self, params: JobCreateDTO) -> Job:
+        if len(self._jobs) >= settings.REPORT_JOBS_MAX_PENDING:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Очередь отчетов заполнена, повторите запрос позже.",
+                headers={"Retry-After": "10"},
+            )
+        job = Job(job_id=uuid.uuid4().hex, params=params)
+        self._jobs[job.job_id] = job
+        await self._save(job, create=True)
+        # задача отчета запускается с пустым контекстом: SQL-запросы отчета не попадают в Server-Timing
+        # запроса POST /jobs, а выбор сервера для чтения не наследует маршрут этого запроса на запись
+        asyncio.get_running_loop().call_soon(self._launch, job, context=contextvars.Context())
+        return job
+
+    def _launch(self, job: Job) -> None:
+        # отчет удален (DELETE /jobs/{job_id}) или приложение остановлено до запуска задачи
+        if self._jobs.get(job.job_id) is not job:
+            return
+        self._tasks[job.job_id] = asyncio.get_running_loop().create_task(self._run(job))
+
+    async def get(self, job_id: str) -> Job:
+        state = None
+        if JOB_ID.fullmatch(job_id):
+            state = await asyncio.to_thread(self._read_state, self._state_path(job_id))
+        if state is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Отчет не найден.")
+        return Job.load(state)
+
+    async def jobs(self) -> list[Job]:
+        states = await asyncio.to_thread(self._read_states)
+        return sorted((Job.load(state) for state in states), key=lambda job: job.created_at, reverse=True)
+
+    # отмена отчета в очереди или в работе, удаление готового отчета и его файла. Отчет другого процесса
+    # останавливается этим процессом: он не находит файл состояния при следующем обновлении (см. _save)
+    async def delete(self, job_id: str) -> None:
+        job = await self.get(job_id)
+        self._jobs.pop(job_id, None)
+        await self._remove_path(self._state_path(job_id))
+        task = self._tasks.pop(job_id, None)
+        if task is not None and not task.done():
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+        await self._remove_path(self.result_path(job))
+
+    def result_path(self, job: Job) -> str:
+        return os.path.join(self._dir, f"{job.job_id}.{job.params.format.value}")
+
+    def _state_path(self, job_id: str) -> str:
+        return os.path.join(self._dir, f"{job_id}.json")
+
+    async def _run(self, job: Job) -> None:
+        report = REPORTS[job.params.report]
+        try:
+            async with self._slots:
+                await self._run_report(job, report)
+        finally:
+            self._jobs.pop(job.job_id, None)
+            self._tasks.pop(job.job_id, None)
+
+    async def _run_report(self, job: Job, report: Report) -> None:
+        job.status = JobStatus.running
+        job.started_at = time.time()
+        # отчет удален, пока ждал в очереди
+        if not await self._save(job):
+            return
+        started = time.perf_counter()
+        # отчет читает с реплики, если таблицы отчета не менялись недавно (чтение без HTTP-запроса - с основного)
+        start_route(primary=False)
+        read_tables(report.tables)
+        path = self.result_path(job)
+        try:
+            await self._write(job, report, path)
+        except asyncio.CancelledError:
+            await self._remove_path(path)
+            raise
+        except _JobDeleted:
+            await self._remove_path(path)
+            return
+        except Exception as e:
+            logger.exception("отчет %s (%s) завершился ошибкой", job.job_id, job.params.report.value)
+            await self._remove_path(path)
+            job.status = JobStatus.failed
+            job.error = getattr(e, "detail", None) or str(e) or type(e).__name__
+        else:
+            job.status = JobStatus.done
+            job.size_bytes = await asyncio.to_thread(os.path.getsize, path)
+        finally:
+            job.finished_at = time.time()
+            if job.status != JobStatus.running:
+                report_jobs_total.inc(report=job.params.report.value, status=job.status.value)
+                report_job_duration_seconds.observe(time.perf_counter() - started, report=job.params.report.value)
+        if not await self._save(job):
+            await self._remove_path(path)
+
+    async def _write(self, job: Job, report: Report, path: str) -> None:
+        fmt = job.params.format
+        file = await asyncio.to_thread(open, path, "w", encoding="utf-8", newline="")
+        try:
+            if fmt == ExportFormat.csv:
+                await asyncio.to_thread(file.write, format_rows(fmt, report.columns, [], header=True))
+            async for chunk in report.rows(job.params):
+                # словари вместо RowMapping: строки передаются в пул процессов
+                rows = [dict(row) for row in chunk]
+                await asyncio.to_thread(file.write, await self._format(fmt, report.columns, rows))
+                job.rows += len(rows)
+                if not await self._save(job):
+                    raise _JobDeleted
+        finally:
+            await asyncio.to_thread(file.close)
+
+    async def _format(self, fmt: ExportFormat, columns: list[str], rows: list[dict]) -> str:
+        return await asyncio.get_running_loop().run_in_executor(self._executor, format_rows, fmt, columns, rows)
+
+    # Запись состояния отчета: через временный файл и os.replace, чтобы другие процессы не прочли файл наполовину.
+    # Без create состояние записывается, только если файл есть: False - отчет удален
+    async def _save(self, job: Job, create: bool = False) -> bool:
+        return await asyncio.to_thread(self._write_state, self._state_path(job.job_id), job.dump(), create)
+
+    @staticmethod
+    def _write_state(path: str, state: str, create: bool) -> bool:
+        if not create and not os.path.exists(path):
+            return False
+        with open(f"{path}.tmp", "w", encoding="utf-8") as file:
+            file.write(state)
+        os.replace(f"{path}.tmp", path)
+        return True
+
+    @staticmethod
+    def _read_state(path: str) -> Optional[str]:
+        try:
+            with open(path, encoding="utf-8") as file:
+                return file.read()
+        except FileNotFoundError:
+            return None
+
+    def _read_states(self) -> list[str]:
+        states = []
+        for name in os.listdir(self._dir):
+            if JOB_FILE.match(name) and name.endswith(".json"):
+                state = self._read_state(os.path.join(self._dir, name))
+                if state is not None:
+                    states.append(state)
+        return states
+
+    # Файлы отчетов удаляются через REPORT_JOBS_RESULT_TTL секунд после последнего изменения: готовые
+    # и завершенные ошибкой отчеты, а также отчеты остановленного аварийно процесса, состояние которых не обновляется
+    async def _expire_forever(self) -> None:
+        while True:
+            await asyncio.sleep(min(60.0, settings.REPORT_JOBS_RESULT_TTL))
+            await asyncio.to_thread(self._expire, time.time() - settings.REPORT_JOBS_RESULT_TTL)
+
+    def _expire(self, deadline: float) -> None:
+        for name in os.listdir(self._dir):
+            if not JOB_FILE.match(name) or name[:32] in self._jobs:
+                continue
+            try:
+                path = os.path.join(self._dir, name)
+                if os.path.getmtime(path) < deadline:
+                    os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    @staticmethod
+    async def _remove_path(path: str) -> None:
+        try:
+            await asyncio.to_thread(os.remove, path)
+        except FileNotFoundError:
+            pass
+
+job_runner = JobRunner()
+
+registry.register(CallbackGauge("report_jobs_queued", "Фоновые отчеты в очереди.", lambda: job_runner.queued))
+registry.register(CallbackGauge("report_jobs_running", "Фоновые отчеты в работе.", lambda: job_runner.running))
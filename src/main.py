@@ -1,20 +1,42 @@
+import math
 import os
+import time
 from contextlib import asynccontextmanager
-from fastapi import FastAPI
-from fastapi.staticfiles import StaticFiles
-from fastapi.responses import HTMLResponse
-from src.DB.crud import AsyncORM
-from src.routers import product, storage, supplier, relationships
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import HTMLResponse, JSONResponse
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from src.DB.changes import change_feed
+from src.DB.config import settings
+from src.DB.database import async_engine
+from src.DB.replicas import finish_route, replica_router, start_route
+from src.DB.schema import check_schema
+from src.DB.versions import table_versions
+from src.assets import asset_response, assets
+from src.compression import CompressionMiddleware
+from src.jobs import job_runner
+from src.metrics import observe_request
+from src.timing import finish_request, server_timing_header, start_request
+from src.routers import product, storage, supplier, relationships, cache, metrics, changes, bootstrap, jobs
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # При запуске в первй раз будут созданы все таблицы, 
-    # в остальные разы эта строчка не будет иметь никакого эффекта так как таблицы уже будут созданы
+    # Таблицы создаются и изменяются миграциями (alembic upgrade head) до запуска приложения,
+    # при запуске проверяется только, что все миграции применены
     print("Запуск приложения...")
-    await AsyncORM.create_tables()
+    await check_schema()
+    assets.load(static_dir)
+    change_feed.start()
+    if not table_versions.enabled:
+        print("ETag и кэш справочников отключены: несколько процессов приложения (APP_PROCESSES) без ленты изменений (CHANGE_FEED)")
+    await replica_router.start()
+    await job_runner.start()
     yield
     # Shutdown code
     print("Выключение приложения...")
+    await change_feed.stop()
+    await job_runner.stop()
+    await replica_router.stop()
+    await async_engine.dispose()
 
 app = FastAPI(
     title="Система управления складскими остатками",
@@ -22,29 +44,85 @@ app = FastAPI(
     lifespan=lifespan
 )
 
+# Сжатие ответов API больше COMPRESS_MIN_SIZE байт. Добавлено первым - выполняется ближе всего к маршруту:
+# middleware ниже (@app.middleware) передают любой ответ дальше по частям, и снаружи готовое тело нельзя
+# отличить от потокового. Потоковые ответы (выгрузки, поток событий) и уже сжатые файлы интерфейса
+# не сжимаются, ETag сжатого ответа получает суффикс кодировки (src/compression.py)
+if settings.COMPRESS_MIN_SIZE > 0:
+    app.add_middleware(CompressionMiddleware, minimum_size=settings.COMPRESS_MIN_SIZE, compresslevel=settings.COMPRESS_LEVEL)
+
+# Учет времени обработки запроса: SQL-запросы и этапы сериализации, выполненные до отправки заголовков,
+# попадают в Server-Timing, время ответа - в метрики по шаблону маршрута.
+# У потоковых выгрузок тело формируется позже, поэтому учитывается только начало работы
+@app.middleware("http")
+async def request_timing(request: Request, call_next):
+    timings, token = start_request(f"{request.method} {request.url.path}")
+    started = time.perf_counter()
+    try:
+        response = await call_next(request)
+    except Exception:
+        observe_request(request.method, request.scope.get("route"), 500, time.perf_counter() - started)
+        raise
+    finally:
+        finish_request(token)
+    elapsed = time.perf_counter() - started
+    # маршрут записывается в scope при сопоставлении URL
+    observe_request(request.method, request.scope.get("route"), response.status_code, elapsed)
+    if settings.SERVER_TIMING:
+        response.headers["Server-Timing"] = server_timing_header(timings, elapsed)
+    return response
+
+# Выбор сервера для чтения (src/DB/replicas.py): запросы на запись и запросы клиента, недавно писавшего данные,
+# читают с основного сервера. После успешной записи клиент получает cookie на DB_REPLICA_PIN_SECONDS секунд
+READ_METHODS = ("GET", "HEAD")
+PIN_COOKIE = "db_primary"
+
+@app.middleware("http")
+async def read_routing(request: Request, call_next):
+    token = start_route(primary=request.method not in READ_METHODS or PIN_COOKIE in request.cookies)
+    try:
+        response = await call_next(request)
+    finally:
+        finish_route(token)
+    if replica_router.replicas and request.method not in READ_METHODS and response.status_code < 400:
+        response.set_cookie(PIN_COOKIE, "1", max_age=math.ceil(settings.DB_REPLICA_PIN_SECONDS), httponly=True, samesite="lax")
+    return response
+
+# Все соединения пула заняты дольше DB_POOL_TIMEOUT: сервис перегружен, клиент может повторить запрос позже
+@app.exception_handler(PoolTimeoutError)
+async def pool_timeout_handler(request: Request, e: PoolTimeoutError):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Сервис перегружен: нет свободных соединений с БД, повторите запрос позже"},
+        headers={"Retry-After": "1"},
+    )
+
 # Получаем абсолютный путь к директории проекта
 base_dir = os.path.dirname(os.path.abspath(__file__))
 static_dir = os.path.join(base_dir, "static")
 
-# Создаем директорию если её нет
-os.makedirs(static_dir, exist_ok=True)
-
-# Монтируем статические файлы
-app.mount("/static", StaticFiles(directory=static_dir), name="static")
-
 # Подключаем роутеры (то есть эндпоинты, которые описаны в них)
 app.include_router(product.router)
 app.include_router(supplier.router)
 app.include_router(storage.router)
 app.include_router(relationships.router)
+app.include_router(cache.router)
+app.include_router(metrics.router)
+app.include_router(changes.router)
+app.include_router(bootstrap.router)
+app.include_router(jobs.router)
 
-# страница по умолчанию 
-@app.get("/", response_class=HTMLResponse)
-async def read_root():
-    try:
-        html_path = os.path.join(static_dir, "index.html")
-        with open(html_path, "r", encoding="utf-8") as f:
-            html_content = f.read()
-        return HTMLResponse(content=html_content, status_code=200)
-    except FileNotFoundError:
+# страница по умолчанию (прочитана и сжата при запуске, см. src/assets.py)
+@app.api_route("/", methods=["GET", "HEAD"], response_class=HTMLResponse)
+async def read_root(request: Request):
+    if assets.index is None:
         return HTMLResponse(content="<h1>Ошибка: index.html не найден</h1>", status_code=404)
+    return asset_response(request, assets.index)
+
+# файлы интерфейса: по адресу с хэшем содержимого - с долгим кэшированием, по имени файла - с проверкой ETag
+@app.api_route("/static/{filename}", methods=["GET", "HEAD"], include_in_schema=False)
+async def static_file(request: Request, filename: str):
+    asset = assets.get(filename)
+    if asset is None:
+        raise HTTPException(status_code=404, detail="Файл не найден.")
+    return asset_response(request, asset)
@@ -0,0 +1,194 @@
+# Данный файл содержит метрики приложения в формате Prometheus (text exposition format 0.0.4) без внешних зависимостей.
+# Значения хранятся в памяти процесса: при нескольких воркерах uvicorn каждый воркер отдает свои метрики,
+# а суммирование выполняет Prometheus. Обновление метрики - увеличение числа в словаре, без блокировок
+# (код приложения выполняется в одном потоке цикла событий).
+import bisect
+import math
+from typing import Callable, Iterable, Optional, TypeVar
+
+# границы интервалов гистограмм времени ответа и ожидания соединения, в секундах
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(names: tuple[str, ...], values: tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _number(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+class Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def _key(self, labels: dict[str, str]) -> tuple[str, ...]:
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self) -> Iterable[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+# монотонно растущий счетчик
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: dict[tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self) -> Iterable[str]:
+        # счетчик без меток выводится и до первого увеличения
+        if not self.labelnames and not self._values:
+            yield f"{self.name} 0"
+        for key, value in self._values.items():
+            yield f"{self.name}{_labels(self.labelnames, key)} {_number(value)}"
+
+# мгновенное значение, вычисляемое в момент запроса /metrics
+class CallbackGauge(Metric):
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, func: Callable[[], float]):
+        super().__init__(name, documentation)
+        self.func = func
+
+    def samples(self) -> Iterable[str]:
+        yield f"{self.name} {_number(self.func())}"
+
+# гистограмма: в каждом интервале хранится количество попаданий, накопительные суммы считаются при выводе
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (), buckets: Iterable[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # [количество по интервалам (последний - +Inf)], сумма значений
+        self._values: dict[tuple[str, ...], tuple[list[int], list[float]]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        entry = self._values.get(key)
+        if entry is None:
+            entry = self._values[key] = ([0] * (len(self.buckets) + 1), [0.0])
+        entry[0][bisect.bisect_left(self.buckets, value)] += 1
+        entry[1][0] += value
+
+    # количество наблюдений и их сумма
+    def totals(self, **labels: str) -> tuple[int, float]:
+        entry = self._values.get(self._key(labels))
+        return (sum(entry[0]), entry[1][0]) if entry is not None else (0, 0.0)
+
+    def samples(self) -> Iterable[str]:
+        for key, (counts, total) in self._values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                le = 'le="' + _number(bound) + '"'
+                yield f"{self.name}_bucket{_labels(self.labelnames, key, le)} {cumulative}"
+            yield f"{self.name}_sum{_labels(self.labelnames, key)} {_number(total[0])}"
+            yield f"{self.name}_count{_labels(self.labelnames, key)} {cumulative}"
+
+M = TypeVar("M", bound=Metric)
+
+class Registry:
+    def __init__(self):
+        self._metrics: list[Metric] = []
+
+    def register(self, metric: M) -> M:
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        return "\n".join(metric.render() for metric in self._metrics) + "\n"
+
+registry = Registry()
+
+# тип ответа /metrics по спецификации Prometheus
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# ---------- HTTP ----------
+# route - шаблон маршрута (/product/{product_id}), а не путь запроса: количество рядов не зависит от ID в URL
+http_requests_total = registry.register(Counter(
+    "http_requests_total", "Количество HTTP-запросов.", ("method", "route", "status"),
+))
+http_request_duration_seconds = registry.register(Histogram(
+    "http_request_duration_seconds", "Время обработки HTTP-запроса до отправки заголовков ответа.", ("method", "route"),
+))
+
+# ---------- БД ----------
+db_statement_duration_seconds = registry.register(Histogram(
+    "db_statement_duration_seconds", "Время выполнения SQL-запросов.",
+))
+db_pool_wait_seconds = registry.register(Histogram(
+    "db_pool_wait_seconds", "Время ожидания свободного соединения из пула.",
+))
+db_pool_timeouts_total = registry.register(Counter(
+    "db_pool_timeouts_total", "Запросы, не дождавшиеся свободного соединения из пула за DB_POOL_TIMEOUT.",
+))
+db_read_sessions_total = registry.register(Counter(
+    "db_read_sessions_total", "Сессии чтения по серверу БД (primary - основной, replica - реплика).", ("target",),
+))
+db_integrity_errors_total = registry.register(Counter(
+    "db_integrity_errors_total", "Запросы, отклоненные ограничениями целостности БД.", ("table", "constraint"),
+))
+
+# показатели пула соединений регистрируются в database.py, где создается движок
+def register_pool_gauges(
+    checked_out: Callable[[], float],
+    overflow: Callable[[], float],
+    size: Callable[[], float],
+    checked_in: Callable[[], float],
+) -> None:
+    registry.register(CallbackGauge("db_pool_checked_out", "Соединения, выданные из пула.", checked_out))
+    registry.register(CallbackGauge("db_pool_overflow", "Соединения сверх постоянного размера пула (отрицательное значение - свободный резерв пула).", overflow))
+    registry.register(CallbackGauge("db_pool_size", "Постоянный размер пула соединений.", size))
+    registry.register(CallbackGauge("db_pool_checked_in", "Свободные соединения в пуле.", checked_in))
+
+# ---------- операции AsyncORM ----------
+orm_rows_inserted_total = registry.register(Counter(
+    "orm_rows_inserted_total", "Строки, добавленные методами AsyncORM.", ("table",),
+))
+orm_rows_rejected_total = registry.register(Counter(
+    "orm_rows_rejected_total", "Строки массовой загрузки, пропущенные из-за конфликтов и неизвестных ссылок.", ("table",),
+))
+orm_leftover_updates_total = registry.register(Counter(
+    "orm_leftover_updates_total", "Изменения остатков товаров на складах.", ("operation",),
+))
+# количество одиночных записей, объединенных в один пакет (WRITE_COALESCING)
+orm_write_batch_size = registry.register(Histogram(
+    "orm_write_batch_size", "Количество записей в одном объединенном пакете.", ("operation",),
+    buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500),
+))
+
+# ---------- фоновые отчеты ----------
+report_jobs_total = registry.register(Counter(
+    "report_jobs_total", "Завершенные фоновые отчеты.", ("report", "status"),
+))
+report_job_duration_seconds = registry.register(Histogram(
+    "report_job_duration_seconds", "Время формирования фонового отчета (без ожидания в очереди).", ("report",),
+    buckets=(0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0),
+))
+
+# route - объект маршрута Starlette из scope запроса; неизвестные пути объединяются в один ряд,
+# чтобы сканеры URL не раздували количество рядов
+def observe_request(method: str, route: Optional[object], status: int, elapsed: float) -> None:
+    label = getattr(route, "path", None) or "unmatched"
+    http_requests_total.inc(method=method, route=label, status=str(status))
+    http_request_duration_seconds.observe(elapsed, method=method, route=label)
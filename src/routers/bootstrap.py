@@ -0,0 +1,17 @@
+# Данный файл содержит эндпоинт стартовой загрузки веб-интерфейса: все таблицы одним запросом
+from fastapi import APIRouter, Depends, Response
+from typing import Annotated
+
+from src.schemas import BootstrapDTO
+from src.DB.crud import AsyncORM
+from src.DB.versions import PRODUCTS, PRODUCTS_AND_STORAGES, PRODUCTS_AND_SUPPLIERS, STORAGES, SUPPLIERS
+from src.etag import etag_for
+from src.serialization import raw_json_response
+
+router = APIRouter(prefix="/bootstrap", tags=["Веб-интерфейс"])
+
+@router.get("", summary="Данные для стартовой загрузки интерфейса", response_model=BootstrapDTO)
+async def get_bootstrap(
+        etag: Annotated[str, Depends(etag_for(PRODUCTS, SUPPLIERS, STORAGES, PRODUCTS_AND_STORAGES, PRODUCTS_AND_SUPPLIERS))],
+) -> Response:
+    return raw_json_response(await AsyncORM.get_bootstrap(), etag)
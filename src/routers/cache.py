@@ -0,0 +1,15 @@
+# Данный файл содержит эндпоинты для наблюдения за кэшем справочников
+from fastapi import APIRouter
+
+from src.DB.cache import reference_cache
+
+router = APIRouter(prefix="/cache", tags=["Кэш справочников"])
+
+@router.get("/stats", summary="Статистика попаданий и промахов кэша")
+async def cache_stats():
+    return reference_cache.stats()
+
+@router.delete("", summary="Очистить кэш")
+async def clear_cache():
+    reference_cache.clear()
+    return {"ok": True}
\ No newline at end of file
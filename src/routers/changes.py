@@ -0,0 +1,39 @@
+# Данный файл содержит ленту изменений для интерфейса (Server-Sent Events)
+import asyncio
+from fastapi import APIRouter, HTTPException, status
+from fastapi.responses import StreamingResponse
+
+from src.DB.changes import change_feed
+from src.DB.config import settings
+
+router = APIRouter(tags=["Лента изменений"])
+
+# Каждое сообщение - событие src/DB/changes.py в поле data. При простое отправляется комментарий,
+# чтобы прокси не закрыли соединение; после разрыва браузер переподключается сам через retry миллисекунд
+@router.get("/changes", summary="Лента изменений (text/event-stream)")
+async def changes():
+    if not change_feed.running:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Лента изменений отключена."
+        )
+
+    async def stream():
+        async with change_feed.subscribe() as queue:
+            yield "retry: 3000\n\n"
+            while True:
+                try:
+                    message = await asyncio.wait_for(queue.get(), timeout=settings.CHANGE_FEED_PING)
+                except asyncio.TimeoutError:
+                    yield ": ping\n\n"
+                    continue
+                if message is None:
+                    return
+                yield f"data: {message}\n\n"
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        # X-Accel-Buffering - отключение буферизации ответа в nginx
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -0,0 +1,50 @@
+# Данный файл содержит эндпоинты фоновых отчетов: запуск, состояние, скачивание результата
+from fastapi import APIRouter, Body, HTTPException, Response, status
+from fastapi.responses import FileResponse
+from typing import Annotated
+
+from src.export import MEDIA_TYPES
+from src.jobs import job_runner
+from src.schemas import JobCreateDTO, JobDTO, JobStatus
+
+router = APIRouter(prefix="/jobs", tags=["Фоновые отчеты"])
+
+@router.post("", summary="Запустить формирование отчета", status_code=status.HTTP_202_ACCEPTED)
+async def submit_job(
+        params: Annotated[JobCreateDTO, Body()],
+        response: Response,
+) -> JobDTO:
+    job = await job_runner.submit(params)
+    response.headers["Location"] = f"/jobs/{job.job_id}"
+    return job.to_dto()
+
+@router.get("", summary="Отчеты: в очереди, в работе и готовые")
+async def list_jobs() -> list[JobDTO]:
+    return [job.to_dto() for job in await job_runner.jobs()]
+
+@router.get("/{job_id}", summary="Состояние отчета")
+async def get_job(
+        job_id: str,
+) -> JobDTO:
+    return (await job_runner.get(job_id)).to_dto()
+
+@router.get("/{job_id}/result", summary="Скачать готовый отчет (NDJSON / CSV)")
+async def get_job_result(
+        job_id: str,
+) -> FileResponse:
+    job = await job_runner.get(job_id)
+    if job.status == JobStatus.failed:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=f"Отчет завершился ошибкой: {job.error}")
+    if job.status != JobStatus.done:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Отчет еще не готов.")
+    return FileResponse(
+        job_runner.result_path(job),
+        media_type=MEDIA_TYPES[job.params.format],
+        filename=f"{job.params.report.value}.{job.params.format.value}",
+    )
+
+@router.delete("/{job_id}", summary="Отменить или удалить отчет")
+async def delete_job(
+        job_id: str,
+):
+    await job_runner.delete(job_id)
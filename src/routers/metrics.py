@@ -0,0 +1,10 @@
+# Данный файл содержит эндпоинт с метриками приложения для Prometheus
+from fastapi import APIRouter, Response
+
+from src.metrics import CONTENT_TYPE, registry
+
+router = APIRouter(tags=["Мониторинг"])
+
+@router.get("/metrics", summary="Метрики в формате Prometheus", response_class=Response)
+async def metrics():
+    return Response(content=registry.render(), media_type=CONTENT_TYPE)
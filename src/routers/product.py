@@ -1,9 +1,14 @@
 # Данный файл содержит эндпоинты, относящиеся к работе с товарами 
-from fastapi import APIRouter, Body
-from typing import Annotated
+from fastapi import APIRouter, Body, Depends, Query, Response, UploadFile
+from typing import Annotated, Any, Optional
 
-from src.schemas import ProductAddDTO, ProductDTO, AddMsg
+from src.schemas import ProductAddDTO, ProductDTO, ProductPatchDTO, AddMsg, BulkDeleteResultDTO, BulkResultDTO, Page
+from src.bulk_import import bulk_delete, bulk_load, read_csv_rows
+from src.DB.config import settings
 from src.DB.crud import AsyncORM
+from src.DB.versions import PRODUCTS, PRODUCTS_AND_STORAGES, PRODUCTS_AND_SUPPLIERS, STORAGES, SUPPLIERS
+from src.etag import etag_for
+from src.serialization import json_response
 
 router = APIRouter(prefix="/product", tags=["Операции с товарами"])
 
@@ -14,22 +19,105 @@ async def add_product(
     product_id = await AsyncORM.insert_product(product)
     return {"ok": True, "id": product_id}
 
+@router.post("/bulk", summary="Массовое добавление товаров (JSON-массив)")
+async def add_products_bulk(
+        rows: Annotated[list[dict[str, Any]], Body()],
+) -> BulkResultDTO:
+    return await bulk_load(ProductAddDTO, rows, AsyncORM.bulk_insert_products)
+
+@router.post("/bulk/csv", summary="Массовое добавление товаров (CSV-файл)")
+async def add_products_bulk_csv(
+        file: UploadFile,
+) -> BulkResultDTO:
+    rows = await read_csv_rows(file)
+    return await bulk_load(ProductAddDTO, rows, AsyncORM.bulk_insert_products)
+
 @router.put("", summary="Изменить информацию о товаре")
 async def put_product(
         product: Annotated[ProductDTO, Body()],
 ):
     await AsyncORM.update_product(product)
 
+@router.patch("/{product_id}", summary="Изменить отдельные поля товара")
+async def patch_product(
+        product_id: int,
+        changes: Annotated[ProductPatchDTO, Body()],
+) -> ProductDTO:
+    return await AsyncORM.patch_product(product_id, changes)
+
 @router.delete("", summary="Удалить товар")
 async def delete_product(
         id: int,
 ):
     await AsyncORM.delete_product(id)
 
-@router.get("", summary="Номенклатура")
-async def all_products():
-    res = await AsyncORM.get_all_products()
-    return res
+@router.post("/bulk/delete", summary="Массовое удаление товаров по списку ID")
+async def delete_products_bulk(
+        ids: Annotated[list[int], Body()],
+) -> BulkDeleteResultDTO:
+    return await bulk_delete(ids, AsyncORM.delete_products)
+
+@router.get("", summary="Номенклатура", response_model=Page[ProductDTO])
+async def all_products(
+        etag: Annotated[str, Depends(etag_for(PRODUCTS))],
+        limit: int = Query(
+            default=settings.PAGE_SIZE,
+            ge=1,
+            le=settings.MAX_PAGE_SIZE,
+            description="Размер страницы.",
+        ),
+        after: Optional[str] = Query(
+            default=None,
+            description="Курсор next_cursor из предыдущей страницы. Оставьте пустым для первой страницы.",
+        ),
+) -> Response:
+    res = await AsyncORM.get_all_products(limit, after)
+    return json_response(res, etag)
 
+@router.get("/filter", summary="Фильтр номенклатуры по поставщикам и складам", response_model=Page[ProductDTO])
+async def filter_products(
+        etag: Annotated[str, Depends(etag_for(PRODUCTS, SUPPLIERS, STORAGES, PRODUCTS_AND_SUPPLIERS, PRODUCTS_AND_STORAGES))],
+        supplier_id: list[int] = Query(
+            default=[],
+            description="ID поставщиков (параметр повторяется): товары любого из них. Пусто - без фильтра по поставщикам.",
+        ),
+        storage_id: list[int] = Query(
+            default=[],
+            description="ID складов (параметр повторяется): товары, которые есть на любом из них. Пусто - без фильтра по складам.",
+        ),
+        in_stock: bool = Query(
+            default=False,
+            description="Только товары с ненулевым остатком (на складах storage_id или на любом складе).",
+        ),
+        limit: int = Query(
+            default=settings.PAGE_SIZE,
+            ge=1,
+            le=settings.MAX_PAGE_SIZE,
+            description="Размер страницы.",
+        ),
+        after: Optional[str] = Query(
+            default=None,
+            description="Курсор next_cursor из предыдущей страницы. Оставьте пустым для первой страницы.",
+        ),
+) -> Response:
+    res = await AsyncORM.filter_products(supplier_id, storage_id, in_stock, limit, after)
+    return json_response(res, etag)
 
+@router.get("/search", summary="Поиск товаров (подсказки при вводе)", dependencies=[Depends(etag_for(PRODUCTS))])
+async def search_products(
+        q: str = Query(min_length=1, max_length=100, description="Начало слов названия или описания товара."),
+        limit: int = Query(
+            default=settings.SEARCH_LIMIT,
+            ge=1,
+            le=settings.MAX_SEARCH_LIMIT,
+            description="Количество результатов.",
+        ),
+) -> list[ProductDTO]:
+    return await AsyncORM.search_products(q, limit)
 
+# маршрут с параметром в пути объявлен последним, чтобы не перехватывать остальные GET-маршруты
+@router.get("/{product_id}", summary="Карточка товара", dependencies=[Depends(etag_for(PRODUCTS))])
+async def get_product(
+        product_id: int,
+) -> ProductDTO:
+    return await AsyncORM.get_product(product_id)
\ No newline at end of file
@@ -1,9 +1,12 @@
 # Данный файл содержит эндпоинты, относящиеся к работе со связями между сущностями БД 
-from fastapi import APIRouter, Body, HTTPException
-from typing import Annotated
+from fastapi import APIRouter, Body, Depends, HTTPException, UploadFile
+from typing import Annotated, Any
 
-from src.schemas import PurchaseDTO, SupplyDTO
+from src.schemas import BulkResultDTO, LeftoverChangeDTO, MovementDTO, PurchaseDTO, PurchasePatchDTO, PurchaseUpdateDTO, PurchaseVersionDTO, SupplyDTO, TransferDTO
+from src.bulk_import import bulk_load, read_csv_rows
 from src.DB.crud import AsyncORM
+from src.DB.versions import PRODUCTS_AND_STORAGES
+from src.etag import etag_for
 
 router = APIRouter(prefix="", tags=["Операции над связями между товарами, поставщиками и складами"])
 
@@ -35,6 +38,19 @@ async def add_product_storage_relationship(
     except HTTPException:
         raise
 
+@router.post("/purchase/bulk", summary="Массовое добавление закупок (JSON-массив)")
+async def add_purchases_bulk(
+        rows: Annotated[list[dict[str, Any]], Body()],
+) -> BulkResultDTO:
+    return await bulk_load(PurchaseDTO, rows, AsyncORM.bulk_insert_purchases, with_ids=False)
+
+@router.post("/purchase/bulk/csv", summary="Массовое добавление закупок (CSV-файл)")
+async def add_purchases_bulk_csv(
+        file: UploadFile,
+) -> BulkResultDTO:
+    rows = await read_csv_rows(file)
+    return await bulk_load(PurchaseDTO, rows, AsyncORM.bulk_insert_purchases, with_ids=False)
+
 @router.delete("/purchase", summary="Удалить закупку")
 async def delete_purchase(
         product_id: int,
@@ -44,6 +60,46 @@ async def delete_purchase(
 
 @router.put("/purchase", summary="Изменить закупку")
 async def put_purchase(
-        purchase: Annotated[PurchaseDTO, Body()],
+        purchase: Annotated[PurchaseUpdateDTO, Body()],
 ):
-    await AsyncORM.update_purchase(purchase)
\ No newline at end of file
+    await AsyncORM.update_purchase(purchase)
+
+@router.patch("/purchase/{product_id}/{storage_id}", summary="Изменить остаток закупки с проверкой версии")
+async def patch_purchase(
+        product_id: int,
+        storage_id: int,
+        changes: Annotated[PurchasePatchDTO, Body()],
+) -> PurchaseVersionDTO:
+    return await AsyncORM.patch_purchase(product_id, storage_id, changes)
+
+@router.post("/purchase/movement", summary="Приход / расход товара на складе")
+async def move_stock(
+        movement: Annotated[MovementDTO, Body()],
+) -> LeftoverChangeDTO:
+    return await AsyncORM.move_stock(movement)
+
+@router.post("/purchase/movement/batch", summary="Пакетный приход / расход товаров (в одной транзакции)")
+async def move_stock_batch(
+        movements: Annotated[list[MovementDTO], Body()],
+) -> list[LeftoverChangeDTO]:
+    return await AsyncORM.move_stock_batch(movements)
+
+@router.post("/purchase/transfer", summary="Перемещение товара между складами")
+async def transfer_stock(
+        transfer: Annotated[TransferDTO, Body()],
+) -> list[LeftoverChangeDTO]:
+    return await AsyncORM.transfer_stock([transfer])
+
+@router.post("/purchase/transfer/batch", summary="Пакетное перемещение товаров между складами (в одной транзакции)")
+async def transfer_stock_batch(
+        transfers: Annotated[list[TransferDTO], Body()],
+) -> list[LeftoverChangeDTO]:
+    return await AsyncORM.transfer_stock(transfers)
+
+# карточка закупки - текущие остаток, пороги пополнения и версия для PATCH /purchase/{product_id}/{storage_id}
+@router.get("/purchase/{product_id}/{storage_id}", summary="Карточка закупки", dependencies=[Depends(etag_for(PRODUCTS_AND_STORAGES))])
+async def get_purchase(
+        product_id: int,
+        storage_id: int,
+) -> PurchaseVersionDTO:
+    return await AsyncORM.get_purchase(product_id, storage_id)
@@ -1,9 +1,15 @@
 # Данный файл содержит эндпоинты, относящиеся к работе со складами 
-from fastapi import APIRouter, Body, HTTPException, Query
-from typing import Annotated, Optional
+from fastapi import APIRouter, Body, Depends, HTTPException, Query, Response, UploadFile
+from typing import Annotated, Any, Optional
 
-from src.schemas import  StorageAddDTO, StorageDTO, AddMsg
+from src.schemas import  StorageAddDTO, StorageDTO, StoragePatchDTO, AddMsg, LeftoversDTO, BulkDeleteResultDTO, BulkResultDTO, Page, ProductStockDTO, StorageStockDTO, SupplierOrderDTO
+from src.bulk_import import bulk_delete, bulk_load, read_csv_rows
+from src.DB.config import settings
 from src.DB.crud import AsyncORM
+from src.DB.versions import PRODUCTS, PRODUCTS_AND_STORAGES, PRODUCTS_AND_SUPPLIERS, STORAGES, SUPPLIERS
+from src.etag import etag_for
+from src.serialization import json_response
+from src.export import ExportFormat, export_response
 
 router = APIRouter(prefix="/storage", tags=["Операции над складами"])
 
@@ -14,34 +20,83 @@ async def add_storage(
     storage_id = await AsyncORM.insert_storage(storage)
     return {"ok": True, "id": storage_id}
 
+@router.post("/bulk", summary="Массовое добавление складов (JSON-массив)")
+async def add_storages_bulk(
+        rows: Annotated[list[dict[str, Any]], Body()],
+) -> BulkResultDTO:
+    return await bulk_load(StorageAddDTO, rows, AsyncORM.bulk_insert_storages)
+
+@router.post("/bulk/csv", summary="Массовое добавление складов (CSV-файл)")
+async def add_storages_bulk_csv(
+        file: UploadFile,
+) -> BulkResultDTO:
+    rows = await read_csv_rows(file)
+    return await bulk_load(StorageAddDTO, rows, AsyncORM.bulk_insert_storages)
+
 @router.delete("", summary="Удалить склад")
 async def delete_storage(
         id: int,
 ):
     await AsyncORM.delete_storage(id)
 
+@router.post("/bulk/delete", summary="Массовое удаление складов по списку ID")
+async def delete_storages_bulk(
+        ids: Annotated[list[int], Body()],
+) -> BulkDeleteResultDTO:
+    return await bulk_delete(ids, AsyncORM.delete_storages)
+
 @router.put("", summary="Изменить информацию о складе")
 async def put_storage(
         storage: Annotated[StorageDTO, Body()],
 ):
     await AsyncORM.update_storage(storage)
 
-@router.get("", summary="Все склады")
-async def all_storages():
-    res = await AsyncORM.get_all_storages()
-    return res
+@router.patch("/{storage_id}", summary="Изменить отдельные поля склада")
+async def patch_storage(
+        storage_id: int,
+        changes: Annotated[StoragePatchDTO, Body()],
+) -> StorageDTO:
+    return await AsyncORM.patch_storage(storage_id, changes)
+
+@router.get("", summary="Все склады", response_model=Page[StorageDTO])
+async def all_storages(
+        etag: Annotated[str, Depends(etag_for(STORAGES))],
+        limit: int = Query(
+            default=settings.PAGE_SIZE,
+            ge=1,
+            le=settings.MAX_PAGE_SIZE,
+            description="Размер страницы.",
+        ),
+        after: Optional[str] = Query(
+            default=None,
+            description="Курсор next_cursor из предыдущей страницы. Оставьте пустым для первой страницы.",
+        ),
+) -> Response:
+    res = await AsyncORM.get_all_storages(limit, after)
+    return json_response(res, etag)
 
-@router.get("/leftovers", summary="Остатки товаров на складах")
+@router.get("/leftovers", summary="Остатки товаров на складах", response_model=Page[LeftoversDTO])
 async def deficit_products(
+    etag: Annotated[str, Depends(etag_for(PRODUCTS, STORAGES, PRODUCTS_AND_STORAGES))],
     num: Optional[int] = Query(
         default = None,
         ge=1, 
         description="Остаток товара. Оставьте путсым, чтобы посомореть все товары.",
-    )
-):
+    ),
+    limit: int = Query(
+        default=settings.PAGE_SIZE,
+        ge=1,
+        le=settings.MAX_PAGE_SIZE,
+        description="Размер страницы.",
+    ),
+    after: Optional[str] = Query(
+        default=None,
+        description="Курсор next_cursor из предыдущей страницы. Оставьте пустым для первой страницы.",
+    ),
+) -> Response:
     # получить все товары
     if num is None:
-        res = await AsyncORM.get_leftovers()
+        res = await AsyncORM.get_leftovers(limit=limit, after=after)
     else:
     # получить дефицит товаров
         if num <= 0:
@@ -49,5 +104,70 @@ async def deficit_products(
             status_code=400,
             detail="Остаток товара должен быть положительным числом"
             )
-        res = await AsyncORM.get_leftovers(num)
-    return res
\ No newline at end of file
+        res = await AsyncORM.get_leftovers(num, limit, after)
+    return json_response(res, etag)
+
+@router.get("/leftovers/export", summary="Выгрузка остатков товаров на складах (NDJSON / CSV)")
+async def export_leftovers(
+    etag: Annotated[str, Depends(etag_for(PRODUCTS, STORAGES, PRODUCTS_AND_STORAGES))],
+    format: ExportFormat = Query(default=ExportFormat.ndjson, description="Формат файла выгрузки."),
+    num: Optional[int] = Query(
+        default = None,
+        ge=1, 
+        description="Остаток товара. Оставьте пустым, чтобы выгрузить все товары.",
+    ),
+):
+    return export_response(
+        format,
+        ["product_id", "product_name", "storage_id", "storage_name", "leftover"],
+        AsyncORM.stream_leftovers(num),
+        filename="leftovers",
+        etag=etag,
+    )
+
+@router.get("/summary", summary="Суммарные остатки и количество позиций по складам", response_model=Page[StorageStockDTO])
+async def storage_stock_summary(
+    etag: Annotated[str, Depends(etag_for(STORAGES, PRODUCTS_AND_STORAGES))],
+    limit: int = Query(
+        default=settings.PAGE_SIZE,
+        ge=1,
+        le=settings.MAX_PAGE_SIZE,
+        description="Размер страницы.",
+    ),
+    after: Optional[str] = Query(
+        default=None,
+        description="Курсор next_cursor из предыдущей страницы. Оставьте пустым для первой страницы.",
+    ),
+) -> Response:
+    return json_response(await AsyncORM.get_storage_stock_summary(limit, after), etag)
+
+@router.get("/summary/products", summary="Суммарные остатки товаров по всем складам", response_model=Page[ProductStockDTO])
+async def product_stock_summary(
+    etag: Annotated[str, Depends(etag_for(PRODUCTS, PRODUCTS_AND_STORAGES))],
+    limit: int = Query(
+        default=settings.PAGE_SIZE,
+        ge=1,
+        le=settings.MAX_PAGE_SIZE,
+        description="Размер страницы.",
+    ),
+    after: Optional[str] = Query(
+        default=None,
+        description="Курсор next_cursor из предыдущей страницы. Оставьте пустым для первой страницы.",
+    ),
+) -> Response:
+    return json_response(await AsyncORM.get_product_stock_summary(limit, after), etag)
+
+@router.get(
+    "/replenishment",
+    summary="Пополнение: позиции с остатком ниже минимального, сгруппированные по поставщикам",
+    dependencies=[Depends(etag_for(PRODUCTS, SUPPLIERS, STORAGES, PRODUCTS_AND_STORAGES, PRODUCTS_AND_SUPPLIERS))],
+)
+async def replenishment() -> list[SupplierOrderDTO]:
+    return await AsyncORM.get_replenishment()
+
+# маршрут с параметром в пути объявлен последним, чтобы не перехватывать остальные GET-маршруты
+@router.get("/{storage_id}", summary="Карточка склада", dependencies=[Depends(etag_for(STORAGES))])
+async def get_storage(
+        storage_id: int,
+) -> StorageDTO:
+    return await AsyncORM.get_storage(storage_id)
\ No newline at end of file
@@ -1,9 +1,15 @@
 # Данный файл содержит эндпоинты, относящиеся к работе с поставщиками 
-from fastapi import APIRouter, Body, HTTPException
-from typing import Annotated
+from fastapi import APIRouter, Body, Depends, HTTPException, Query, Response, UploadFile
+from typing import Annotated, Any, Optional
 
-from src.schemas import  SupplierAddDTO, AddMsg, SupplierDTO
+from src.schemas import  SupplierAddDTO, AddMsg, SupplierDTO, SupplierPatchDTO, ProductsAndSuppliers, BulkDeleteResultDTO, BulkResultDTO, Page
+from src.bulk_import import bulk_delete, bulk_load, read_csv_rows
+from src.DB.config import settings
 from src.DB.crud import AsyncORM
+from src.DB.versions import PRODUCTS, PRODUCTS_AND_SUPPLIERS, SUPPLIERS
+from src.etag import etag_for
+from src.serialization import json_response
+from src.export import ExportFormat, export_response
 
 router = APIRouter(prefix="/supplier", tags=["Операции над поставщиками"])
 
@@ -18,16 +24,47 @@ async def add_supplier(
     except HTTPException:
         raise
     
+@router.post("/bulk", summary="Массовое добавление поставщиков (JSON-массив)")
+async def add_suppliers_bulk(
+        rows: Annotated[list[dict[str, Any]], Body()],
+) -> BulkResultDTO:
+    return await bulk_load(SupplierAddDTO, rows, AsyncORM.bulk_insert_suppliers)
+
+@router.post("/bulk/csv", summary="Массовое добавление поставщиков (CSV-файл)")
+async def add_suppliers_bulk_csv(
+        file: UploadFile,
+) -> BulkResultDTO:
+    rows = await read_csv_rows(file)
+    return await bulk_load(SupplierAddDTO, rows, AsyncORM.bulk_insert_suppliers)
+
 @router.delete("", summary="Удалить поставщика")
 async def delete_supplier(
         id: int,
 ):
     await AsyncORM.delete_supplier(id)
 
-@router.get("", summary="Сводная таблица поставщиков")
-async def all_suppliers():
-    res = await AsyncORM.get_all_suppliers()
-    return res
+@router.post("/bulk/delete", summary="Массовое удаление поставщиков по списку ID")
+async def delete_suppliers_bulk(
+        ids: Annotated[list[int], Body()],
+) -> BulkDeleteResultDTO:
+    return await bulk_delete(ids, AsyncORM.delete_suppliers)
+
+@router.get("", summary="Сводная таблица поставщиков", response_model=Page[SupplierDTO])
+async def all_suppliers(
+        etag: Annotated[str, Depends(etag_for(SUPPLIERS))],
+        limit: int = Query(
+            default=settings.PAGE_SIZE,
+            ge=1,
+            le=settings.MAX_PAGE_SIZE,
+            description="Размер страницы.",
+        ),
+        after: Optional[str] = Query(
+            default=None,
+            description="Курсор next_cursor из предыдущей страницы. Оставьте пустым для первой страницы.",
+        ),
+) -> Response:
+    res = await AsyncORM.get_all_suppliers(limit, after)
+    return json_response(res, etag)
 
 @router.put("", summary="Изменить информацию о поставщике")
 async def put_supplier(
@@ -38,13 +75,59 @@ async def put_supplier(
         
     except HTTPException:
         raise
+
+@router.patch("/{supplier_id}", summary="Изменить отдельные поля поставщика")
+async def patch_supplier(
+        supplier_id: int,
+        changes: Annotated[SupplierPatchDTO, Body()],
+) -> SupplierDTO:
+    return await AsyncORM.patch_supplier(supplier_id, changes)
    
-@router.get("/with_products", summary="Сводная таблица товаров и поставщиков")
-async def products_by_supplier():
-    res = await AsyncORM.get_products_with_suppliers()
-    return res
-
-@router.get("/supplied_products", summary="Товары от поставщика")
-async def products_by_supplier(supplier_id: int):
-    res = await AsyncORM.get_supplied_products(supplier_id)
-    return res
\ No newline at end of file
+@router.get("/with_products", summary="Сводная таблица товаров и поставщиков", response_model=Page[ProductsAndSuppliers])
+async def products_by_supplier(
+        etag: Annotated[str, Depends(etag_for(PRODUCTS, SUPPLIERS, PRODUCTS_AND_SUPPLIERS))],
+        limit: int = Query(
+            default=settings.PAGE_SIZE,
+            ge=1,
+            le=settings.MAX_PAGE_SIZE,
+            description="Размер страницы.",
+        ),
+        after: Optional[str] = Query(
+            default=None,
+            description="Курсор next_cursor из предыдущей страницы. Оставьте пустым для первой страницы.",
+        ),
+) -> Response:
+    res = await AsyncORM.get_products_with_suppliers(limit, after)
+    return json_response(res, etag)
+
+@router.get("/with_products/export", summary="Выгрузка сводной таблицы товаров и поставщиков (NDJSON / CSV)")
+async def export_products_by_supplier(
+    etag: Annotated[str, Depends(etag_for(PRODUCTS, SUPPLIERS, PRODUCTS_AND_SUPPLIERS))],
+    format: ExportFormat = Query(default=ExportFormat.ndjson, description="Формат файла выгрузки."),
+):
+    return export_response(
+        format,
+        ["product_id", "product_name", "supplier_id", "supplier_name", "email", "phone"],
+        AsyncORM.stream_products_with_suppliers(),
+        filename="products_and_suppliers",
+        etag=etag,
+    )
+
+@router.get("/search", summary="Поиск поставщиков (подсказки при вводе)", dependencies=[Depends(etag_for(SUPPLIERS))])
+async def search_suppliers(
+        q: str = Query(min_length=1, max_length=100, description="Начало слов названия или email поставщика либо начало номера телефона."),
+        limit: int = Query(
+            default=settings.SEARCH_LIMIT,
+            ge=1,
+            le=settings.MAX_SEARCH_LIMIT,
+            description="Количество результатов.",
+        ),
+) -> list[SupplierDTO]:
+    return await AsyncORM.search_suppliers(q, limit)
+
+# маршрут с параметром в пути объявлен последним, чтобы не перехватывать остальные GET-маршруты
+@router.get("/{supplier_id}", summary="Карточка поставщика", dependencies=[Depends(etag_for(SUPPLIERS))])
+async def get_supplier(
+        supplier_id: int,
+) -> SupplierDTO:
+    return await AsyncORM.get_supplier(supplier_id)
\ No newline at end of file
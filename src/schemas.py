@@ -1,7 +1,10 @@
 # прослойка между запросами и моделями БД
 import re
-from typing import Optional
-from pydantic import BaseModel, EmailStr, Field, field_validator
+from datetime import datetime
+from enum import Enum
+from typing import ClassVar, Generic, Optional, TypeVar
+from pydantic import BaseModel, EmailStr, Field, field_validator, model_validator
+from src.export import ExportFormat
 
 # DTO - Data Transfer Object - объект передачи данных
 # добавление продукта - не должно содержаться ID - его присваивает БД
@@ -9,9 +12,18 @@ class ProductAddDTO(BaseModel):
     product_name: str
     product_description: Optional[str] = None
 
-# продукт со всеми полями
+# продукт со всеми полями; version - версия записи: если передана при изменении (PUT), запись изменяется,
+# только если ее не изменили с момента чтения, иначе 409
 class ProductDTO(ProductAddDTO):
     product_id: int
+    version: Optional[int] = None
+
+# проверка формата номера телефона поставщика
+def check_phone(value: str) -> str:
+    pattern = r'^\+7\(\d{3}\)\d{3}-\d{2}-\d{2}$'
+    if not re.match(pattern, value):
+        raise ValueError('Номер телефона должен быть в формате: +7(XXX)XXX-XX-XX')
+    return value
 
 # добавление поставщика - не должно содержаться ID - его присваивает БД
 class SupplierAddDTO(BaseModel):
@@ -23,14 +35,12 @@ class SupplierAddDTO(BaseModel):
     @field_validator("phone")
     @classmethod
     def validate_phone_number(cls, value: str) -> str:
-        pattern = r'^\+7\(\d{3}\)\d{3}-\d{2}-\d{2}$'
-        if not re.match(pattern, value):
-            raise ValueError('Номер телефона должен быть в формате: +7(XXX)XXX-XX-XX')
-        return value
+        return check_phone(value)
 
 # поставщик со всеми полями
 class SupplierDTO(SupplierAddDTO):
     supplier_id: int
+    version: Optional[int] = None
 
 # добавление склада - не должно содержаться ID - его присваивает БД
 class StorageAddDTO(BaseModel):
@@ -40,6 +50,7 @@ class StorageAddDTO(BaseModel):
 # склад со всеми полями
 class StorageDTO(StorageAddDTO):
     storage_id: int
+    version: Optional[int] = None
 
 # описание склада с товарами и остатками
 class LeftoversDTO(BaseModel):
@@ -49,6 +60,22 @@ class LeftoversDTO(BaseModel):
     storage_name: str
     # ge - больше или равно
     leftover: int = Field(ge=0, description="Остаток должен быть не меньше 0.")
+    # версия закупки - для изменения с проверкой версии (PATCH /purchase/{product_id}/{storage_id})
+    version: int
+
+# суммарный остаток товара по всем складам
+class ProductStockDTO(BaseModel):
+    product_id: int
+    product_name: str
+    total_leftover: int
+    storages_count: int
+
+# суммарный остаток и количество позиций на складе
+class StorageStockDTO(BaseModel):
+    storage_id: int
+    storage_name: str
+    total_leftover: int
+    products_count: int
 
 # поставщики с товарами
 class ProductsAndSuppliers(SupplierDTO):
@@ -65,8 +92,184 @@ class PurchaseDTO(BaseModel):
     product_id: int
     storage_id: int
     leftover: int = Field(ge=0, description="Leftover must be greater than or equal to 0")
+    # порог пополнения (см. отчет GET /storage/replenishment)
+    min_stock: int = Field(default=0, ge=0, description="Минимальный остаток: ниже него позиция попадает в отчет о пополнении.")
+    reorder_qty: int = Field(default=0, ge=0, description="Партия заказа; 0 - заказывать только недостающее до минимального остатка.")
+
+# изменение остатка закупки (PUT /purchase): пороги пополнения сюда не входят - они задаются при добавлении
+# и меняются PATCH /purchase/{product_id}/{storage_id}, поэтому PUT без них не сбрасывает их в 0;
+# version - как у ProductDTO
+class PurchaseUpdateDTO(BaseModel):
+    product_id: int
+    storage_id: int
+    leftover: int = Field(ge=0, description="Leftover must be greater than or equal to 0")
+    version: Optional[int] = None
+
+# закупка с версией записи - ответ на частичное изменение
+class PurchaseVersionDTO(PurchaseDTO):
+    version: int
+
+# движение товара: delta > 0 - приход, delta < 0 - расход
+class MovementDTO(BaseModel):
+    product_id: int
+    storage_id: int
+    delta: int = Field(description="Изменение остатка: больше 0 - приход, меньше 0 - расход.")
+
+# перемещение товара между складами
+class TransferDTO(BaseModel):
+    product_id: int
+    from_storage_id: int
+    to_storage_id: int
+    quantity: int = Field(gt=0, description="Количество перемещаемого товара должно быть больше 0.")
+
+    @model_validator(mode="after")
+    def validate_storages(self) -> "TransferDTO":
+        if self.from_storage_id == self.to_storage_id:
+            raise ValueError("Склад-источник и склад-получатель должны различаться")
+        return self
+
+# остаток товара на складе после изменения и новая версия закупки
+class LeftoverChangeDTO(BaseModel):
+    product_id: int
+    storage_id: int
+    leftover: int
+    version: int
+
+# Позиция отчета о пополнении: остаток ниже минимального. shortfall - недостача до min_stock,
+# order_qty - количество к заказу: партия reorder_qty, но не меньше недостачи
+class ReplenishmentItemDTO(BaseModel):
+    product_id: int
+    product_name: str
+    storage_id: int
+    storage_name: str
+    leftover: int
+    min_stock: int
+    reorder_qty: int
+    shortfall: int
+    order_qty: int
+    # другие поставщики товара, если их несколько
+    alternative_supplier_ids: list[int]
+
+# Заказ одному поставщику; позиции товаров без поставщиков собраны в заказ с supplier_id = None
+class SupplierOrderDTO(BaseModel):
+    supplier_id: Optional[int]
+    supplier_name: Optional[str]
+    email: Optional[str]
+    phone: Optional[str]
+    total_order_qty: int
+    items: list[ReplenishmentItemDTO]
 
 # подтверждение корректности добавления записи в БД
 class AddMsg(BaseModel):
     ok: bool = True
-    id: int
\ No newline at end of file
+    id: int
+
+T = TypeVar("T")
+
+# страница списка и курсор для запроса следующей страницы (None - страниц больше нет)
+class Page(BaseModel, Generic[T]):
+    items: list[T]
+    next_cursor: Optional[str] = None
+
+# Стартовая загрузка веб-интерфейса (GET /bootstrap): справочники целиком, остатки и поставки ссылаются на них по ID.
+# leftovers - [ID товара, ID склада, остаток, версия закупки], supplies - [ID товара, ID поставщика] в порядке названий товаров
+class BootstrapDTO(BaseModel):
+    products: list[ProductDTO]
+    suppliers: list[SupplierDTO]
+    storages: list[StorageDTO]
+    leftovers: list[tuple[int, int, int, int]]
+    supplies: list[tuple[int, int]]
+
+# отчеты, которые формируются в фоне (POST /jobs)
+class ReportName(str, Enum):
+    leftovers = "leftovers"
+    products_with_suppliers = "products_with_suppliers"
+    replenishment = "replenishment"
+
+class JobStatus(str, Enum):
+    queued = "queued"
+    running = "running"
+    done = "done"
+    failed = "failed"
+
+# запуск фонового отчета; num - только для leftovers: позиции с остатком меньше num
+class JobCreateDTO(BaseModel):
+    report: ReportName
+    format: ExportFormat = ExportFormat.ndjson
+    num: Optional[int] = Field(default=None, ge=1, description="Остаток товара (только для leftovers). Оставьте пустым, чтобы выгрузить все позиции.")
+
+# состояние фонового отчета; result_url - адрес файла, когда отчет готов (status = done)
+class JobDTO(BaseModel):
+    job_id: str
+    report: ReportName
+    format: ExportFormat
+    status: JobStatus
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    rows: int = 0
+    size_bytes: int = 0
+    error: Optional[str] = None
+    result_url: Optional[str] = None
+
+# ошибка в одной строке массовой загрузки (row - номер строки во входных данных, начиная с 1)
+class BulkRowErrorDTO(BaseModel):
+    row: int
+    detail: str
+
+# результат массовой загрузки: ids - присвоенные ID в порядке входных строк (None - строка не загружена)
+class BulkResultDTO(BaseModel):
+    inserted: int
+    ids: Optional[list[Optional[int]]] = None
+    errors: list[BulkRowErrorDTO] = []
+
+# результат массового удаления: deleted - количество удаленных записей, not_found - ID, которых нет в БД
+class BulkDeleteResultDTO(BaseModel):
+    deleted: int
+    not_found: list[int] = []
+
+# Частичное изменение записи (PATCH): изменяются только переданные поля.
+# version - версия записи, прочитанная клиентом: если передана, изменение выполняется, только если
+# запись с тех пор не менялась, иначе 409. В ответе - запись целиком с новой версией
+class VersionedPatchDTO(BaseModel):
+    version: Optional[int] = None
+    # поля, которые можно не передавать, но нельзя очистить (NOT NULL в БД)
+    required_fields: ClassVar[tuple[str, ...]] = ()
+
+    @model_validator(mode="after")
+    def validate_required(self) -> "VersionedPatchDTO":
+        for name in self.required_fields:
+            if name in self.model_fields_set and getattr(self, name) is None:
+                raise ValueError(f'Поле "{name}" не может быть пустым')
+        return self
+
+    # переданные поля без версии
+    def changes(self) -> dict:
+        return self.model_dump(exclude_unset=True, exclude={"version"})
+
+class ProductPatchDTO(VersionedPatchDTO):
+    product_name: Optional[str] = None
+    product_description: Optional[str] = None
+    required_fields: ClassVar[tuple[str, ...]] = ("product_name",)
+
+class SupplierPatchDTO(VersionedPatchDTO):
+    supplier_name: Optional[str] = None
+    email: Optional[EmailStr] = None
+    phone: Optional[str] = None
+    required_fields: ClassVar[tuple[str, ...]] = ("supplier_name", "phone")
+
+    @field_validator("phone")
+    @classmethod
+    def validate_phone_number(cls, value: Optional[str]) -> Optional[str]:
+        return check_phone(value) if value is not None else value
+
+class StoragePatchDTO(VersionedPatchDTO):
+    storage_name: Optional[str] = None
+    address: Optional[str] = None
+    required_fields: ClassVar[tuple[str, ...]] = ("storage_name",)
+
+class PurchasePatchDTO(VersionedPatchDTO):
+    leftover: Optional[int] = Field(default=None, ge=0, description="Остаток должен быть не меньше 0.")
+    min_stock: Optional[int] = Field(default=None, ge=0, description="Минимальный остаток должен быть не меньше 0.")
+    reorder_qty: Optional[int] = Field(default=None, ge=0, description="Партия заказа должна быть не меньше 0.")
+    required_fields: ClassVar[tuple[str, ...]] = ("leftover", "min_stock", "reorder_qty")
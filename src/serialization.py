@@ -0,0 +1,47 @@
+# Данный файл содержит быстрый путь чтения списков: DTO собираются из строк БД без повторной валидации,
+# а ответ сериализуется сразу в JSON-байты pydantic-core, без повторной проверки модели ответа в FastAPI
+from functools import lru_cache
+from typing import Any, Optional, Sequence, Union
+from fastapi import Response
+from pydantic import BaseModel, TypeAdapter
+from src.schemas import Page
+from src.timing import measure
+
+# построение TypeAdapter - дорогая операция, поэтому адаптер создается один раз на каждый тип
+@lru_cache(maxsize=None)
+def _adapter(tp: Any) -> TypeAdapter:
+    return TypeAdapter(tp)
+
+@lru_cache(maxsize=None)
+def _fields_set(dto: type[BaseModel]) -> frozenset[str]:
+    return frozenset(dto.model_fields)
+
+# Строки БД уже прошли проверку DTO при записи (а ограничения продублированы в схеме БД), поэтому при чтении
+# DTO собираются без валидации - так же, как в BaseModel.model_construct, но без разбора значений по умолчанию:
+# запросы чтения выбирают ровно поля DTO. Повторная проверка EmailStr, например, в десятки раз дороже сборки
+def _construct(dto: type[BaseModel], fields_set: frozenset[str], row: Any) -> BaseModel:
+    item = dto.__new__(dto)
+    object.__setattr__(item, "__dict__", dict(row))
+    object.__setattr__(item, "__pydantic_fields_set__", set(fields_set))
+    object.__setattr__(item, "__pydantic_extra__", None)
+    object.__setattr__(item, "__pydantic_private__", None)
+    return item
+
+# страница из строк БД (RowMapping или словари с полями DTO)
+def rows_to_page(dto: type[BaseModel], rows: Sequence[Any], next_cursor: Optional[str]) -> Page:
+    fields_set = _fields_set(dto)
+    with measure("pydantic"):
+        items = [_construct(dto, fields_set, row) for row in rows]
+    return Page[dto].model_construct(items=items, next_cursor=next_cursor)
+
+# Готовый JSON-ответ. Если маршрут возвращает Response, FastAPI не проверяет его по response_model
+# и не переносит заголовки, выставленные зависимостями, поэтому ETag передается явно
+def json_response(value: BaseModel, etag: Optional[str] = None) -> Response:
+    with measure("json"):
+        content = _adapter(type(value)).dump_json(value)
+    return raw_json_response(content, etag)
+
+# ответ из готового JSON (например, собранного в БД)
+def raw_json_response(content: Union[bytes, str], etag: Optional[str] = None) -> Response:
+    headers = {"ETag": etag, "Cache-Control": "no-cache"} if etag is not None else None
+    return Response(content=content, media_type="application/json", headers=headers)
@@ -2,6 +2,9 @@ const API_BASE_URL = '';
 let allProducts = [];
 let allSuppliers = [];
 let allStorages = [];
+// строки таблиц "Остатки на складах" и "Товары и поставщики" в текущем виде (с фильтром дефицита)
+let leftoverRows = [];
+let supplyRows = [];
 
 //Артикул (ID товара) - дополнить нулями до 8 символов
 function formatArticle(id) {
@@ -42,6 +45,20 @@ async function handleResponse(response, defaultErrorMsg) {
     return response.json();
 }
 
+// Загрузка всех страниц списка: сервер отдает данные порциями {items, next_cursor}
+async function fetchAllPages(url, defaultErrorMsg) {
+    const items = [];
+    let cursor = null;
+    do {
+        const separator = url.includes('?') ? '&' : '?';
+        const pageUrl = cursor ? `${url}${separator}after=${encodeURIComponent(cursor)}` : url;
+        const page = await handleResponse(await fetch(pageUrl), defaultErrorMsg);
+        items.push(...page.items);
+        cursor = page.next_cursor;
+    } while (cursor);
+    return items;
+}
+
 // Сброс фильтра дефицита
 function resetDeficitFilter() {
     document.getElementById('deficitFilter').value = '';
@@ -67,17 +84,62 @@ function showMessage(message, type) {
 
 // --- Loading and Rendering Functions ---
 
+// Стартовая загрузка: все таблицы одним запросом (GET /bootstrap). Остатки и поставки приходят массивами ID,
+// названия и контакты подставляются из справочников
+async function loadAll() {
+    try {
+        const data = await handleResponse(await fetch(`${API_BASE_URL}/bootstrap`), 'Ошибка загрузки данных');
+        allSuppliers = data.suppliers;
+        allStorages = data.storages;
+        const products = new Map(data.products.map(product => [product.product_id, product]));
+        const suppliers = new Map(allSuppliers.map(supplier => [supplier.supplier_id, supplier]));
+        const storages = new Map(allStorages.map(storage => [storage.storage_id, storage]));
+
+        const threshold = deficitThreshold();
+        leftoverRows = data.leftovers
+            .filter(([, , leftover]) => threshold === null || leftover < threshold)
+            .map(([productId, storageId, leftover, version]) => ({
+                product_id: productId,
+                product_name: products.get(productId).product_name,
+                storage_id: storageId,
+                storage_name: storages.get(storageId).storage_name,
+                leftover: leftover,
+                version: version,
+            }));
+        supplyRows = data.supplies.map(([productId, supplierId]) => ({
+            ...suppliers.get(supplierId),
+            product_id: productId,
+            product_name: products.get(productId).product_name,
+        }));
+
+        fillDropdowns(allSuppliers, allStorages);
+        // при выбранном фильтре по поставщику номенклатура загружается отдельно
+        if (selectedSupplierFilter() === null) {
+            allProducts = data.products;
+            renderProductsTable(allProducts);
+        } else {
+            loadProducts();
+        }
+        renderSuppliersTable(allSuppliers);
+        renderStoragesTable(allStorages);
+        renderLeftoversTable(leftoverRows);
+        renderProductsWithSuppliersTable(supplyRows);
+    } catch (error) {
+        console.error('Ошибка загрузки данных:', error);
+        showMessage(`Не удалось загрузить данные: ${error.message}`, 'error');
+    }
+}
+
 async function loadProducts() {
     try {
         const supplierId = document.getElementById('supplierFilterSelect').value;
-        let url = `${API_BASE_URL}/product`;
         if (supplierId && supplierId !== 'all') {
             //  отправляем числовой ID без ведущих нулей
             const numericSupplierId = parseInt(supplierId);
-            url = `${API_BASE_URL}/supplier/supplied_products?supplier_id=${numericSupplierId}`;
+            allProducts = await fetchAllPages(`${API_BASE_URL}/product/filter?supplier_id=${numericSupplierId}`, 'Ошибка загрузки товаров');
+        } else {
+            allProducts = await fetchAllPages(`${API_BASE_URL}/product`, 'Ошибка загрузки товаров');
         }
-        const response = await fetch(url);
-        allProducts = await handleResponse(response, 'Ошибка загрузки товаров');
         renderProductsTable(allProducts);
     } catch (error) {
         console.error('Ошибка загрузки товаров:', error);
@@ -114,8 +176,7 @@ function renderProductsTable(data) {
 
 async function loadSuppliers() {
     try {
-        const response = await fetch(`${API_BASE_URL}/supplier`);
-        allSuppliers = await handleResponse(response, 'Ошибка загрузки поставщиков');
+        allSuppliers = await fetchAllPages(`${API_BASE_URL}/supplier`, 'Ошибка загрузки поставщиков');
         renderSuppliersTable(allSuppliers);
     } catch (error) {
         console.error('Ошибка загрузки поставщиков:', error);
@@ -153,8 +214,7 @@ function renderSuppliersTable(data) {
 
 async function loadStorages() {
     try {
-        const response = await fetch(`${API_BASE_URL}/storage`);
-        allStorages = await handleResponse(response, 'Ошибка загрузки складов');
+        allStorages = await fetchAllPages(`${API_BASE_URL}/storage`, 'Ошибка загрузки складов');
         renderStoragesTable(allStorages);
     } catch (error) {
         console.error('Ошибка загрузки складов:', error);
@@ -197,9 +257,8 @@ async function loadLeftovers() {
             url += `?num=${parseInt(deficitValue)}`;
         }
         
-        const response = await fetch(url);
-        const leftovers = await handleResponse(response, 'Ошибка загрузки остатков');
-        renderLeftoversTable(leftovers);
+        leftoverRows = await fetchAllPages(url, 'Ошибка загрузки остатков');
+        renderLeftoversTable(leftoverRows);
     } catch (error) {
         console.error('Ошибка загрузки остатков:', error);
         showMessage(`Не удалось загрузить остатки: ${error.message}`, 'error');
@@ -229,7 +288,7 @@ function renderLeftoversTable(data) {
         const actionsCell = row.insertCell();
         actionsCell.innerHTML = `
             <button class="btn btn-sm btn-outline-info me-2" 
-                    onclick="openEditLeftoverModal(${item.product_id}, ${item.storage_id}, ${item.leftover})">
+                    onclick="openEditLeftoverModal(${item.product_id}, ${item.storage_id}, ${item.leftover}, ${item.version})">
                 Изменить
             </button>
             <button class="btn btn-sm btn-outline-danger" 
@@ -242,9 +301,8 @@ function renderLeftoversTable(data) {
 
 async function loadProductsWithSuppliers() {
     try {
-        const response = await fetch(`${API_BASE_URL}/supplier/with_products`);
-        const data = await handleResponse(response, 'Ошибка загрузки связей "Товар - Поставщик"');
-        renderProductsWithSuppliersTable(data);
+        supplyRows = await fetchAllPages(`${API_BASE_URL}/supplier/with_products`, 'Ошибка загрузки связей "Товар - Поставщик"');
+        renderProductsWithSuppliersTable(supplyRows);
     } catch (error) {
         console.error('Ошибка загрузки связей "Товар - Поставщик":', error);
         showMessage(`Не удалось загрузить связи "Товар - Поставщик": ${error.message}`, 'error');
@@ -278,67 +336,92 @@ function renderProductsWithSuppliersTable(data) {
     });
 }
 
-async function populateDropdowns() {
-    const purchaseProductSelect = document.getElementById('purchaseProduct');
-    const supplyProductSelect = document.getElementById('supplyProduct');
-    const supplySupplierSelect = document.getElementById('supplySupplierSelect');
-    const supplierFilterSelect = document.getElementById('supplierFilterSelect');
-    
-    // Очистка перед заполнением
-    purchaseProductSelect.innerHTML = '<option value="">Выберите товар</option>';
-    supplyProductSelect.innerHTML = '<option value="">Выберите товар</option>';
-    supplySupplierSelect.innerHTML = '<option value="">Выберите поставщика</option>';
-    supplierFilterSelect.innerHTML = '<option value="all">Показать все товары</option>';
+// Подсказки при вводе: выпадающий список заполняется результатами поиска на сервере (/product/search,
+// /supplier/search) вместо полного справочника. Запрос отправляется после паузы в наборе
+const SEARCH_DELAY_MS = 250;
+
+function attachTypeahead(inputId, selectId, searchUrl, valueKey, labelKey, placeholder) {
+    const input = document.getElementById(inputId);
+    const select = document.getElementById(selectId);
+    let timer = null;
+    // номер последнего запроса: ответ на устаревший запрос (пользователь продолжил ввод) не отображается
+    let requestNo = 0;
+
+    input.addEventListener('input', () => {
+        clearTimeout(timer);
+        timer = setTimeout(async () => {
+            const query = input.value.trim();
+            const currentNo = ++requestNo;
+            if (!query) {
+                select.innerHTML = `<option value="">${placeholder}</option>`;
+                return;
+            }
+            try {
+                const response = await fetch(`${API_BASE_URL}${searchUrl}?q=${encodeURIComponent(query)}`);
+                const items = await handleResponse(response, 'Ошибка поиска');
+                if (currentNo !== requestNo) {
+                    return;
+                }
+                select.innerHTML = items.length
+                    ? ''
+                    : '<option value="">Ничего не найдено</option>';
+                items.forEach(item => {
+                    const option = document.createElement('option');
+                    option.value = item[valueKey];
+                    option.textContent = item[labelKey];
+                    select.appendChild(option);
+                });
+            } catch (error) {
+                console.error('Ошибка поиска:', error);
+                showMessage(`Ошибка поиска: ${error.message}`, 'error');
+            }
+        }, SEARCH_DELAY_MS);
+    });
+}
 
+async function populateDropdowns() {
     try {
-        const [productsResponse, suppliersResponse, storagesResponse] = await Promise.all([
-            fetch(`${API_BASE_URL}/product`),
-            fetch(`${API_BASE_URL}/supplier`),
-            fetch(`${API_BASE_URL}/storage`),
+        const [suppliers, storages] = await Promise.all([
+            fetchAllPages(`${API_BASE_URL}/supplier`, 'Ошибка загрузки поставщиков для выпадающего списка'),
+            fetchAllPages(`${API_BASE_URL}/storage`, 'Ошибка загрузки складов для выпадающего списка'),
         ]);
-
-        allProducts = await handleResponse(productsResponse, 'Ошибка загрузки товаров для выпадающего списка');
-        const suppliers = await handleResponse(suppliersResponse, 'Ошибка загрузки поставщиков для выпадающего списка');
-        const storages = await handleResponse(storagesResponse, 'Ошибка загрузки складов для выпадающего списка');
-        
-        allProducts.forEach(product => {
-            const option = document.createElement('option');
-            option.value = product.product_id;
-            option.textContent = product.product_name;
-            supplyProductSelect.appendChild(option.cloneNode(true));
-            purchaseProductSelect.appendChild(option.cloneNode(true)); 
-        });
-        
-        suppliers.forEach(supplier => {
-            let optionSupply = document.createElement('option');
-            optionSupply.value = supplier.supplier_id;
-            optionSupply.textContent = supplier.supplier_name;
-            supplySupplierSelect.appendChild(optionSupply.cloneNode(true));
-
-            let optionFilter = document.createElement('option');
-            optionFilter.value = supplier.supplier_id;
-            optionFilter.textContent = supplier.supplier_name;
-            supplierFilterSelect.appendChild(optionFilter);
-        });
-
-        // Для закупок
-        const purchaseStorageSelect = document.getElementById('purchaseStorage');
-        
-        purchaseStorageSelect.innerHTML = '<option value="">Выберите склад</option>';
-        
-        storages.forEach(storage => {
-            const option = document.createElement('option');
-            option.value = storage.storage_id;
-            option.textContent = storage.storage_name;
-            purchaseStorageSelect.appendChild(option);
-        });
-
+        fillDropdowns(suppliers, storages);
     } catch (error) {
         console.error('Ошибка заполнения выпадающих списков:', error);
         showMessage(`Не удалось загрузить данные для выпадающих списков: ${error.message}`, 'error');
     }
 }
 
+function fillDropdowns(suppliers, storages) {
+    const supplierFilterSelect = document.getElementById('supplierFilterSelect');
+    const selectedSupplier = supplierFilterSelect.value;
+    
+    // Очистка перед заполнением
+    supplierFilterSelect.innerHTML = '<option value="all">Показать все товары</option>';
+
+    suppliers.forEach(supplier => {
+        let optionFilter = document.createElement('option');
+        optionFilter.value = supplier.supplier_id;
+        optionFilter.textContent = supplier.supplier_name;
+        supplierFilterSelect.appendChild(optionFilter);
+    });
+    if (suppliers.some(supplier => String(supplier.supplier_id) === selectedSupplier)) {
+        supplierFilterSelect.value = selectedSupplier;
+    }
+
+    // Для закупок
+    const purchaseStorageSelect = document.getElementById('purchaseStorage');
+    
+    purchaseStorageSelect.innerHTML = '<option value="">Выберите склад</option>';
+    
+    storages.forEach(storage => {
+        const option = document.createElement('option');
+        option.value = storage.storage_id;
+        option.textContent = storage.storage_name;
+        purchaseStorageSelect.appendChild(option);
+    });
+}
+
 // --- CRUD Actions ---
 
 // Продукты
@@ -365,7 +448,7 @@ async function addProduct(event) {
         document.getElementById('addProductForm').reset();
         bootstrap.Modal.getInstance(document.getElementById('addProductModal')).hide();
 
-        await Promise.all([loadProducts(), populateDropdowns(), loadProductsWithSuppliers()]);
+        await refreshIfOffline(loadProducts, loadProductsWithSuppliers);
     } catch (error) {
         console.error('Ошибка добавления товара:', error);
         showMessage(`Ошибка добавления товара: ${error.message}`, 'error');
@@ -377,6 +460,7 @@ function openEditProductModal(productId) {
     if (!product) return showMessage('Товар не найден.', 'error');
 
     document.getElementById('editProductId').value = product.product_id;
+    document.getElementById('editProductVersion').value = product.version;
     document.getElementById('editProductArticle').value = formatArticle(product.product_id);
     document.getElementById('editProductName').value = product.product_name;
     document.getElementById('editProductDescription').value = product.product_description || '';
@@ -391,6 +475,8 @@ async function editProduct(event) {
         product_id: parseInt(document.getElementById('editProductId').value),
         product_name: document.getElementById('editProductName').value,
         product_description: document.getElementById('editProductDescription').value,
+        // версия, прочитанная при открытии формы: если запись уже изменили, сервер ответит 409
+        version: parseInt(document.getElementById('editProductVersion').value),
     };
 
     try {
@@ -403,7 +489,7 @@ async function editProduct(event) {
         showMessage(`Товар "${productData.product_name}" успешно изменен!`, 'success');
         
         bootstrap.Modal.getInstance(document.getElementById('editProductModal')).hide();
-        await Promise.all([loadProducts(), populateDropdowns(), loadProductsWithSuppliers(), loadLeftovers()]);
+        await refreshIfOffline(loadProducts, loadProductsWithSuppliers, loadLeftovers);
     } catch (error) {
         console.error('Ошибка изменения товара:', error);
         showMessage(`Ошибка изменения товара: ${error.message}`, 'error');
@@ -419,7 +505,7 @@ async function deleteProduct(id, name) {
         });
         await handleResponse(response, 'Ошибка удаления товара');
         showMessage('Товар успешно удален!', 'success');
-        await Promise.all([loadProducts(), populateDropdowns(), loadProductsWithSuppliers(), loadLeftovers()]);
+        await refreshIfOffline(loadProducts, loadProductsWithSuppliers, loadLeftovers);
     } catch (error) {
         console.error('Ошибка удаления товара:', error);
         showMessage(`Ошибка удаления товара: ${error.message}`, 'error');
@@ -450,7 +536,7 @@ async function addSupplier(event) {
         document.getElementById('addSupplierForm').reset();
         bootstrap.Modal.getInstance(document.getElementById('addSupplierModal')).hide();
 
-        await Promise.all([loadSuppliers(), populateDropdowns()]);
+        await refreshIfOffline(loadSuppliers, populateDropdowns);
     } catch (error) {
         console.error('Ошибка добавления поставщика:', error);
         showMessage(`Ошибка добавления поставщика: ${error.message}`, 'error');
@@ -462,6 +548,7 @@ function openEditSupplierModal(supplierId) {
     if (!supplier) return showMessage('Поставщик не найден.', 'error');
 
     document.getElementById('editSupplierId').value = supplier.supplier_id;
+    document.getElementById('editSupplierVersion').value = supplier.version;
     document.getElementById('editSupplierDisplayId').value = supplier.supplier_id; 
     document.getElementById('editSupplierName').value = supplier.supplier_name;
     document.getElementById('editSupplierEmail').value = supplier.email || '';
@@ -478,6 +565,7 @@ async function editSupplier(event) {
         supplier_name: document.getElementById('editSupplierName').value,
         email: document.getElementById('editSupplierEmail').value || null,
         phone: document.getElementById('editSupplierPhone').value,
+        version: parseInt(document.getElementById('editSupplierVersion').value),
     };
 
     try {
@@ -490,7 +578,7 @@ async function editSupplier(event) {
         showMessage(`Поставщик "${supplierData.supplier_name}" успешно изменен!`, 'success');
         
         bootstrap.Modal.getInstance(document.getElementById('editSupplierModal')).hide();
-        await Promise.all([loadSuppliers(), populateDropdowns(), loadProductsWithSuppliers()]);
+        await refreshIfOffline(loadSuppliers, populateDropdowns, loadProductsWithSuppliers);
     } catch (error) {
         console.error('Ошибка изменения поставщика:', error);
         showMessage(`Ошибка изменения поставщика: ${error.message}`, 'error');
@@ -506,7 +594,7 @@ async function deleteSupplier(id, name) {
         });
         await handleResponse(response, 'Ошибка удаления поставщика');
         showMessage('Поставщик успешно удален!', 'success');
-        await Promise.all([loadSuppliers(), populateDropdowns(), loadProductsWithSuppliers()]);
+        await refreshIfOffline(loadSuppliers, populateDropdowns, loadProductsWithSuppliers);
     } catch (error) {
         console.error('Ошибка удаления поставщика:', error);
         showMessage(`Ошибка удаления поставщика: ${error.message}`, 'error');
@@ -536,7 +624,7 @@ async function addStorage(event) {
         document.getElementById('addStorageForm').reset();
         bootstrap.Modal.getInstance(document.getElementById('addStorageModal')).hide();
 
-        await Promise.all([loadStorages(), populateDropdowns(), loadLeftovers()]);
+        await refreshIfOffline(loadStorages, populateDropdowns, loadLeftovers);
     } catch (error) {
         console.error('Ошибка добавления склада:', error);
         showMessage(`Ошибка добавления склада: ${error.message}`, 'error');
@@ -548,6 +636,7 @@ function openEditStorageModal(storageId) {
     if (!storage) return showMessage('Склад не найден.', 'error');
 
     document.getElementById('editStorageId').value = storage.storage_id;
+    document.getElementById('editStorageVersion').value = storage.version;
     document.getElementById('editStorageDisplayId').value = storage.storage_id;
     document.getElementById('editStorageName').value = storage.storage_name;
     document.getElementById('editStorageAddress').value = storage.address || '';
@@ -562,6 +651,7 @@ async function editStorage(event) {
         storage_id: parseInt(document.getElementById('editStorageId').value),
         storage_name: document.getElementById('editStorageName').value,
         address: document.getElementById('editStorageAddress').value || null,
+        version: parseInt(document.getElementById('editStorageVersion').value),
     };
 
     try {
@@ -574,7 +664,7 @@ async function editStorage(event) {
         showMessage(`Склад "${storageData.storage_name}" успешно изменен!`, 'success');
         
         bootstrap.Modal.getInstance(document.getElementById('editStorageModal')).hide();
-        await Promise.all([loadStorages(), loadLeftovers()]);
+        await refreshIfOffline(loadStorages, populateDropdowns, loadLeftovers);
     } catch (error) {
         console.error('Ошибка изменения склада:', error);
         showMessage(`Ошибка изменения склада: ${error.message}`, 'error');
@@ -590,7 +680,7 @@ async function deleteStorage(id, name) {
         });
         await handleResponse(response, 'Ошибка удаления склада');
         showMessage('Склад успешно удален!', 'success');
-        await Promise.all([loadStorages(), populateDropdowns(), loadLeftovers()]);
+        await refreshIfOffline(loadStorages, populateDropdowns, loadLeftovers);
     } catch (error) {
         console.error('Ошибка удаления склада:', error);
         showMessage(`Ошибка удаления склада: ${error.message}`, 'error');
@@ -619,19 +709,20 @@ async function addPurchase(event) {
         showMessage(`Закупка успешно добавлена (Кол-во: ${purchaseData.leftover})!`, 'success');
         
         document.getElementById('addPurchaseForm').reset();
-        await loadLeftovers();
+        await refreshIfOffline(loadLeftovers);
     } catch (error) {
         console.error('Ошибка добавления закупки:', error);
         showMessage(`Ошибка добавления закупки: ${error.message}`, 'error');
     }
 }
 
-function openEditLeftoverModal(productId, storageId, quantity) {
+function openEditLeftoverModal(productId, storageId, quantity, version) {
     document.getElementById('editLeftoverProductId').value = productId;
     document.getElementById('editLeftoverOriginalProductId').value = productId;
     document.getElementById('editLeftoverStorageId').value = storageId;
     document.getElementById('editLeftoverOriginalStorageId').value = storageId;
     document.getElementById('editLeftoverQuantity').value = quantity;
+    document.getElementById('editLeftoverVersion').value = version;
     
     const editModal = new bootstrap.Modal(document.getElementById('editLeftoverModal'));
     editModal.show();
@@ -647,6 +738,7 @@ async function editLeftover(event) {
         product_id: parseInt(productIdValue),
         storage_id: parseInt(storageIdValue),
         leftover: parseInt(quantityValue),
+        version: parseInt(document.getElementById('editLeftoverVersion').value),
     }
 
     if (isNaN(purchase.product_id) || isNaN(purchase.storage_id) || isNaN(purchase.leftover)) {
@@ -660,16 +752,17 @@ async function editLeftover(event) {
     }
 
     try {
-        const response = await fetch(`${API_BASE_URL}/purchase`, {
-            method: 'PUT',
+        // остаток мог измениться движением товара после открытия формы - тогда сервер ответит 409
+        const response = await fetch(`${API_BASE_URL}/purchase/${purchase.product_id}/${purchase.storage_id}`, {
+            method: 'PATCH',
             headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify(purchase),
+            body: JSON.stringify({ leftover: purchase.leftover, version: purchase.version }),
         });
         await handleResponse(response, 'Ошибка изменения остатка');
         showMessage('Остаток успешно обновлен!', 'success');
         
         bootstrap.Modal.getInstance(document.getElementById('editLeftoverModal')).hide();
-        await loadLeftovers();
+        await refreshIfOffline(loadLeftovers);
     } catch (error) {
         console.error('Ошибка изменения остатка:', error);
         showMessage(`Ошибка изменения остатка: ${error.message}`, 'error');
@@ -692,7 +785,7 @@ async function deleteLeftover(productId, storageId, productName) {
         });
         await handleResponse(response, 'Ошибка удаления записи об остатках');
         showMessage(`Запись об остатках для товара "${productName}" со склада "${storageName}" успешно удалена! (Остаток обнулен)`, 'success');
-        await loadLeftovers(); // Обновление таблицы
+        await refreshIfOffline(loadLeftovers); // Обновление таблицы
     } catch (error) {
         console.error('Ошибка удаления остатка:', error);
         showMessage(`Ошибка удаления остатка: ${error.message}`, 'error');
@@ -720,7 +813,7 @@ async function addSupply(event) {
         showMessage('Поставка успешно добавлена!', 'success');
         
         document.getElementById('addSupplyForm').reset();
-        await loadProductsWithSuppliers();
+        await refreshIfOffline(loadProductsWithSuppliers);
     } catch (error) {
         console.error('Ошибка добавления поставки:', error);
         showMessage(`Ошибка добавления поставки: ${error.message}`, 'error');
@@ -737,26 +830,269 @@ async function deleteSupply(productId, supplierId, productName, supplierName) {
         });
         await handleResponse(response, 'Ошибка удаления поставки');
         showMessage('Поставка успешно удалена!', 'success');
-        await loadProductsWithSuppliers(); // Обновление таблицы
+        await refreshIfOffline(loadProductsWithSuppliers); // Обновление таблицы
     } catch (error) {
         console.error('Ошибка удаления поставки:', error);
         showMessage(`Ошибка удаления поставки: ${error.message}`, 'error');
     }
 }
 
+// --- Лента изменений ---
+// Сервер присылает события о каждой записи (GET /changes, Server-Sent Events) - в том числе сделанной
+// другими пользователями. Таблицы обновляются по событиям без повторной загрузки; пока лента недоступна,
+// после сохранения таблицы перечитываются целиком
+let changeFeed = null;
+let feedConnected = false;
+
+async function refreshIfOffline(...loaders) {
+    if (!feedConnected) {
+        await Promise.all(loaders.map(loader => loader()));
+    }
+}
+
+// повторная загрузка по событию reload и для строк, которых нет в памяти: несколько событий подряд - одна загрузка
+const pendingReloads = new Set();
+let reloadTimer = null;
+
+function scheduleReload(...loaders) {
+    loaders.forEach(loader => pendingReloads.add(loader));
+    clearTimeout(reloadTimer);
+    reloadTimer = setTimeout(() => {
+        const loaders = [...pendingReloads];
+        pendingReloads.clear();
+        loaders.forEach(loader => loader());
+    }, 300);
+}
+
+// перерисовка таблиц не чаще одного раза за кадр
+const pendingRenders = new Set();
+
+function scheduleRender(...renders) {
+    if (pendingRenders.size === 0) {
+        requestAnimationFrame(() => {
+            const renders = [...pendingRenders];
+            pendingRenders.clear();
+            renders.forEach(render => render());
+        });
+    }
+    renders.forEach(render => pendingRenders.add(render));
+}
+
+const renderProducts = () => renderProductsTable(allProducts);
+const renderSuppliers = () => renderSuppliersTable(allSuppliers);
+const renderStorages = () => renderStoragesTable(allStorages);
+const renderLeftovers = () => renderLeftoversTable(leftoverRows);
+const renderSupplies = () => renderProductsWithSuppliersTable(supplyRows);
+
+// замена или добавление строки в список, отсортированный по ключу
+function upsertSorted(list, row, sameRow, compare) {
+    const index = list.findIndex(sameRow);
+    if (index >= 0) {
+        list[index] = { ...list[index], ...row };
+    } else {
+        list.push(row);
+        list.sort(compare);
+    }
+}
+
+const byProductAndStorage = (a, b) => a.product_id - b.product_id || a.storage_id - b.storage_id;
+const byProductNameAndIds = (a, b) =>
+    (a.product_name < b.product_name ? -1 : a.product_name > b.product_name ? 1 : 0)
+    || a.product_id - b.product_id || a.supplier_id - b.supplier_id;
+
+function selectedSupplierFilter() {
+    const value = document.getElementById('supplierFilterSelect').value;
+    return value && value !== 'all' ? parseInt(value) : null;
+}
+
+function deficitThreshold() {
+    const value = parseInt(document.getElementById('deficitFilter').value);
+    return !isNaN(value) && value >= 1 ? value : null;
+}
+
+// товары
+function applyProductChange(op, rows) {
+    rows.forEach(row => {
+        if (op === 'upsert') {
+            const known = allProducts.some(p => p.product_id === row.product_id);
+            // при фильтре по поставщику новый товар еще не связан с поставщиком
+            if (known || selectedSupplierFilter() === null) {
+                upsertSorted(allProducts, row, p => p.product_id === row.product_id, (a, b) => a.product_id - b.product_id);
+            }
+            leftoverRows.forEach(item => { if (item.product_id === row.product_id) item.product_name = row.product_name; });
+            supplyRows.forEach(item => { if (item.product_id === row.product_id) item.product_name = row.product_name; });
+            supplyRows.sort(byProductNameAndIds);
+        } else {
+            allProducts = allProducts.filter(p => p.product_id !== row.product_id);
+            leftoverRows = leftoverRows.filter(item => item.product_id !== row.product_id);
+            supplyRows = supplyRows.filter(item => item.product_id !== row.product_id);
+        }
+    });
+    scheduleRender(renderProducts, renderLeftovers, renderSupplies);
+}
+
+// поставщики
+function applySupplierChange(op, rows) {
+    rows.forEach(row => {
+        if (op === 'upsert') {
+            upsertSorted(allSuppliers, row, s => s.supplier_id === row.supplier_id, (a, b) => a.supplier_id - b.supplier_id);
+            supplyRows.forEach(item => {
+                if (item.supplier_id === row.supplier_id) {
+                    Object.assign(item, { supplier_name: row.supplier_name, email: row.email, phone: row.phone });
+                }
+            });
+        } else {
+            allSuppliers = allSuppliers.filter(s => s.supplier_id !== row.supplier_id);
+            supplyRows = supplyRows.filter(item => item.supplier_id !== row.supplier_id);
+        }
+    });
+    scheduleRender(renderSuppliers, renderSupplies);
+    // список фильтра по поставщику
+    scheduleReload(populateDropdowns);
+}
+
+// склады
+function applyStorageChange(op, rows) {
+    rows.forEach(row => {
+        if (op === 'upsert') {
+            upsertSorted(allStorages, row, s => s.storage_id === row.storage_id, (a, b) => a.storage_id - b.storage_id);
+            leftoverRows.forEach(item => { if (item.storage_id === row.storage_id) item.storage_name = row.storage_name; });
+        } else {
+            allStorages = allStorages.filter(s => s.storage_id !== row.storage_id);
+            leftoverRows = leftoverRows.filter(item => item.storage_id !== row.storage_id);
+        }
+    });
+    scheduleRender(renderStorages, renderLeftovers);
+    // список складов формы закупки
+    scheduleReload(populateDropdowns);
+}
+
+// поставки (связь товар - поставщик); названия и контакты берутся из загруженных справочников
+function applySupplyChange(op, rows) {
+    const filter = selectedSupplierFilter();
+    rows.forEach(row => {
+        const sameRow = item => item.product_id === row.product_id && item.supplier_id === row.supplier_id;
+        if (op === 'upsert') {
+            const product = allProducts.find(p => p.product_id === row.product_id);
+            const supplier = allSuppliers.find(s => s.supplier_id === row.supplier_id);
+            if (product && supplier) {
+                upsertSorted(supplyRows, { ...supplier, product_id: product.product_id, product_name: product.product_name }, sameRow, byProductNameAndIds);
+            } else {
+                scheduleReload(loadProductsWithSuppliers);
+            }
+            if (filter === row.supplier_id) {
+                scheduleReload(loadProducts);
+            }
+        } else {
+            supplyRows = supplyRows.filter(item => !sameRow(item));
+            if (filter === row.supplier_id) {
+                allProducts = allProducts.filter(p => p.product_id !== row.product_id);
+            }
+        }
+    });
+    scheduleRender(renderSupplies, renderProducts);
+}
+
+// остатки (закупки, движения и перемещения товаров); строки вне фильтра дефицита убираются из таблицы
+function applyLeftoverChange(op, rows) {
+    const threshold = deficitThreshold();
+    rows.forEach(row => {
+        const sameRow = item => item.product_id === row.product_id && item.storage_id === row.storage_id;
+        if (op === 'delete' || (threshold !== null && row.leftover >= threshold)) {
+            leftoverRows = leftoverRows.filter(item => !sameRow(item));
+            return;
+        }
+        if (leftoverRows.some(sameRow)) {
+            upsertSorted(leftoverRows, { leftover: row.leftover, version: row.version }, sameRow, byProductAndStorage);
+            return;
+        }
+        const product = allProducts.find(p => p.product_id === row.product_id);
+        const storage = allStorages.find(s => s.storage_id === row.storage_id);
+        if (product && storage) {
+            upsertSorted(leftoverRows, {
+                product_id: row.product_id,
+                product_name: product.product_name,
+                storage_id: row.storage_id,
+                storage_name: storage.storage_name,
+                leftover: row.leftover,
+                version: row.version,
+            }, sameRow, byProductAndStorage);
+        } else {
+            scheduleReload(loadLeftovers);
+        }
+    });
+    scheduleRender(renderLeftovers);
+}
+
+const changeHandlers = {
+    products: applyProductChange,
+    suppliers: applySupplierChange,
+    storages: applyStorageChange,
+    products_and_suppliers: applySupplyChange,
+    products_and_storages: applyLeftoverChange,
+};
+
+// таблицы, которые перечитываются по событию reload (table = null - все таблицы)
+const reloadLoaders = {
+    products: [loadProducts, loadLeftovers, loadProductsWithSuppliers],
+    suppliers: [loadSuppliers, populateDropdowns, loadProductsWithSuppliers],
+    storages: [loadStorages, populateDropdowns, loadLeftovers],
+    products_and_suppliers: [loadProducts, loadProductsWithSuppliers],
+    products_and_storages: [loadLeftovers],
+};
+
+function reloadAll() {
+    scheduleReload(loadAll);
+}
+
+function connectChangeFeed() {
+    if (!window.EventSource) {
+        return;
+    }
+    let opened = false;
+    changeFeed = new EventSource(`${API_BASE_URL}/changes`);
+    changeFeed.onopen = () => {
+        feedConnected = true;
+        // после переподключения события за время разрыва потеряны
+        if (opened) {
+            reloadAll();
+        }
+        opened = true;
+    };
+    changeFeed.onerror = () => {
+        // браузер переподключается сам; пока соединения нет, таблицы после сохранения перечитываются
+        feedConnected = false;
+    };
+    changeFeed.onmessage = (message) => {
+        const event = JSON.parse(message.data);
+        if (event.op === 'reload') {
+            if (event.table === null) {
+                reloadAll();
+            } else {
+                scheduleReload(...reloadLoaders[event.table]);
+            }
+            return;
+        }
+        const handler = changeHandlers[event.table];
+        if (handler) {
+            handler(event.op, event.rows);
+        }
+    };
+}
+
 // --- Initialization ---
 
 function init() {
-    // Загрузка данных для всех таблиц и списков при старте
-    loadProducts();
-    loadSuppliers();
-    loadStorages();
-    loadLeftovers();
-    loadProductsWithSuppliers();
-    populateDropdowns();
-
-    // При смене вкладки, принудительно обновляем данные для активной вкладки
+    // Загрузка данных для всех таблиц и списков при старте - одним запросом
+    loadAll();
+    attachTypeahead('purchaseProductSearch', 'purchaseProduct', '/product/search', 'product_id', 'product_name', 'Введите название товара');
+    attachTypeahead('supplyProductSearch', 'supplyProduct', '/product/search', 'product_id', 'product_name', 'Введите название товара');
+    attachTypeahead('supplySupplierSearch', 'supplySupplierSelect', '/supplier/search', 'supplier_id', 'supplier_name', 'Введите название, email или телефон');
+    connectChangeFeed();
+
+    // При смене вкладки обновляем данные для активной вкладки, если таблицы не обновляются по ленте изменений
     document.getElementById('mainTabs').addEventListener('shown.bs.tab', function (e) {
+        if (feedConnected) return;
         const targetId = e.target.getAttribute('href');
         switch(targetId) {
             case '#nomenclature':
@@ -0,0 +1,71 @@
+# Данный файл содержит учет времени обработки запроса: количество SQL-запросов и время в БД
+# (заполняются событиями движка в database.py), время сборки DTO и кодирования JSON,
+# заголовок Server-Timing и журнал медленных SQL-запросов
+import json
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar, Token
+from dataclasses import dataclass, field
+from typing import Iterator, Optional
+from src.DB.config import settings
+
+slow_query_logger = logging.getLogger("inventory.slow_query")
+
+@dataclass
+class RequestTimings:
+    # "GET /storage/leftovers" - для журнала медленных запросов
+    request: str
+    statements: int = 0
+    db_time: float = 0.0
+    # этапы обработки вне БД: "pydantic" - сборка DTO, "json" - кодирование ответа
+    stages: dict[str, float] = field(default_factory=dict)
+
+# учет текущего HTTP-запроса; вне запроса (скрипты, фоновые задачи) - None
+_current: ContextVar[Optional[RequestTimings]] = ContextVar("request_timings", default=None)
+
+def start_request(request: str) -> tuple[RequestTimings, Token]:
+    timings = RequestTimings(request=request)
+    return timings, _current.set(timings)
+
+def finish_request(token: Token) -> None:
+    _current.reset(token)
+
+# вызывается после выполнения каждого SQL-запроса
+def record_statement(statement: str, parameters, executemany: bool, elapsed: float) -> None:
+    timings = _current.get()
+    if timings is not None:
+        timings.statements += 1
+        timings.db_time += elapsed
+    if settings.SLOW_QUERY_MS > 0 and elapsed * 1000 >= settings.SLOW_QUERY_MS:
+        # одна строка JSON на запрос; значения параметров не пишутся в журнал - в них бывают персональные данные
+        slow_query_logger.warning(json.dumps({
+            "event": "slow_query",
+            "duration_ms": round(elapsed * 1000, 3),
+            "threshold_ms": settings.SLOW_QUERY_MS,
+            "request": timings.request if timings is not None else None,
+            "statement": " ".join(statement.split()),
+            # для executemany - количество наборов параметров
+            "parameters_count": len(parameters) if isinstance(parameters, (list, tuple, dict)) else None,
+            "executemany": executemany,
+        }, ensure_ascii=False))
+
+# замер этапа обработки запроса вне БД
+@contextmanager
+def measure(stage: str) -> Iterator[None]:
+    timings = _current.get()
+    if timings is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.stages[stage] = timings.stages.get(stage, 0.0) + time.perf_counter() - started
+
+# Server-Timing: db;dur=12.3;desc="statements=3", pydantic;dur=0.8, json;dur=0.4, total;dur=15.0 (в миллисекундах)
+def server_timing_header(timings: RequestTimings, total: float) -> str:
+    metrics = [f'db;dur={timings.db_time * 1000:.2f};desc="statements={timings.statements}"']
+    metrics += [f"{stage};dur={elapsed * 1000:.2f}" for stage, elapsed in timings.stages.items()]
+    metrics.append(f"total;dur={total * 1000:.2f}")
+    return ", ".join(metrics)